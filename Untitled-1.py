@@ -1,84 +0,0 @@
-#!/usr/bin/env python3
-import sqlite3
-import os
-
-def init_database():
-    """Initialize the database with proper schema"""
-    # Backup existing database
-    if os.path.exists('events.db'):
-        os.rename('events.db', 'events.db.backup')
-        print("Backed up existing database to events.db.backup")
-    
-    conn = sqlite3.connect('events.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    # Create tables with correct schema
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            type TEXT NOT NULL,
-            event_date DATE NOT NULL,
-            start_time TIME NOT NULL,
-            end_time TIME NOT NULL,
-            venue TEXT NOT NULL,
-            description TEXT,
-            host_school TEXT,
-            participating_schools TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS participants (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            type TEXT DEFAULT 'teacher',
-            class_dept TEXT,
-            contact TEXT,
-            email TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS volunteers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            school TEXT NOT NULL,
-            grade INTEGER,
-            contact TEXT,
-            email TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS duties (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            event_id INTEGER NOT NULL,
-            participant_id INTEGER,
-            volunteer_id INTEGER,
-            duty_type TEXT NOT NULL,
-            duty_date DATE NOT NULL,
-            start_time TIME NOT NULL,
-            end_time TIME NOT NULL,
-            location TEXT NOT NULL,
-            description TEXT,
-            notes TEXT,
-            assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (event_id) REFERENCES events (id) ON DELETE CASCADE,
-            FOREIGN KEY (participant_id) REFERENCES participants (id) ON DELETE CASCADE,
-            FOREIGN KEY (volunteer_id) REFERENCES volunteers (id) ON DELETE CASCADE,
-            CHECK ((participant_id IS NOT NULL AND volunteer_id IS NULL) OR 
-                   (participant_id IS NULL AND volunteer_id IS NOT NULL))
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-    print("Database initialized successfully!")
-
-if __name__ == '__main__':
-    init_database()
\ No newline at end of file
@@ -1,87 +1,290 @@
 import os
 import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-import google.generativeai as genai
-from PIL import Image
 import argparse
-from dotenv import load_dotenv
+from extraction_cache import ExtractionCache, cache_key, variant_for
+from image_prep import DEFAULT_MAX_PIXELS, DEFAULT_QUALITY, prepare_image
+from event_normalize import normalize_event
+from response_parser import (CONFIDENCE_LEVELS, EVENT_SCHEMA, EVENTS_SCHEMA, ResponseParseError, parse_response,
+                             reask_prompt)
 
-# Load environment variables from .env file
-load_dotenv()
+DEFAULT_MODEL = 'gemini-1.5-flash'
+MAX_BACKOFF = 60.0
+
+# Exceptions worth retrying, by class name so google.api_core is not needed
+# here: rate limits (429) and transient server-side failures.
+RATE_LIMIT_ERRORS = {'ResourceExhausted', 'TooManyRequests'}
+TRANSIENT_ERRORS = {'ServiceUnavailable', 'InternalServerError', 'DeadlineExceeded', 'GatewayTimeout'}
+
+def _is_rate_limit(error):
+    return type(error).__name__ in RATE_LIMIT_ERRORS or getattr(error, 'code', None) == 429
+
+def _is_retryable(error):
+    return (_is_rate_limit(error) or type(error).__name__ in TRANSIENT_ERRORS
+            or isinstance(error, (ConnectionError, TimeoutError)))
+
+# Detailed prompt for event information extraction. Changing it (or the
+# model) changes the extraction cache key, so stale answers are not reused.
+EXTRACTION_PROMPT = """
+            Analyze this image carefully and extract the following event information:
+            
+            1. Event Name: The title or name of the event
+            2. Location: The venue, address, or place where the event will be held
+            3. Date: The date when the event will occur (format as YYYY-MM-DD if possible)
+            4. Time: The time when the event starts/ends (format as HH:MM AM/PM if possible)
+            
+            Please provide the response in the following JSON format:
+            {
+                "event_name": "extracted event name or null if not found",
+                "location": "extracted location or null if not found", 
+                "date": "extracted date in YYYY-MM-DD format or original format if can't convert or null if not found",
+                "time": "extracted time or null if not found",
+                "confidence": "high/medium/low based on clarity of information",
+                "additional_info": "any other relevant details found"
+            }
+            
+            If any information is not clearly visible or available, set the value to null.
+            Be as accurate as possible and only extract information that is clearly visible in the image.
+            """
+
+# Prompt for schedules, timetables and posters listing several events.
+MULTI_EVENT_PROMPT = """
+            Analyze this image carefully. It may list one event or several (a schedule, timetable or programme).
+            Extract every event shown, in the order they appear.
+            
+            Please provide the response in the following JSON format:
+            {
+                "events": [
+                    {
+                        "event_name": "name of the event",
+                        "event_type": "one of sports/cultural/academic/technical/other",
+                        "location": "venue or null if not found",
+                        "date": "date in YYYY-MM-DD format or original format if can't convert or null if not found",
+                        "start_time": "start time as HH:MM AM/PM or null if not found",
+                        "end_time": "end time as HH:MM AM/PM or null if not found",
+                        "description": "any other details for this event or null"
+                    }
+                ],
+                "confidence": "high/medium/low based on clarity of information"
+            }
+            
+            If a date, time or venue is shared by several events (e.g. a heading), repeat it for each of them.
+            Only extract information that is clearly visible in the image.
+            """
+
+def _load_api_key():
+    """Read API_KEY, loading the .env file first when python-dotenv is installed."""
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        pass
+    else:
+        load_dotenv()
+    return os.getenv('API_KEY')
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeModel:
+    """
+    Stand-in for genai.GenerativeModel that answers locally, for tests and
+    for running the app without an API key.
+    """
+    
+    def __init__(self, response=None, latency=0.0):
+        """
+        Args:
+            response (dict or str): What every call returns (a dict is sent as JSON)
+            latency (float): Seconds each call sleeps to mimic a model round trip
+        """
+        if response is None:
+            response = {
+                "event_name": "Sample Event",
+                "location": "Main Hall",
+                "date": datetime.now().strftime('%Y-%m-%d'),
+                "time": "10:00 AM",
+                "confidence": "high",
+                "additional_info": None
+            }
+        self.response = response if isinstance(response, str) else json.dumps(response)
+        self.latency = latency
+        self.calls = 0
+    
+    def generate_content(self, parts):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return FakeResponse(self.response)
+
+class RecordedModel:
+    """
+    Replays recorded extraction results (ai_event.py --save or --jsonl
+    output) in turn instead of calling Gemini, for benchmarks and tests.
+    A recorded error is raised again, so failures replay too.
+    """
+    
+    # Added by EventExtractor, not part of the model's reply.
+    METADATA = ('error', 'extracted_at', 'source_image', 'preprocessing', 'backend', 'cache_hit', 'parse_repairs')
+    
+    def __init__(self, records, latency=0.0):
+        """
+        Args:
+            records (list): Result dicts to replay
+            latency (float): Seconds each call sleeps to mimic a model round trip
+        """
+        if not records:
+            raise ValueError("RecordedModel needs at least one record")
+        self.records = records
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_file(cls, path, latency=0.0):
+        """Load records from a JSON file (one result or a list) or a JSON Lines file."""
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            data = [json.loads(line) for line in text.splitlines() if line.strip()]
+        return cls(data if isinstance(data, list) else [data], latency)
+    
+    def generate_content(self, parts):
+        with self._lock:
+            record = self.records[self.calls % len(self.records)]
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if record.get('error'):
+            raise RuntimeError(record['error'].removeprefix('Error processing image: '))
+        reply = {key: value for key, value in record.items() if key not in self.METADATA}
+        return FakeResponse(json.dumps(reply))
 
 class EventExtractor:
-    def __init__(self):
+    def __init__(self, model_name=DEFAULT_MODEL, model=None, cache=None, max_retries=3, backoff=1.0,
+                 max_pixels=DEFAULT_MAX_PIXELS, jpeg_quality=DEFAULT_QUALITY, crop_margins=False,
+                 local=None, min_confidence='high'):
         """
         Initialize the EventExtractor with Gemini API key from environment variables
+        
+        Args:
+            model_name (str): Gemini model to use
+            model: Ready model object with generate_content() (e.g. FakeModel);
+                skips the API key and genai setup
+            cache (ExtractionCache): Reuse results for images seen before
+            max_retries (int): Retries of a model call after a rate limit or transient error
+            backoff (float): Base delay in seconds, doubled on every retry
+            max_pixels (int): Downscale images above this many pixels before upload;
+                None uploads them untouched
+            jpeg_quality (int): Quality of the re-encoded upload
+            crop_margins (bool): Trim blank borders before upload
+            local: In-process model tried first (e.g. local_backend.OCRModel);
+                only answers below `min_confidence` go on to the remote model.
+                With a local model the API key is optional: without one,
+                every image is answered locally.
+            min_confidence (str): Lowest local confidence (high/medium/low) accepted
+                without asking the remote model
         """
-        self.api_key = os.getenv('API_KEY')
+        self.model_name = model_name
+        self.cache = cache
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # After a rate limit every thread waits until this time.monotonic() value.
+        self._not_before = 0.0
+        self._backoff_lock = threading.Lock()
+        self.max_pixels = max_pixels
+        self.jpeg_quality = jpeg_quality
+        self.crop_margins = crop_margins
+        self.local = local
+        self.min_confidence = min_confidence
+        self.local_answers = 0
+        self.escalations = 0
+        if model is not None:
+            self.model = model
+            return
+        
+        self.api_key = _load_api_key()
+        if not self.api_key and local is not None:
+            self.model = None
+            return
         if not self.api_key:
             raise ValueError("API_KEY not found in environment variables. Please check your .env file.")
         
+        # Imported here so only processes that actually call Gemini load the SDK
+        import google.generativeai as genai
         genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        self.model = genai.GenerativeModel(model_name)
     
-    def extract_event_info(self, image_path):
+    def extract_event_info(self, image_path, source_name=None, display=True, prompt=EXTRACTION_PROMPT,
+                           schema=EVENT_SCHEMA):
         """
         Extract event information from an image using Gemini API
         
         Args:
-            image_path (str): Path to the image file
+            image_path (str or file): Path to the image file, or a binary file object
+            source_name (str): Name reported as source_image (defaults to the file name)
+            display (bool): Print the results to stdout
+            prompt (str): Instructions sent with the image
+            schema (dict): Shape the reply is validated against (see response_parser)
             
         Returns:
             dict: Extracted event information
         """
+        if source_name is None:
+            source_name = os.path.basename(image_path) if isinstance(image_path, str) else "unknown"
         try:
             # Load and process the image
-            image = Image.open(image_path)
+            image_bytes = self._read_image(image_path)
             
-            # Create a detailed prompt for event information extraction
-            prompt = """
-            Analyze this image carefully and extract the following event information:
-            
-            1. Event Name: The title or name of the event
-            2. Location: The venue, address, or place where the event will be held
-            3. Date: The date when the event will occur (format as YYYY-MM-DD if possible)
-            4. Time: The time when the event starts/ends (format as HH:MM AM/PM if possible)
-            
-            Please provide the response in the following JSON format:
-            {
-                "event_name": "extracted event name or null if not found",
-                "location": "extracted location or null if not found", 
-                "date": "extracted date in YYYY-MM-DD format or original format if can't convert or null if not found",
-                "time": "extracted time or null if not found",
-                "confidence": "high/medium/low based on clarity of information",
-                "additional_info": "any other relevant details found"
-            }
+            key = None
+            if self.cache is not None:
+                key = cache_key(image_bytes, self._cache_variant(prompt))
+                cached = self.cache.get(key)
+                if cached is not None:
+                    cached['source_image'] = source_name
+                    cached['cache_hit'] = True
+                    if display:
+                        self._display_results(cached)
+                    return cached
             
-            If any information is not clearly visible or available, set the value to null.
-            Be as accurate as possible and only extract information that is clearly visible in the image.
-            """
+            # Orient, shrink and re-encode in memory before upload
+            upload, mime_type, preprocessing = prepare_image(
+                image_bytes, self.max_pixels, self.jpeg_quality, self.crop_margins)
             
-            # Generate content using Gemini
-            response = self.model.generate_content([prompt, image])
+            # Try the local model first, then Gemini
+            parts = [prompt, {'mime_type': mime_type, 'data': upload}]
+            response, backend = self._generate_local(parts), 'local'
+            if response is None:
+                response, backend = self._generate(parts), self.model_name
             
-            # Parse the JSON response
+            # Parse the JSON response, repairing it or re-asking once if needed
             try:
-                # Extract JSON from response text
-                response_text = response.text.strip()
-                if response_text.startswith('```json'):
-                    response_text = response_text[7:-3].strip()
-                elif response_text.startswith('```'):
-                    response_text = response_text[3:-3].strip()
-                
-                event_info = json.loads(response_text)
+                event_info, repairs = self._parse(response.text, schema, local=backend == 'local')
                 
                 # Add metadata
                 event_info['extracted_at'] = datetime.now().isoformat()
-                event_info['source_image'] = os.path.basename(image_path)
+                event_info['source_image'] = source_name
+                event_info['backend'] = backend
+                
+                if key is not None:
+                    self.cache.set(key, self.model_name, event_info)
+                event_info['preprocessing'] = preprocessing
+                if repairs:
+                    event_info['parse_repairs'] = repairs
                 
                 # Display results instead of saving
-                self._display_results(event_info)
+                if display:
+                    self._display_results(event_info)
                 
                 return event_info
                 
-            except json.JSONDecodeError:
+            except ResponseParseError as e:
                 # If JSON parsing fails, return raw response
                 return {
                     "event_name": None,
@@ -90,9 +293,9 @@ class EventExtractor:
                     "time": None,
                     "confidence": "low",
                     "additional_info": response.text,
-                    "error": "Failed to parse JSON response",
+                    "error": f"Failed to parse JSON response: {e}",
                     "extracted_at": datetime.now().isoformat(),
-                    "source_image": os.path.basename(image_path)
+                    "source_image": source_name
                 }
                 
         except Exception as e:
@@ -105,9 +308,117 @@ class EventExtractor:
                 "additional_info": None,
                 "error": f"Error processing image: {str(e)}",
                 "extracted_at": datetime.now().isoformat(),
-                "source_image": os.path.basename(image_path) if os.path.exists(image_path) else "unknown"
+                "source_image": source_name
             }
     
+    def extract_events(self, image_path, source_name=None, today=None):
+        """
+        Extract every event from an image that may list several (a schedule or timetable)
+        
+        Args:
+            image_path (str or file): Path to the image file, or a binary file object
+            source_name (str): Name reported as source_image (defaults to the file name)
+            today (date): Reference date for dates written without a year
+            
+        Returns:
+            dict: Extraction metadata with an `events` list, each event
+            normalized to the events table's fields (see normalize_event)
+        """
+        result = self.extract_event_info(image_path, source_name, display=False, prompt=MULTI_EVENT_PROMPT,
+                                         schema=EVENTS_SCHEMA)
+        if result.get('error'):
+            result['events'] = []
+            return result
+        
+        # parse_response() has already turned a single-event reply into a list
+        result['events'] = [normalize_event(raw, today) for raw in result['events']]
+        return result
+    
+    def _parse(self, text, schema, local=False):
+        """
+        Parse a model reply against `schema`. If nothing usable can be
+        recovered, ask the model that wrote it (the local one if `local`)
+        once, text only, to restate its reply as valid JSON. Models that
+        cannot follow a text-only prompt are not asked.
+        
+        Returns:
+            tuple: (parsed dict, list of repairs applied)
+        
+        Raises:
+            ResponseParseError: The reply, or the restated one, is unusable
+        """
+        try:
+            return parse_response(text, schema)
+        except ResponseParseError as e:
+            model = self.local if local else self.model
+            if model is None or not getattr(model, 'follows_prompts', True):
+                raise
+            parts = [reask_prompt(text, e, schema)]
+            retry = model.generate_content(parts) if local else self._generate(parts)
+            data, repairs = parse_response(retry.text, schema)
+            return data, [f're-asked after: {e}'] + repairs
+    
+    def _generate_local(self, parts):
+        """
+        Ask the local model, if there is one. Returns its reply when it is
+        confident enough (or there is no remote model to ask), else None.
+        """
+        if self.local is None:
+            return None
+        response = None
+        try:
+            response = self.local.generate_content(parts)
+            confidence = json.loads(response.text).get('confidence')
+        except Exception:
+            # Without a remote model an unreadable reply still goes to _parse()
+            if self.model is None and response is None:
+                raise
+            confidence = None
+        if self.model is None or (confidence in CONFIDENCE_LEVELS and
+                                  CONFIDENCE_LEVELS.index(confidence) <= CONFIDENCE_LEVELS.index(self.min_confidence)):
+            self.local_answers += 1
+            return response
+        self.escalations += 1
+        return None
+    
+    def _cache_variant(self, prompt):
+        options = [self.max_pixels, self.jpeg_quality, self.crop_margins]
+        if self.local is not None:
+            # Which answers are kept locally depends on the threshold and on
+            # whether a remote model is there to escalate to.
+            options += [self.local.name, self.min_confidence, self.model is not None]
+        return variant_for(self.model_name, prompt, *options)
+    
+    def _generate(self, parts):
+        """
+        Call the model, retrying rate limits and transient errors with
+        exponential backoff and jitter. A rate limit seen by one thread
+        pauses the others too, instead of each hammering the API.
+        """
+        attempt = 0
+        while True:
+            wait = self._not_before - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                return self.model.generate_content(parts)
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                delay = min(self.backoff * 2 ** attempt, MAX_BACKOFF) * random.uniform(0.5, 1.5)
+                if _is_rate_limit(e):
+                    with self._backoff_lock:
+                        self._not_before = max(self._not_before, time.monotonic() + delay)
+                else:
+                    time.sleep(delay)
+                attempt += 1
+    
+    def _read_image(self, image):
+        if isinstance(image, str):
+            with open(image, 'rb') as f:
+                return f.read()
+        return image.read()
+    
     def _display_results(self, result):
         """
         Display extracted event information in a formatted way
@@ -125,6 +436,11 @@ class EventExtractor:
         print(f"Time: {result.get('time', 'Not found')}")
         print(f"Confidence: {result.get('confidence', 'Unknown')}")
         
+        prep = result.get('preprocessing')
+        if prep:
+            print(f"Upload: {prep['upload_bytes']} of {prep['input_bytes']} bytes, "
+                  f"{prep['upload_size'][0]}x{prep['upload_size'][1]} px ({prep['preprocess_ms']} ms)")
+        
         if result.get('additional_info'):
             print(f"Additional Info: {result.get('additional_info')}")
         
@@ -134,25 +450,69 @@ class EventExtractor:
         print(f"Extracted at: {result.get('extracted_at', 'Unknown')}")
         print("="*50)
     
-    def process_multiple_images(self, image_paths):
+    def process_multiple_images(self, image_paths, concurrency=1):
         """
         Process multiple images and extract event information from each
         
         Args:
             image_paths (list): List of image file paths
+            concurrency (int): Images processed at once; above 1 the results
+                come back in completion order
             
         Returns:
             list: List of extracted event information dictionaries
         """
         results = []
-        for image_path in image_paths:
-            print(f"Processing: {image_path}")
-            result = self.extract_event_info(image_path)
-            results.append(result)
-            print(f"✓ Completed: {os.path.basename(image_path)}")
+        if concurrency <= 1:
+            for image_path in image_paths:
+                print(f"Processing: {image_path}")
+                result = self.extract_event_info(image_path)
+                results.append(result)
+                print(f"✓ Completed: {os.path.basename(image_path)}")
+            return results
         
+        for image_path, result in self.iter_extract(image_paths, concurrency):
+            results.append(result)
+            status = f"failed: {result['error']}" if result.get('error') else "completed"
+            print(f"✓ {os.path.basename(image_path)} {status}")
         return results
     
+    def iter_extract(self, image_paths, concurrency=4, multi=False):
+        """
+        Extract event information from many images concurrently
+        
+        Args:
+            image_paths (list): List of image file paths
+            concurrency (int): Maximum model calls in flight
+            multi (bool): Use extract_events() so each image may yield several events
+            
+        Yields:
+            tuple: (image path, result dict) as each image finishes
+        """
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='extract') as pool:
+            if multi:
+                futures = {pool.submit(self.extract_events, path): path for path in image_paths}
+            else:
+                futures = {pool.submit(self.extract_event_info, path, display=False): path for path in image_paths}
+            try:
+                for future in as_completed(futures):
+                    yield futures[future], future.result()
+            finally:
+                # Stop queued work if the caller stops consuming early.
+                for future in futures:
+                    future.cancel()
+    
+    def append_jsonl(self, result, stream):
+        """
+        Write one result as a JSON line and flush it, so partial runs keep their output
+        
+        Args:
+            result (dict): Extracted event information
+            stream: Text file opened for writing
+        """
+        stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+        stream.flush()
+    
     def save_results(self, results, output_file="extracted_events.json"):
         """
         Save extracted results to a JSON file (optional - for backup purposes)
@@ -171,18 +531,69 @@ def main():
     parser.add_argument('images', nargs='+', help='Path(s) to image file(s)')
     parser.add_argument('--save', action='store_true', help='Save results to JSON file')
     parser.add_argument('--output', '-o', default='extracted_events.json', help='Output JSON file path (only used with --save)')
+    parser.add_argument('--cache', default=os.getenv('EXTRACTION_CACHE', 'extraction_cache.db'), help='Extraction cache file')
+    parser.add_argument('--no-cache', action='store_true', help='Always call the model')
+    parser.add_argument('--concurrency', '-j', type=int, default=4, help='Images processed at once')
+    parser.add_argument('--retries', type=int, default=3, help='Retries per image after rate limits or transient errors')
+    parser.add_argument('--jsonl', help='Append each result to this JSON Lines file as soon as it is ready')
+    parser.add_argument('--max-pixels', type=int, default=DEFAULT_MAX_PIXELS, help='Downscale larger images before upload')
+    parser.add_argument('--no-preprocess', action='store_true', help='Upload images exactly as they are')
+    parser.add_argument('--crop-margins', action='store_true', help='Trim blank borders before upload')
+    parser.add_argument('--multi', action='store_true', help='Extract every event from schedules and timetables')
+    parser.add_argument('--backend', choices=['remote', 'local', 'auto'], default='remote',
+                        help='Gemini only, local OCR only, or local OCR escalating to Gemini when unsure')
+    parser.add_argument('--min-confidence', choices=['high', 'medium', 'low'], default='high',
+                        help='Lowest local confidence kept without asking Gemini (with --backend auto)')
     
     args = parser.parse_args()
     
     # Initialize the extractor (API key loaded from .env)
+    cache = None if args.no_cache else ExtractionCache(args.cache)
+    options = {}
+    if args.backend != 'remote':
+        from local_backend import OCRModel
+        if args.backend == 'local':
+            options = {'model_name': 'local', 'model': OCRModel()}
+        else:
+            options = {'local': OCRModel(), 'min_confidence': args.min_confidence}
     try:
-        extractor = EventExtractor()
+        extractor = EventExtractor(cache=cache, max_retries=args.retries,
+                                   max_pixels=None if args.no_preprocess else args.max_pixels,
+                                   crop_margins=args.crop_margins, **options)
     except ValueError as e:
         print(f"Error: {e}")
         return
     
+    if args.jsonl:
+        # Stream results to disk in completion order instead of collecting them
+        done = 0
+        with open(args.jsonl, 'a', encoding='utf-8') as out:
+            for image_path, result in extractor.iter_extract(args.images, args.concurrency, args.multi):
+                extractor.append_jsonl(result, out)
+                done += 1
+                status = f"failed: {result['error']}" if result.get('error') else "completed"
+                print(f"[{done}/{len(args.images)}] {os.path.basename(image_path)} {status}")
+        print(f"Results written to: {args.jsonl}")
+    
+    elif args.multi:
+        # Every event on every image, normalized to the events table's formats
+        results = []
+        for image_path, result in extractor.iter_extract(args.images, args.concurrency, multi=True):
+            results.append(result)
+            print(f"\n{os.path.basename(image_path)}: {len(result['events'])} event(s)")
+            if result.get('error'):
+                print(f"Error: {result['error']}")
+            for event in result['events']:
+                print(f"  {event['event_date'] or '????-??-??'} {event['start_time'] or '--:--'}-"
+                      f"{event['end_time'] or '--:--'}  {event['name']} @ {event['venue'] or 'Not found'}")
+                for warning in event['warnings']:
+                    print(f"    ! {warning}")
+        
+        if args.save:
+            extractor.save_results(results, args.output)
+    
     # Process images
-    if len(args.images) == 1:
+    elif len(args.images) == 1:
         # Single image
         result = extractor.extract_event_info(args.images[0])
         
@@ -191,11 +602,20 @@ def main():
             extractor.save_results(result, args.output)
     else:
         # Multiple images
-        results = extractor.process_multiple_images(args.images)
+        results = extractor.process_multiple_images(args.images, args.concurrency)
         
         # Optionally save results
         if args.save:
             extractor.save_results(results, args.output)
+    
+    if extractor.local is not None:
+        print(f"Local backend: {extractor.local_answers} answered, {extractor.escalations} escalated")
+    
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"(lifetime hit rate: {stats['lifetime_hit_rate']})")
+        cache.close()
 
 # Example usage function for interactive use
 def interactive_example():
@@ -1,96 +1,47 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
-import sqlite3
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, abort
 import os
-from datetime import datetime, date, timedelta
+from datetime import datetime, date
 import calendar
-import json
 from functools import wraps
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-import tempfile
+import cache
+import db
+import migrations
+import scan_jobs
+import venues
+import calendar_range
+import feeds
+from db import get_db, write, execute_write
+from search import search_events, search_participants, search_result
+from pagination import KeysetQuery, list_response
+from exports import EXPORTS, REPORT_SECTIONS, csv_response, event_window_export
+from columnar_export import TABLES as COLUMNAR_TABLES, columnar_response
+from bulk_import import IMPORTERS, RowError, detect_format, insert_events, run_import, validate_event
+from stats import dashboard_counts, report_stats
+from cache import CachedPage, month_scope
+from calendar_range import MAX_PER_DAY, month_scopes, parse_range, range_summary, term_starts
+from scan_jobs import QueueFull, get_job, get_scan_jobs, unavailable_reason
+from duty_conflicts import DutyConflict, audit as audit_duty_conflicts, check_assignment
+from roster import RosterError, generate as generate_roster
+from venues import VenueClash, batch_clashes, delete_event as delete_event_row, get_venue_index, save_event, \
+    save_exception, save_series
+from recurrence import delete_series, describe as describe_series, expand as expand_series, set_exception, \
+    validate_series
+from feeds import KINDS as FEED_KINDS, check_token as check_feed_token, feed_response, feed_token, get_feeds
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'
+db.init_app(app)
+cache.init_app(app)
+scan_jobs.init_app(app)
+migrations.migrate(app.config['DATABASE'])
+venues.init_app(app)
+calendar_range.init_app(app)
+feeds.init_app(app)
 
-def init_db():
-    conn = sqlite3.connect('events.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            type TEXT NOT NULL,
-            event_date DATE NOT NULL,
-            start_time TIME NOT NULL,
-            end_time TIME NOT NULL,
-            venue TEXT NOT NULL,
-            description TEXT,
-            host_school TEXT NOT NULL,
-            participating_schools TEXT,
-            status TEXT DEFAULT 'upcoming',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS participants (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            unique_id TEXT UNIQUE NOT NULL,
-            name TEXT NOT NULL,
-            type TEXT NOT NULL CHECK (type IN ('student')),
-            class_dept TEXT NOT NULL,
-            school TEXT NOT NULL,
-            grade TEXT,
-            contact TEXT,
-            emergency_contact TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS duty_personnel (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            designation TEXT,
-            school TEXT,
-            contact TEXT,
-            email TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            role TEXT DEFAULT 'user',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS duties (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            event_id INTEGER NOT NULL,
-            duty_person_id INTEGER NOT NULL,
-            duty_type TEXT NOT NULL,
-            duty_date DATE NOT NULL,
-            start_time TIME NOT NULL,
-            end_time TIME NOT NULL,
-            location TEXT NOT NULL,
-            description TEXT,
-            notes TEXT,
-            assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (event_id) REFERENCES events (id) ON DELETE CASCADE,
-            FOREIGN KEY (duty_person_id) REFERENCES duty_personnel (id) ON DELETE CASCADE
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-def get_db_connection():
-    conn = sqlite3.connect('events.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+EVENT_FIELDS = ('name', 'type', 'event_date', 'start_time', 'end_time', 'venue',
+                'description', 'host_school', 'participating_schools')
 
 def login_required(f):
     @wraps(f)
@@ -101,11 +52,36 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def get_or_create_duty_person(conn, name):
+    person = conn.execute('SELECT id FROM duty_personnel WHERE name = ?', (name,)).fetchone()
+    if person:
+        return person['id']
+    cursor = conn.execute('INSERT INTO duty_personnel (name, designation, school) VALUES (?, "", "")',
+                          (name,))
+    return cursor.lastrowid
+
+def save_event_form(event_id=None):
+    """
+    Save the posted event form, refusing a venue clash unless "Book anyway"
+    was ticked (or VENUE_CLASHES allows it) and keeping the venue index current.
+
+    Raises:
+        VenueClash: The venue is already booked at that time
+    """
+    row = {field: request.form[field] for field in EVENT_FIELDS}
+    index = get_venue_index()
+    policy = 'warn' if request.form.get('allow_clash') else app.config['VENUE_CLASHES']
+    saved_id, clashes, versions = write(lambda conn: save_event(conn, index, row, event_id, policy))
+    index.saved(saved_id, row, versions)
+    if clashes:
+        flash(f"{row['venue']} is also booked then for {', '.join(clash['name'] for clash in clashes)}", 'warning')
+    return saved_id
+
 def get_calendar_data(year, month):
     cal = calendar.monthcalendar(year, month)
     month_name = calendar.month_name[month]
     
-    conn = get_db_connection()
+    conn = get_db()
     start_date = date(year, month, 1)
     last_day = calendar.monthrange(year, month)[1]
     end_date = date(year, month, last_day)
@@ -115,8 +91,6 @@ def get_calendar_data(year, month):
         WHERE event_date >= ? AND event_date <= ?
         ORDER BY event_date, start_time
     ''', (start_date, end_date)).fetchall()
-
-    conn.close()
     
     events_by_date = {}
     for event in events:
@@ -124,6 +98,10 @@ def get_calendar_data(year, month):
         if event_date not in events_by_date:
             events_by_date[event_date] = []
         events_by_date[event_date].append(event)
+    for occurrence in expand_series(conn, start_date, end_date):
+        events_by_date.setdefault(occurrence['event_date'], []).append(occurrence)
+    for listed in events_by_date.values():
+        listed.sort(key=lambda event: event['start_time'])
     
     from datetime import datetime as dt
     return {
@@ -145,21 +123,43 @@ def calendar_view():
     year = int(request.args.get('year', datetime.now().year))
     month = int(request.args.get('month', datetime.now().month))
     
-    calendar_data = get_calendar_data(year, month)
-    return render_template('calendar.html', **calendar_data)
+    page = CachedPage('calendar', [month_scope(year, month), 'event_series'], vary=(year, month))
+    return page.respond(lambda: page.get_or_compute(
+        lambda: render_template('calendar.html', **get_calendar_data(year, month))))
+
+@app.route('/api/calendar')
+@login_required
+def api_calendar():
+    """
+    Event summary for a date range, for calendar views of any size:
+    ?start=2026-09-01&end=2026-12-31&granularity=month, or
+    ?granularity=week|month|term&date=2026-10-20 for the period around a date.
+    """
+    try:
+        terms = term_starts(app.config['CALENDAR_TERM_STARTS'])
+        start, end, granularity = parse_range(request.args, terms)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    per_day = min(max(request.args.get('per_day', 3, type=int), 0), MAX_PER_DAY)
+    
+    page = CachedPage('calendar range', month_scopes(start, end) + ['event_series'],
+                      vary=(start, end, granularity, per_day))
+    return page.respond(lambda: jsonify(page.get_or_compute(
+        lambda: range_summary(get_db(), start, end, granularity, terms, per_day))))
 
 @app.route('/calendar/<int:year>/<int:month>/<int:day>')
 @login_required
 def day_events(year, month, day):
     selected_date = date(year, month, day)
     
-    conn = get_db_connection()
+    conn = get_db()
     events = conn.execute('''
         SELECT * FROM events 
         WHERE event_date = ?
         ORDER BY start_time
     ''', (selected_date,)).fetchall()
-    conn.close()
+    events = sorted(events + expand_series(conn, selected_date, selected_date),
+                    key=lambda event: event['start_time'])
     
     return render_template('day_events.html', 
                          events=events, 
@@ -170,25 +170,12 @@ def day_events(year, month, day):
 @login_required
 def add_calendar_event():
     if request.method == 'POST':
-        name = request.form['name']
-        event_type = request.form['type']
-        event_date = request.form['event_date']
-        start_time = request.form['start_time']
-        end_time = request.form['end_time']
-        venue = request.form['venue']
-        description = request.form['description']
-        host_school = request.form['host_school']
-        participating_schools = request.form['participating_schools']
-        
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO events (name, type, event_date, start_time, end_time, venue,
-                              description, host_school, participating_schools)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (name, event_type, event_date, start_time, end_time, venue,
-              description, host_school, participating_schools))
-        conn.commit()
-        conn.close()
+        try:
+            save_event_form()
+        except VenueClash as e:
+            flash(str(e), 'error')
+            return render_template('add_calendar_event.html', prefill_date=request.form['event_date'],
+                                   clashes=e.clashes), 409
         
         flash('Event added successfully!', 'success')
         
@@ -198,7 +185,6 @@ def add_calendar_event():
 
         return redirect(url_for('calendar_view', year=year, month=month))
     
-    
     year = request.args.get('year', datetime.now().year)
     month = request.args.get('month', datetime.now().month)
     day = request.args.get('day', datetime.now().day)
@@ -213,78 +199,75 @@ def index():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    conn = get_db_connection()
-    
-    total_events = conn.execute('SELECT COUNT(*) as count FROM events').fetchone()['count']
-    total_participants = conn.execute('SELECT COUNT(*) as count FROM participants WHERE type = "student"').fetchone()['count']
-    total_duty_personnel = conn.execute('SELECT COUNT(*) as count FROM duty_personnel').fetchone()['count']
-    total_duties = conn.execute('SELECT COUNT(*) as count FROM duties').fetchone()['count']
-
-    upcoming_events = conn.execute('''
-        SELECT * FROM events 
-        WHERE event_date >= DATE('now') 
-        ORDER BY event_date ASC 
-        LIMIT 5
-    ''').fetchall()
-
-    conn.close()
-    
-    return render_template('dashboard.html', 
-                         total_events=total_events,
-                         total_participants=total_participants,
-                         total_duty_personnel=total_duty_personnel,
-                         total_duties=total_duties,
-                         upcoming_events=upcoming_events)
+    def load():
+        conn = get_db()
+        upcoming_events = conn.execute('''
+            SELECT * FROM events 
+            WHERE event_date >= DATE('now') 
+            ORDER BY event_date ASC 
+            LIMIT 5
+        ''').fetchall()
+        return dict(dashboard_counts(conn), upcoming_events=upcoming_events)
+    
+    page = CachedPage('dashboard', ['events', 'participants', 'duty_personnel', 'duties'], per_user=True)
+    return page.respond(lambda: render_template('dashboard.html', **page.get_or_compute(load)))
 
 @app.route('/events')
 @login_required
 def events():
-    conn = get_db_connection()
+    conn = get_db()
     filter_type = request.args.get('filter', 'all')
     search = request.args.get('search', '')
     
+    if search.strip():
+        events = search_events(conn, search, filter_type, order_by='date', limit=None)
+        return render_template('events.html', events=events, filter_type=filter_type, search=search)
+    
     query = 'SELECT * FROM events WHERE 1=1'
-    params = []
     
     if filter_type == 'upcoming':
         query += ' AND event_date >= DATE("now")'
     elif filter_type == 'completed':
         query += ' AND event_date < DATE("now")'
     
-    if search:
-        query += ' AND (name LIKE ? OR type LIKE ? OR venue LIKE ?)'
-        params.extend([f'%{search}%', f'%{search}%', f'%{search}%'])
-    
     query += ' ORDER BY event_date ASC'
     
-    events = conn.execute(query, params).fetchall()
-    conn.close()
+    events = conn.execute(query).fetchall()
+    series = [dict(row, rule=describe_series(row))
+              for row in conn.execute('SELECT * FROM event_series ORDER BY start_date, id')]
     
-    return render_template('events.html', events=events, filter_type=filter_type, search=search)
+    return render_template('events.html', events=events, series=series, filter_type=filter_type, search=search)
 
 @app.route('/events/add', methods=['GET', 'POST'])
 @login_required
 def add_event():
     if request.method == 'POST':
-        name = request.form['name']
-        event_type = request.form['type']
-        event_date = request.form['event_date']
-        start_time = request.form['start_time']
-        end_time = request.form['end_time']
-        venue = request.form['venue']
-        description = request.form['description']
-        host_school = request.form['host_school']
-        participating_schools = request.form['participating_schools']
+        if request.form.get('repeat'):
+            # A repeating event is stored once, as a series.
+            record = dict(request.form.to_dict(), frequency=request.form['repeat'],
+                          until=request.form.get('repeat_until', ''))
+            try:
+                row = validate_series(record)
+            except RowError as e:
+                flash(str(e), 'error')
+                return render_template('add_event.html'), 400
+            index = get_venue_index()
+            policy = 'warn' if request.form.get('allow_clash') else app.config['VENUE_CLASHES']
+            try:
+                _, clashes = write(lambda conn: save_series(conn, index, row, policy))
+            except VenueClash as e:
+                flash(str(e), 'error')
+                return render_template('add_event.html', clashes=e.clashes), 409
+            if clashes:
+                flash(f"{row['venue']} is also booked on {len(clashes)} of these dates", 'warning')
+            flash(f"Recurring event added: {describe_series(row)}", 'success')
+            return redirect(url_for('events'))
         
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO events (name, type, event_date, start_time, end_time, venue, 
-                              description, host_school, participating_schools)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (name, event_type, event_date, start_time, end_time, venue, 
-              description, host_school, participating_schools))
-        conn.commit()
-        conn.close()
+        try:
+            save_event_form()
+        except VenueClash as e:
+            flash(str(e), 'error')
+            return render_template('add_event.html', clashes=e.clashes), 409
         
         flash('Event added successfully!', 'success')
         return redirect(url_for('events'))
@@ -294,61 +277,63 @@ def add_event():
 @app.route('/events/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_event(id):
-    conn = get_db_connection()
+    conn = get_db()
     event = conn.execute('SELECT * FROM events WHERE id = ?', (id,)).fetchone()
+    if event is None:
+        abort(404)
     
     if request.method == 'POST':
-        name = request.form['name']
-        event_type = request.form['type']
-        event_date = request.form['event_date']
-        start_time = request.form['start_time']
-        end_time = request.form['end_time']
-        venue = request.form['venue']
-        description = request.form['description']
-        host_school = request.form['host_school']
-        participating_schools = request.form['participating_schools']
-        
-        conn.execute('''
-            UPDATE events SET name = ?, type = ?, event_date = ?, start_time = ?, 
-                           end_time = ?, venue = ?, description = ?, host_school = ?, 
-                           participating_schools = ? WHERE id = ?
-        ''', (name, event_type, event_date, start_time, end_time, venue, 
-              description, host_school, participating_schools, id))
-        conn.commit()
-        conn.close()
+        try:
+            save_event_form(id)
+        except VenueClash as e:
+            flash(str(e), 'error')
+            # Show what was submitted rather than the stored event.
+            submitted = dict(event)
+            submitted.update(request.form.to_dict())
+            return render_template('edit_event.html', event=submitted, clashes=e.clashes), 409
         
         flash('Event updated successfully!', 'success')
         return redirect(url_for('events'))
     
-    conn.close()
     return render_template('edit_event.html', event=event)
 
 @app.route('/events/<int:id>/delete', methods=['POST'])
 @login_required
 def delete_event(id):
-    conn = get_db_connection()
-    conn.execute('DELETE FROM events WHERE id = ?', (id,))
-    conn.commit()
-    conn.close()
+    versions = write(lambda conn: delete_event_row(conn, id))
+    get_venue_index().saved(id, None, versions)
     
     flash('Event deleted successfully!', 'success')
     return redirect(url_for('events'))
 
+@app.route('/series/<int:series_id>/delete', methods=['POST'])
+@login_required
+def delete_series_view(series_id):
+    write(lambda conn: delete_series(conn, series_id))
+    
+    flash('Recurring event deleted successfully!', 'success')
+    return redirect(url_for('events'))
+
+@app.route('/series/<int:series_id>/cancel/<occurrence_date>', methods=['POST'])
+@login_required
+def cancel_occurrence(series_id, occurrence_date):
+    try:
+        write(lambda conn: set_exception(conn, series_id, {'occurrence_date': occurrence_date, 'cancelled': True}))
+        flash(f'Occurrence on {occurrence_date} cancelled', 'success')
+    except RowError as e:
+        flash(str(e), 'error')
+    return redirect(request.referrer or url_for('calendar_view'))
+
 @app.route('/participants')
 @login_required
 def participants():
-    conn = get_db_connection()
+    conn = get_db()
     search = request.args.get('search', '')
     
-    query = 'SELECT * FROM participants WHERE type = "student"'
-    params = []
-    
-    if search:
-        query += ' AND (name LIKE ? OR class_dept LIKE ?)'
-        params.extend([f'%{search}%', f'%{search}%'])
-    
-    participants = conn.execute(query, params).fetchall()
-    conn.close()
+    if search.strip():
+        participants = search_participants(conn, search, limit=None)
+    else:
+        participants = conn.execute('SELECT * FROM participants WHERE type = "student"').fetchall()
     
     return render_template('participants.html', participants=participants, search=search)
 
@@ -369,13 +354,10 @@ def add_participant():
         else:
             class_dept = school
         
-        conn = get_db_connection()
-        conn.execute('''
+        execute_write('''
             INSERT INTO participants (unique_id, name, type, class_dept, school, contact, emergency_contact)
             VALUES (?, ?, ?, ?, ?, ?, ?)
         ''', (unique_id, name, participant_type, class_dept, school, contact, emergency_contact))
-        conn.commit()
-        conn.close()
         
         flash('Participant added successfully!', 'success')
         return redirect(url_for('participants'))
@@ -385,7 +367,7 @@ def add_participant():
 @app.route('/participants/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_participant(id):
-    conn = get_db_connection()
+    conn = get_db()
     participant = conn.execute('SELECT * FROM participants WHERE id = ?', (id,)).fetchone()
     
     if request.method == 'POST':
@@ -402,26 +384,20 @@ def edit_participant(id):
         else:
             class_dept = school
         
-        conn.execute('''
+        execute_write('''
             UPDATE participants SET unique_id = ?, name = ?, type = ?, class_dept = ?, school = ?, 
                            contact = ?, emergency_contact = ? WHERE id = ?
         ''', (unique_id, name, participant_type, class_dept, school, contact, emergency_contact, id))
-        conn.commit()
-        conn.close()
         
         flash('Participant updated successfully!', 'success')
         return redirect(url_for('participants'))
     
-    conn.close()
     return render_template('edit_participant.html', participant=participant)
 
 @app.route('/participants/<int:id>/delete', methods=['POST'])
 @login_required
 def delete_participant(id):
-    conn = get_db_connection()
-    conn.execute('DELETE FROM participants WHERE id = ?', (id,))
-    conn.commit()
-    conn.close()
+    execute_write('DELETE FROM participants WHERE id = ?', (id,))
     
     flash('Participant deleted successfully!', 'success')
     return redirect(url_for('participants'))
@@ -429,7 +405,7 @@ def delete_participant(id):
 @app.route('/duties')
 @login_required
 def duties():
-    conn = get_db_connection()
+    conn = get_db()
     
     duties = conn.execute('''
         SELECT d.*, e.name as event_name, e.event_date as event_date,
@@ -443,8 +419,6 @@ def duties():
     events = conn.execute('SELECT id, name, event_date FROM events ORDER BY event_date').fetchall()
     duty_personnel = conn.execute('SELECT id, name, designation FROM duty_personnel ORDER BY name').fetchall()
     
-    conn.close()
-    
     return render_template('duties.html', duties=duties, events=events, 
                          duty_personnel=duty_personnel)
 
@@ -465,34 +439,31 @@ def assign_duty():
         end_time = time_parts[1].strip() if len(time_parts) > 1 else start_time
         
         person_name = request.form['teacher_name'].strip()
+        allow_conflicts = bool(request.form.get('allow_conflicts'))
+        
+        def insert_duty(conn):
+            duty_person_id = get_or_create_duty_person(conn, person_name)
+            if not allow_conflicts:
+                check_assignment(conn, duty_person_id, person_name, duty_date, start_time, end_time)
+            conn.execute('''
+                INSERT INTO duties (event_id, duty_person_id, duty_type, 
+                                  duty_date, start_time, end_time, location, description, notes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (event_id, duty_person_id, duty_type, 
+                  duty_date, start_time, end_time, location, description, notes))
         
-        conn = get_db_connection()
-        
-        person = conn.execute('SELECT id FROM duty_personnel WHERE name = ?', 
-                             (person_name,)).fetchone()
-        
-        if person:
-            duty_person_id = person['id']
-        else:
-            cursor = conn.execute('INSERT INTO duty_personnel (name, designation, school) VALUES (?, "", "")',
-                                (person_name,))
-            duty_person_id = cursor.lastrowid
-        
-        conn.execute('''
-            INSERT INTO duties (event_id, duty_person_id, duty_type, 
-                              duty_date, start_time, end_time, location, description, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (event_id, duty_person_id, duty_type, 
-              duty_date, start_time, end_time, location, description, notes))
-        conn.commit()
-        conn.close()
+        try:
+            write(insert_duty)
+        except DutyConflict as e:
+            flash(f'{e}. Tick "Assign anyway" to double-book.', 'error')
+            events = get_db().execute('SELECT id, name, event_date, venue FROM events ORDER BY event_date').fetchall()
+            return render_template('add_duty.html', events=events, conflicts=e.conflicts), 409
         
         flash('Duty assigned successfully!', 'success')
         return redirect(url_for('duties'))
     
-    conn = get_db_connection()
+    conn = get_db()
     events = conn.execute('SELECT id, name, event_date, venue FROM events ORDER BY event_date').fetchall()
-    conn.close()
     
     return render_template('add_duty.html', events=events)
 
@@ -504,7 +475,7 @@ def add_duty():
 @app.route('/duties/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_duty(id):
-    conn = get_db_connection()
+    conn = get_db()
     duty = conn.execute('SELECT * FROM duties WHERE id = ?', (id,)).fetchone()
     
     if request.method == 'POST':
@@ -520,79 +491,153 @@ def edit_duty(id):
         time_parts = time_slot.split(' - ')
         start_time = time_parts[0].strip()
         end_time = time_parts[1].strip() if len(time_parts) > 1 else start_time
+        allow_conflicts = bool(request.form.get('allow_conflicts'))
+        
+        def update_duty(conn):
+            duty_person_id = get_or_create_duty_person(conn, person_name)
+            if not allow_conflicts:
+                check_assignment(conn, duty_person_id, person_name, duty_date, start_time, end_time, exclude_id=id)
+            conn.execute('''
+                UPDATE duties SET event_id = ?, duty_person_id = ?, duty_type = ?,
+                               duty_date = ?, start_time = ?, end_time = ?, location = ?, 
+                               description = ?, notes = ? WHERE id = ?
+            ''', (event_id, duty_person_id, duty_type, duty_date, 
+                  start_time, end_time, location, description, notes, id))
         
-        conn = get_db_connection()
-        
-        person = conn.execute('SELECT id FROM duty_personnel WHERE name = ?', 
-                             (person_name,)).fetchone()
-        
-        if person:
-            duty_person_id = person['id']
-        else:
-            cursor = conn.execute('INSERT INTO duty_personnel (name, designation, school) VALUES (?, "", "")',
-                                (person_name,))
-            duty_person_id = cursor.lastrowid
-        
-        conn.execute('''
-            UPDATE duties SET event_id = ?, duty_person_id = ?, duty_type = ?,
-                           duty_date = ?, start_time = ?, end_time = ?, location = ?, 
-                           description = ?, notes = ? WHERE id = ?
-        ''', (event_id, duty_person_id, duty_type, duty_date, 
-              start_time, end_time, location, description, notes, id))
-        conn.commit()
-        conn.close()
+        try:
+            write(update_duty)
+        except DutyConflict as e:
+            flash(f'{e}. Tick "Assign anyway" to double-book.', 'error')
+            events = conn.execute('SELECT id, name, event_date, venue FROM events ORDER BY event_date').fetchall()
+            duty_personnel = conn.execute('SELECT id, name, designation FROM duty_personnel ORDER BY name').fetchall()
+            # Show what was submitted rather than the stored duty.
+            submitted = dict(duty)
+            submitted.update(request.form.to_dict(), name=person_name,
+                             event_id=request.form.get('event_id', type=int))
+            return render_template('edit_duty.html', duty=submitted, events=events, duty_personnel=duty_personnel,
+                                   conflicts=e.conflicts), 409
         
         flash('Duty updated successfully!', 'success')
         return redirect(url_for('duties'))
     
     events = conn.execute('SELECT id, name, event_date, venue FROM events ORDER BY event_date').fetchall()
     duty_personnel = conn.execute('SELECT id, name, designation FROM duty_personnel ORDER BY name').fetchall()
-    conn.close()
     
     return render_template('edit_duty.html', duty=duty, events=events, duty_personnel=duty_personnel)
 
 @app.route('/duties/<int:id>/delete', methods=['POST'])
 @login_required
 def delete_duty(id):
-    conn = get_db_connection()
-    conn.execute('DELETE FROM duties WHERE id = ?', (id,))
-    conn.commit()
-    conn.close()
+    execute_write('DELETE FROM duties WHERE id = ?', (id,))
     
     flash('Duty deleted successfully!', 'success')
     return redirect(url_for('duties'))
 
+EVENTS_LISTING = KeysetQuery(
+    'SELECT * FROM events e',
+    ['e.event_date', 'e.start_time', 'e.id'],
+    ['event_date', 'start_time', 'id'],
+)
+
+PARTICIPANTS_LISTING = KeysetQuery('SELECT * FROM participants p', ['p.id'], ['id'])
+
+DUTIES_LISTING = KeysetQuery('''
+    SELECT d.*, e.name as event_name, dp.name as person_name
+    FROM duties d
+    JOIN events e ON d.event_id = e.id
+    JOIN duty_personnel dp ON d.duty_person_id = dp.id
+''', ['d.id'], ['id'])
+
 @app.route('/api/events')
 @login_required
 def api_events():
-    conn = get_db_connection()
-    events = conn.execute('SELECT * FROM events ORDER BY event_date').fetchall()
-    conn.close()
-    
-    return jsonify([dict(event) for event in events])
+    return list_response(EVENTS_LISTING)
 
 @app.route('/api/participants')
 @login_required
 def api_participants():
-    conn = get_db_connection()
-    participants = conn.execute('SELECT * FROM participants').fetchall()
-    conn.close()
-    
-    return jsonify([dict(participant) for participant in participants])
+    return list_response(PARTICIPANTS_LISTING)
 
 @app.route('/api/duties')
 @login_required
 def api_duties():
-    conn = get_db_connection()
-    duties = conn.execute('''
-        SELECT d.*, e.name as event_name, dp.name as person_name
-        FROM duties d
-        JOIN events e ON d.event_id = e.id
-        JOIN duty_personnel dp ON d.duty_person_id = dp.id
-    ''').fetchall()
-    conn.close()
-    
-    return jsonify([dict(duty) for duty in duties])
+    return list_response(DUTIES_LISTING)
+
+@app.route('/api/venues/free-slots')
+@login_required
+def api_venue_free_slots():
+    """
+    When a venue is free on a date, from the in-memory venue index:
+    ?venue=Main Hall&date=2026-10-20[&from=08:00&to=18:00&min_minutes=30]
+    """
+    venue = request.args.get('venue', '').strip()
+    day = request.args.get('date', '')
+    try:
+        date.fromisoformat(day)
+    except ValueError:
+        return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
+    if not venue:
+        return jsonify({'error': 'venue is required'}), 400
+    day_start = request.args.get('from', app.config['VENUE_DAY_START'])
+    day_end = request.args.get('to', app.config['VENUE_DAY_END'])
+    min_minutes = max(request.args.get('min_minutes', 1, type=int), 1)
+    
+    conn = get_db()
+    index = get_venue_index()
+    try:
+        free = index.free_slots(conn, venue, day, day_start, day_end, min_minutes)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'venue': venue,
+        'date': day,
+        'from': day_start,
+        'to': day_end,
+        'booked': index.booked(conn, venue, day),
+        'free': free,
+    })
+
+@app.route('/api/duties/conflicts')
+@login_required
+def api_duty_conflicts():
+    """Audit every duty: each pair of overlapping duties for the same person and day."""
+    conflicts = audit_duty_conflicts(get_db())
+    return jsonify({'conflicts': conflicts, 'count': len(conflicts)})
+
+@app.route('/api/search')
+@login_required
+def api_search():
+    q = request.args.get('q', '')
+    scope = request.args.get('scope', 'all')
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    
+    if scope not in ('all', 'events', 'participants'):
+        return jsonify({'error': 'scope must be one of all, events, participants'}), 400
+    
+    conn = get_db()
+    results = {'query': q}
+    if scope in ('all', 'events'):
+        results['events'] = [search_result(row) for row in search_events(conn, q, limit=limit)]
+    if scope in ('all', 'participants'):
+        results['participants'] = [search_result(row) for row in search_participants(conn, q, limit=limit)]
+    
+    return jsonify(results)
+
+@app.route('/health/db')
+def db_health():
+    pool = db.get_pool()
+    healthy = pool.health_check()
+    return jsonify({
+        'status': 'ok' if healthy else 'unavailable',
+        'journal_mode': app.extensions['db_journal_mode'],
+        'pool': pool.stats(),
+        'writer': db.get_writer().stats(),
+        'page_cache': cache.get_cache().stats(),
+        'venue_index': get_venue_index().stats(),
+        'ics_feeds': get_feeds().stats(),
+        'scan_jobs': dict(get_scan_jobs().stats(), unavailable=unavailable_reason(app)),
+        'extraction_cache': app.extensions['extraction_cache'].stats() if 'extraction_cache' in app.extensions else None,
+    }), 200 if healthy else 503
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -600,9 +645,8 @@ def login():
         username = request.form['username']
         password = request.form['password']
         
-        conn = get_db_connection()
+        conn = get_db()
         user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-        conn.close()
         
         if user and check_password_hash(user['password_hash'], password):
             session['user_id'] = user['id']
@@ -632,18 +676,15 @@ def register():
             flash('Passwords do not match', 'error')
             return render_template('register.html')
         
-        conn = get_db_connection()
+        conn = get_db()
         existing_user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
         
         if existing_user:
             flash('Username already exists', 'error')
-            conn.close()
             return render_template('register.html')
         
         password_hash = generate_password_hash(password)
-        conn.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', (username, password_hash))
-        conn.commit()
-        conn.close()
+        execute_write('INSERT INTO users (username, password_hash) VALUES (?, ?)', (username, password_hash))
         
         flash('Registration successful! Please login.', 'success')
         return redirect(url_for('login'))
@@ -653,223 +694,80 @@ def register():
 @app.route('/reports')
 @login_required
 def reports():
-    conn = get_db_connection()
-    
-    total_events = conn.execute('SELECT COUNT(*) as count FROM events').fetchone()['count']
-    total_participants = conn.execute('SELECT COUNT(*) as count FROM participants').fetchone()['count']
-    total_duties = conn.execute('SELECT COUNT(*) as count FROM duties').fetchone()['count']
-    
-    event_types = conn.execute('''
-        SELECT type, COUNT(*) as count 
-        FROM events 
-        GROUP BY type 
-        ORDER BY count DESC
-    ''').fetchall()
-    
-    monthly_events = conn.execute('''
-        SELECT strftime('%Y-%m', event_date) as month, COUNT(*) as count
-        FROM events
-        WHERE event_date >= date('now', '-12 months')
-        GROUP BY strftime('%Y-%m', event_date)
-        ORDER BY month
-    ''').fetchall()
-    
-    top_schools = conn.execute('''
-        SELECT school, COUNT(*) as count 
-        FROM participants 
-        GROUP BY school 
-        ORDER BY count DESC 
-        LIMIT 10
-    ''').fetchall()
-    
-    duty_stats = conn.execute('''
-        SELECT duty_type, COUNT(*) as count 
-        FROM duties 
-        GROUP BY duty_type
-    ''').fetchall()
-    
-    conn.close()
-    
-    return render_template('reports.html',
-                         total_events=total_events,
-                         total_participants=total_participants,
-                         total_duties=total_duties,
-                         event_types=event_types,
-                         monthly_events=monthly_events,
-                         top_schools=top_schools,
-                         duty_stats=duty_stats)
+    page = CachedPage('reports', ['events', 'participants', 'duties'], per_user=True)
+    return page.respond(lambda: render_template('reports.html', **page.get_or_compute(
+        lambda: report_stats(get_db()))))
 
 @app.route('/reports/export')
 @login_required
 def export_reports():
-    import csv
-    from io import StringIO
-    from flask import make_response
-    
-    conn = get_db_connection()
-    
-    events = conn.execute('SELECT * FROM events ORDER BY event_date').fetchall()
-    participants = conn.execute('SELECT * FROM participants ORDER BY name').fetchall()
-    duties = conn.execute('''
-        SELECT d.*, e.name as event_name, dp.name as person_name
-        FROM duties d
-        JOIN events e ON d.event_id = e.id
-        JOIN duty_personnel dp ON d.duty_person_id = dp.id
-        ORDER BY d.duty_date
-    ''').fetchall()
-    
-    conn.close()
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    writer.writerow(['Events Report'])
-    writer.writerow(['ID', 'Name', 'Type', 'Date', 'Start Time', 'End Time', 'Venue', 'Host School'])
-    for event in events:
-        writer.writerow([event['id'], event['name'], event['type'], event['event_date'], 
-                        event['start_time'], event['end_time'], event['venue'], event['host_school']])
-    
-    writer.writerow([])
-    writer.writerow(['Participants Report'])
-    writer.writerow(['ID', 'Unique ID', 'Name', 'Type', 'Class/Dept', 'School', 'Contact'])
-    for participant in participants:
-        writer.writerow([participant['id'], participant['unique_id'], participant['name'], 
-                        participant['type'], participant['class_dept'], participant['school'], 
-                        participant['contact']])
-    
-    writer.writerow([])
-    writer.writerow(['Duties Report'])
-    writer.writerow(['ID', 'Event Name', 'Person Name', 'Duty Type', 'Date', 'Time', 'Location'])
-    for duty in duties:
-        writer.writerow([duty['id'], duty['event_name'], duty['person_name'], 
-                        duty['duty_type'], duty['duty_date'], 
-                        f"{duty['start_time']} - {duty['end_time']}", duty['location']])
-    
-    csv_content = output.getvalue()
-    
-    response = make_response(csv_content)
-    response.headers['Content-Disposition'] = 'attachment; filename=event_reports.csv'
-    response.headers['Content-Type'] = 'text/csv'
-    
-    return response
-
-@app.route('/export/events')
-@login_required
-def export_events():
-    import csv
-    from io import StringIO
-    from flask import make_response
-    
-    conn = get_db_connection()
-    events = conn.execute('SELECT * FROM events ORDER BY event_date').fetchall()
-    conn.close()
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Name', 'Type', 'Date', 'Start Time', 'End Time', 'Venue', 'Host School', 'Description'])
-    for event in events:
-        writer.writerow([event['id'], event['name'], event['type'], event['event_date'], 
-                        event['start_time'], event['end_time'], event['venue'], 
-                        event['host_school'], event['description']])
-    
-    response = make_response(output.getvalue())
-    response.headers['Content-Disposition'] = 'attachment; filename=events.csv'
-    response.headers['Content-Type'] = 'text/csv'
-    return response
-
-@app.route('/export/participants')
-@login_required
-def export_participants():
-    import csv
-    from io import StringIO
-    from flask import make_response
-    
-    conn = get_db_connection()
-    participants = conn.execute('SELECT * FROM participants ORDER BY name').fetchall()
-    conn.close()
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Unique ID', 'Name', 'Type', 'Class/Dept', 'School', 'Contact'])
-    for participant in participants:
-        writer.writerow([participant['id'], participant['unique_id'], participant['name'], 
-                        participant['type'], participant['class_dept'], participant['school'], 
-                        participant['contact']])
-    
-    response = make_response(output.getvalue())
-    response.headers['Content-Disposition'] = 'attachment; filename=participants.csv'
-    response.headers['Content-Type'] = 'text/csv'
-    return response
-
-@app.route('/export/duties')
-@login_required
-def export_duties():
-    import csv
-    from io import StringIO
-    from flask import make_response
-    
-    conn = get_db_connection()
-    duties = conn.execute('''
-        SELECT d.*, e.name as event_name, dp.name as person_name
-        FROM duties d
-        JOIN events e ON d.event_id = e.id
-        JOIN duty_personnel dp ON d.duty_person_id = dp.id
-        ORDER BY d.duty_date
-    ''').fetchall()
-    conn.close()
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Event Name', 'Person Name', 'Duty Type', 'Date', 'Start Time', 'End Time', 'Location'])
-    for duty in duties:
-        writer.writerow([duty['id'], duty['event_name'], duty['person_name'], 
-                        duty['duty_type'], duty['duty_date'], 
-                        duty['start_time'], duty['end_time'], duty['location']])
-    
-    response = make_response(output.getvalue())
-    response.headers['Content-Disposition'] = 'attachment; filename=duties.csv'
-    response.headers['Content-Type'] = 'text/csv'
-    return response
-
-@app.route('/export/teachers')
-@login_required
-def export_teachers():
-    import csv
-    from io import StringIO
-    from flask import make_response
-    
-    conn = get_db_connection()
-    teachers = conn.execute('''
-        SELECT * FROM duty_personnel 
-        WHERE type = 'Teacher' OR type = 'Staff'
-        ORDER BY name
-    ''').fetchall()
-    conn.close()
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Name', 'Type', 'Contact', 'Department'])
-    for teacher in teachers:
-        writer.writerow([teacher['id'], teacher['name'], teacher['type'], 
-                        teacher['contact'], teacher['department']])
+    return csv_response(db.get_pool(), REPORT_SECTIONS, 'event_reports.csv',
+                        compress=request.args.get('gzip') == '1')
+
+@app.route('/export/<entity>')
+@login_required
+def export_data(entity):
+    if request.args.get('format') == 'columnar':
+        if entity not in COLUMNAR_TABLES:
+            flash('Unknown export type', 'error')
+            return redirect(url_for('reports'))
+        return columnar_response(db.get_pool(), entity)
+    
+    spec = EXPORTS.get(entity)
+    if spec is None:
+        flash('Unknown export type', 'error')
+        return redirect(url_for('reports'))
+    filename = f'{entity}.csv'
+    
+    # A dated window also brings in the occurrences of recurring events.
+    if entity == 'events' and (request.args.get('start') or request.args.get('date')):
+        try:
+            start, end, _ = parse_range(request.args, term_starts(app.config['CALENDAR_TERM_STARTS']))
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('reports'))
+        spec = event_window_export(start, end)
+        filename = f'events_{start.isoformat()}_{end.isoformat()}.csv'
     
-    response = make_response(output.getvalue())
-    response.headers['Content-Disposition'] = 'attachment; filename=teachers.csv'
-    response.headers['Content-Type'] = 'text/csv'
-    return response
+    return csv_response(db.get_pool(), [(None, spec)], filename,
+                        compress=request.args.get('gzip') == '1')
+
+@app.route('/import/<entity>', methods=['POST'])
+@login_required
+def import_data(entity):
+    if entity not in IMPORTERS:
+        return jsonify({'error': f'Unknown import type: {entity}'}), 404
+    
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        return jsonify({'error': 'No file provided'}), 400
+    
+    fmt = request.form.get('format') or detect_format(file.filename)
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'error': 'format must be csv or jsonl'}), 400
+    
+    force = request.form.get('force', '').lower() in ('1', 'true', 'yes', 'on')
+    # Imports cannot show a warning per row, so only 'reject' reports venue clashes.
+    # Duty double-bookings are always reported unless the form forces them.
+    if entity == 'events' and app.config['VENUE_CLASHES'] != 'reject':
+        force = True
+    report = run_import(file.stream, entity, fmt, write, force=force)
+    return jsonify(report), 200 if not report['failed'] else 207
 
 @app.route('/delete_all_data', methods=['POST'])
 @login_required
 def delete_all_data():
     try:
-        conn = get_db_connection()
-        conn.execute('DELETE FROM duties')
-        conn.execute('DELETE FROM duty_personnel')
-        conn.execute('DELETE FROM participants')
-        conn.execute('DELETE FROM events')
-        conn.execute('DELETE FROM users')
-        conn.commit()
-        conn.close()
+        def delete_all(conn):
+            conn.execute('DELETE FROM duties')
+            conn.execute('DELETE FROM duty_personnel')
+            conn.execute('DELETE FROM participants')
+            conn.execute('DELETE FROM event_series_exceptions')
+            conn.execute('DELETE FROM event_series')
+            conn.execute('DELETE FROM events')
+            conn.execute('DELETE FROM users')
+        
+        write(delete_all)
         
         return jsonify({'success': True, 'message': 'All data has been deleted successfully!'})
     except Exception as e:
@@ -879,13 +777,13 @@ def delete_all_data():
 def scan_event():
     """
     API endpoint to scan event details from uploaded image
-    Uses EventExtractor from ai-event.py
+    Queues the scan and returns a job id; poll /api/scan-event/<job_id> for the result.
+    With mode=multi the job lists every event on the image (schedules, timetables).
     """
     try:
-        # Import EventExtractor here to avoid circular imports
-        import sys
-        sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-        from ai_event import EventExtractor
+        unavailable = unavailable_reason(app)
+        if unavailable:
+            return jsonify({'error': unavailable}), 503
         
         if 'image' not in request.files:
             return jsonify({'error': 'No image file provided'}), 400
@@ -894,46 +792,215 @@ def scan_event():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-            file.save(tmp_file.name)
-            temp_path = tmp_file.name
-        
         try:
-            # Initialize EventExtractor
-            extractor = EventExtractor()
-            
-            # Extract event details
-            result = extractor.extract_event_info(temp_path)
-            
-            # Clean up temporary file
-            os.unlink(temp_path)
-            
-            if result.get('error'):
-                return jsonify({'error': result['error']}), 500
-            
-            # Format the response for the frontend
-            event_data = {
-                'name': result.get('event_name', 'Untitled Event'),
-                'venue': result.get('location', ''),
-                'event_date': result.get('date', ''),
-                'start_time': result.get('time', ''),
-                'description': result.get('additional_info', ''),
-                'confidence': result.get('confidence', 'medium')
-            }
-            
-            return jsonify({'success': True, 'event': event_data})
-            
-        except Exception as e:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
-            return jsonify({'error': f'Processing error: {str(e)}'}), 500
+            multi = request.values.get('mode') == 'multi'
+            job_id = get_scan_jobs().submit(file.read(), secure_filename(file.filename), session['user_id'], multi)
+        except QueueFull:
+            response = jsonify({'error': 'The scanner is busy. Please try again in a moment.'})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+        
+        status_url = url_for('scan_event_status', job_id=job_id)
+        response = jsonify({'success': True, 'job_id': job_id, 'status': 'queued', 'status_url': status_url})
+        response.headers['Location'] = status_url
+        return response, 202
             
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+@app.route('/api/scan-event/<job_id>')
+@login_required
+def scan_event_status(job_id):
+    job = get_job(get_db(), job_id, session['user_id'])
+    if job is None:
+        return jsonify({'error': 'Scan job not found'}), 404
+    return jsonify(job)
+
+# Events accepted by one /api/events/batch request.
+MAX_BATCH_EVENTS = 200
+
+@app.route('/api/events/batch', methods=['POST'])
+@login_required
+def add_events_batch():
+    """
+    Add several events (e.g. the reviewed result of a multi-event scan) in
+    one transaction: either every event is saved or, if any is invalid,
+    none is and the errors are returned per event index. An event that
+    clashes at its venue, with a booking or an earlier event of the batch,
+    is refused with 409 unless "force" is set.
+    """
+    payload = request.get_json(silent=True) or {}
+    records = payload.get('events')
+    if not isinstance(records, list) or not records:
+        return jsonify({'error': 'Expected a non-empty "events" list'}), 400
+    if len(records) > MAX_BATCH_EVENTS:
+        return jsonify({'error': f'At most {MAX_BATCH_EVENTS} events per batch'}), 400
+    
+    # host_school and participating_schools may be given once for the whole batch
+    defaults = {field: payload.get(field) or '' for field in ('host_school', 'participating_schools')}
+    batch, errors = [], []
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            errors.append({'index': index, 'error': 'expected an object'})
+            continue
+        record = {key: '' if value is None else str(value) for key, value in record.items()}
+        for field, value in defaults.items():
+            record[field] = record.get(field) or value
+        try:
+            batch.append((index, validate_event(record)))
+        except RowError as e:
+            errors.append({'index': index, 'error': str(e)})
+    if errors:
+        return jsonify({'success': False, 'errors': errors}), 400
+    
+    index = get_venue_index()
+    policy = 'warn' if payload.get('force') else app.config['VENUE_CLASHES']
+    
+    def save(conn):
+        clashes = [] if policy == 'off' else batch_clashes(conn, [row for _, row in batch], index)
+        found = [{'index': position, 'error': str(VenueClash(row['venue'], row['event_date'], clash)), 'clashes': clash}
+                 for (position, row), clash in zip(batch, clashes) if clash]
+        if found and policy == 'reject':
+            return 0, found
+        return insert_events(conn, batch, force=True)[0], found
+    
+    inserted, found = write(save)
+    if found and policy == 'reject':
+        return jsonify({'success': False, 'error': 'Some events clash with venue bookings', 'errors': found}), 409
+    return jsonify({'success': True, 'inserted': inserted, 'clashes': found}), 201
+
+@app.route('/api/series', methods=['GET', 'POST'])
+@login_required
+def api_series():
+    """
+    List recurring series, or create one from JSON: the event fields plus
+    frequency (daily, weekly, monthly), interval, weekdays and until or count.
+    A series with an occurrence that clashes at its venue is refused with 409
+    unless "force" is set.
+    """
+    if request.method == 'GET':
+        rows = get_db().execute('SELECT * FROM event_series ORDER BY start_date, id').fetchall()
+        return jsonify([dict(row, rule=describe_series(row)) for row in rows])
+    
+    record = request.get_json(silent=True)
+    if not isinstance(record, dict):
+        return jsonify({'success': False, 'error': 'Expected a JSON object'}), 400
+    try:
+        row = validate_series(record)
+    except RowError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    index = get_venue_index()
+    policy = 'warn' if record.get('force') else app.config['VENUE_CLASHES']
+    try:
+        series_id, clashes = write(lambda conn: save_series(conn, index, row, policy))
+    except VenueClash as e:
+        return jsonify({'success': False, 'error': str(e), 'clashes': e.clashes}), 409
+    return jsonify({'success': True, 'id': series_id, 'rule': describe_series(row), 'clashes': clashes}), 201
+
+@app.route('/api/series/<int:series_id>', methods=['DELETE'])
+@login_required
+def api_delete_series(series_id):
+    if not write(lambda conn: delete_series(conn, series_id)):
+        return jsonify({'success': False, 'error': 'Series not found'}), 404
+    return jsonify({'success': True})
+
+@app.route('/api/series/<int:series_id>/occurrences')
+@login_required
+def api_series_occurrences(series_id):
+    """One series' occurrences between ?start= and ?end=, exceptions applied."""
+    try:
+        start, end, _ = parse_range(request.args, term_starts(app.config['CALENDAR_TERM_STARTS']))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'series_id': series_id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'occurrences': expand_series(get_db(), start, end, series_id),
+    })
+
+@app.route('/api/series/<int:series_id>/exceptions', methods=['POST'])
+@login_required
+def api_series_exception(series_id):
+    """
+    Cancel one occurrence ({"occurrence_date", "cancelled": true}) or change
+    it ({"occurrence_date", "start_time": ..., "event_date": ..., ...}). A
+    change that clashes at the venue is refused with 409 unless "force" is set.
+    """
+    record = request.get_json(silent=True)
+    if not isinstance(record, dict):
+        return jsonify({'success': False, 'error': 'Expected a JSON object'}), 400
+    index = get_venue_index()
+    policy = 'warn' if record.get('force') else app.config['VENUE_CLASHES']
+    try:
+        clashes = write(lambda conn: save_exception(conn, index, series_id, record, policy))
+    except RowError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except VenueClash as e:
+        return jsonify({'success': False, 'error': str(e), 'clashes': e.clashes}), 409
+    return jsonify({'success': True, 'clashes': clashes}), 201
+
+def ics_feed(kind, key):
+    """
+    iCalendar feed of one venue's or school's events, or one duty person's
+    duties, for calendar apps to subscribe to. They cannot log in, so the
+    URL carries a token (see /api/feeds).
+    """
+    if kind not in FEED_KINDS or (kind == 'person' and not key.isdigit()):
+        return jsonify({'error': 'Feed not found'}), 404
+    if not check_feed_token(app.config['ICS_SECRET'], kind, key, request.args.get('token')):
+        return jsonify({'error': 'Invalid feed token'}), 403
+    try:
+        feed = get_feeds().get(get_db(), kind, key, app.config['ICS_PAST_DAYS'], app.config['ICS_DOMAIN'])
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    return feed_response(feed)
+
+@login_required
+def api_feeds():
+    """Subscription URL for ?kind=venue|school|person&key=<venue, school or duty person id>."""
+    kind = request.args.get('kind', '')
+    key = request.args.get('key', '').strip()
+    if kind not in FEED_KINDS:
+        return jsonify({'error': f"kind must be one of {', '.join(FEED_KINDS)}"}), 400
+    if not key or (kind == 'person' and not key.isdigit()):
+        return jsonify({'error': 'key must be a venue, a school or a duty person id'}), 400
+    key = feeds.feed_key(kind, key)
+    return jsonify({
+        'kind': kind,
+        'key': key,
+        'url': url_for('ics_feed', kind=kind, key=key, token=feed_token(app.config['ICS_SECRET'], kind, key),
+                       _external=True),
+    })
+
+# Feed URLs are signed with ICS_SECRET, so the feed routes exist only once it is set.
+if app.config['ICS_SECRET']:
+    app.add_url_rule('/feeds/<kind>/<path:key>.ics', view_func=ics_feed)
+    app.add_url_rule('/api/feeds', view_func=api_feeds)
+
+@app.route('/api/events/<int:event_id>/roster', methods=['POST'])
+@login_required
+def api_event_roster(event_id):
+    """
+    Fill an event's duty slots with people who are free and available,
+    spreading the load, and save every resulting duty in one transaction.
+    With "dry_run" the roster is returned without being saved.
+    """
+    if get_db().execute('SELECT 1 FROM events WHERE id = ?', (event_id,)).fetchone() is None:
+        return jsonify({'success': False, 'error': 'Event not found'}), 404
+    plan = request.get_json(silent=True)
+    if not isinstance(plan, dict):
+        return jsonify({'success': False, 'error': 'Expected a JSON object with a "slots" list'}), 400
+    
+    try:
+        if plan.get('dry_run'):
+            result = generate_roster(get_db(), event_id, plan, dry_run=True)
+        else:
+            result = write(lambda conn: generate_roster(conn, event_id, plan))
+    except RosterError as e:
+        return jsonify({'success': False, 'error': str(e), 'errors': e.errors}), 400
+    return jsonify(dict(result, success=True)), 200 if result['dry_run'] else 201
+
 if __name__ == "__main__":
-    init_db()
     port = int(os.environ.get("PORT", 8000))  
     app.run(host="0.0.0.0", port=port, debug=True)
\ No newline at end of file
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Benchmark the image scan pipeline against a fake or recorded model.
+
+Each concurrency level runs in a fresh interpreter. By default every image
+goes the whole way through the app: POST /api/scan-event, the scan job
+pool, preprocessing, parsing and normalization, and status polling until the
+job is done. `--path extractor` calls EventExtractor directly instead.
+For each level the harness reports p50/p95 latency, throughput and peak
+memory per in-flight scan.
+
+    python3 bench_scan.py --concurrency 1,2,4,8 --latency 0.5
+    python3 bench_scan.py --recorded extracted_events.jsonl --json > baseline.json
+    python3 bench_scan.py --baseline baseline.json   # exits 1 on a regression
+"""
+import argparse
+import io
+import json
+import os
+import queue
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process. On Linux VmHWM is read instead of
+    ru_maxrss, which keeps the parent's (larger) peak across exec.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def load_corpus(paths):
+    """Return [(name, bytes)] for the given images and the images in the given folders."""
+    corpus = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(name for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTENSIONS))
+            files = [os.path.join(path, name) for name in names]
+        else:
+            files = [path]
+        for file_path in files:
+            with open(file_path, 'rb') as f:
+                corpus.append((os.path.basename(file_path), f.read()))
+    return corpus
+
+
+def write_synthetic(count, size, folder):
+    """Write `count` generated poster JPEGs of `size` to `folder` and return their paths."""
+    from PIL import Image, ImageDraw
+    width, height = size
+    paths = []
+    for index in range(count):
+        image = Image.new('RGB', (width, height), (250, 245, 235 - index * 10 % 60))
+        draw = ImageDraw.Draw(image)
+        for line, text in enumerate(['ANNUAL SPORTS DAY', 'Saturday, 14th September', '10:00 AM - 2:00 PM',
+                                     'Venue: Main Ground']):
+            draw.text((width // 10, height // 8 + line * height // 10), text, fill=(20, 20, 60))
+        draw.rectangle((width // 20, height // 20, width - width // 20, height - height // 20),
+                       outline=(120, 30, 30), width=max(width // 200, 1))
+        path = os.path.join(folder, f'synthetic-{index}.jpg')
+        image.save(path, 'JPEG', quality=92)
+        paths.append(path)
+    return paths
+
+
+def make_model(args):
+    from ai_event import FakeModel, RecordedModel
+    if args.recorded:
+        return RecordedModel.from_file(args.recorded, latency=args.latency)
+    if args.multi:
+        event = {'event_name': 'Sample Event', 'location': 'Main Hall', 'date': '2025-09-14',
+                 'start_time': '10:00 AM', 'end_time': '11:00 AM'}
+        return FakeModel({'events': [event, dict(event, event_name='Second Event')], 'confidence': 'high'},
+                         latency=args.latency)
+    return FakeModel(latency=args.latency)
+
+
+def make_extractor(args, cache=None):
+    from ai_event import EventExtractor
+    return EventExtractor(model_name='bench', model=make_model(args), cache=cache,
+                          max_pixels=args.max_pixels or None, crop_margins=args.crop_margins)
+
+
+def _drain(items, scan, concurrency):
+    """Run scan(name, data) over `items` on `concurrency` threads; return (latencies, failures)."""
+    work = queue.Queue()
+    for item in items:
+        work.put(item)
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            try:
+                name, data = work.get_nowait()
+            except queue.Empty:
+                return
+            started = time.perf_counter()
+            error = scan(name, data)
+            elapsed = time.perf_counter() - started
+            with lock:
+                if error:
+                    failures.append(f'{name}: {str(error).splitlines()[0]}')
+                else:
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, failures
+
+
+def _extractor_scanner(args, concurrency):
+    extractor = make_extractor(args)
+
+    def scan(name, data):
+        if args.multi:
+            result = extractor.extract_events(io.BytesIO(data), source_name=name)
+        else:
+            result = extractor.extract_event_info(io.BytesIO(data), source_name=name, display=False)
+        return result.get('error')
+    return scan
+
+
+def _app_scanner(args, concurrency):
+    import app as app_module
+    import scan_jobs
+
+    app = app_module.app
+    # A pool of `concurrency` scan workers behind the real endpoints.
+    app.extensions['scan_jobs'] = scan_jobs.ScanJobs(
+        app, lambda: make_extractor(args, app.extensions.get('extraction_cache')),
+        workers=concurrency, max_pending=max(concurrency * 4, 32))
+    clients = threading.local()
+
+    def scan(name, data):
+        client = getattr(clients, 'client', None)
+        if client is None:
+            client = clients.client = app.test_client()
+            with client.session_transaction() as session:
+                session['user_id'] = 0
+        form = {'image': (io.BytesIO(data), name)}
+        if args.multi:
+            form['mode'] = 'multi'
+        response = client.post('/api/scan-event', data=form, content_type='multipart/form-data')
+        if response.status_code != 202:
+            return f'HTTP {response.status_code}: {response.get_json()}'
+        status_url = response.get_json()['status_url']
+        while True:
+            job = client.get(status_url).get_json()
+            if job['status'] == 'done':
+                return None
+            if job['status'] == 'failed':
+                return job['error']
+            time.sleep(args.poll)
+    return scan
+
+
+def run_level(args, concurrency):
+    """Measure one concurrency level in this process and return its summary."""
+    corpus = load_corpus(args.images)
+    if not corpus:
+        raise SystemExit('No images to scan')
+    # Load everything a scan needs before taking the memory baseline.
+    import ai_event
+    import image_prep
+    from PIL import Image
+    scan = (_app_scanner if args.path == 'app' else _extractor_scanner)(args, concurrency)
+
+    baseline = peak_rss_mb()
+    scan(*corpus[0])  # warm-up, not timed
+    items = corpus * args.repeat
+    started = time.perf_counter()
+    latencies, failures = _drain(items, scan, concurrency)
+    elapsed = time.perf_counter() - started
+    peak = peak_rss_mb()
+
+    summary = {
+        'concurrency': concurrency,
+        'scans': len(items),
+        'failed': len(failures),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_per_s': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+        'max_ms': round(max(latencies) * 1000, 1) if latencies else None,
+        'mean_ms': round(statistics.mean(latencies) * 1000, 1) if latencies else None,
+        'peak_rss_mb': round(peak, 1),
+        # Extra peak memory over the loaded-but-idle process, per scan in flight.
+        'rss_per_scan_mb': round(max(peak - baseline, 0) / concurrency, 2),
+        'errors': failures[:5],
+    }
+    return summary
+
+
+def run_level_subprocess(args, concurrency, workdir):
+    """Run one level in a fresh interpreter so memory and caches start clean."""
+    env = dict(os.environ, DATABASE=os.path.join(workdir, f'bench-{concurrency}.db'),
+               EXTRACTION_CACHE=os.path.join(workdir, f'cache-{concurrency}.db') if args.cache else '',
+               SCAN_ENABLED='1', SCAN_MODEL='fake', SCAN_BACKEND='remote')
+    command = [sys.executable, os.path.abspath(__file__), '--level', str(concurrency)] + args.child_args
+    process = subprocess.run(command, cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                             capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f'concurrency {concurrency} failed:\n{process.stderr[-2000:]}')
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def compare(levels, baseline, tolerance):
+    """Return the regressions of `levels` against a previous --json run."""
+    previous = {level['concurrency']: level for level in baseline['levels']}
+    regressions = []
+    for level in levels:
+        before = previous.get(level['concurrency'])
+        if not before:
+            continue
+        if before['p95_ms'] and level['p95_ms'] and level['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f"concurrency {level['concurrency']}: p95 {before['p95_ms']} -> {level['p95_ms']} ms")
+        if before['throughput_per_s'] and (level['throughput_per_s'] or 0) < before['throughput_per_s'] * (1 - tolerance):
+            regressions.append(f"concurrency {level['concurrency']}: throughput "
+                               f"{before['throughput_per_s']} -> {level['throughput_per_s']} scans/s")
+        if level['failed'] > before['failed']:
+            regressions.append(f"concurrency {level['concurrency']}: {level['failed']} failed scans "
+                               f"(was {before['failed']})")
+    return regressions
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark scan latency, throughput and memory')
+    parser.add_argument('images', nargs='*', default=['1.jpeg'], help='Images or folders to replay (default: 1.jpeg)')
+    parser.add_argument('--path', choices=['app', 'extractor'], default='app',
+                        help='Through the HTTP endpoints and job pool, or EventExtractor only')
+    parser.add_argument('--concurrency', default='1,2,4,8', help='Comma-separated concurrency levels')
+    parser.add_argument('--repeat', type=int, default=10, help='Times each image is scanned per level')
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds each model call takes')
+    parser.add_argument('--recorded', help='Replay these results (ai_event.py --save/--jsonl output) instead of FakeModel')
+    parser.add_argument('--synthetic', type=int, default=0, help='Also scan this many generated posters')
+    parser.add_argument('--synthetic-size', type=parse_size, default=(3000, 4000), help='Generated poster size, WxH')
+    parser.add_argument('--max-pixels', type=int, default=None, help='Preprocessing pixel budget (0 disables it)')
+    parser.add_argument('--crop-margins', action='store_true', help='Trim blank borders before upload')
+    parser.add_argument('--multi', action='store_true', help='Extract every event per image')
+    parser.add_argument('--cache', action='store_true', help='Keep the extraction cache on (repeats become hits)')
+    parser.add_argument('--poll', type=float, default=0.01, help='Seconds between status polls (app path)')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON (e.g. to save a baseline)')
+    parser.add_argument('--baseline', help='Compare with a previous --json run; exit 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown before a regression (0.2 = 20%%)')
+    parser.add_argument('--level', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.max_pixels is None:
+        from image_prep import DEFAULT_MAX_PIXELS
+        args.max_pixels = DEFAULT_MAX_PIXELS
+
+    if args.level:
+        print(json.dumps(run_level(args, args.level)))
+        return 0
+
+    # Everything but the levels and reporting flags is passed on to each level's interpreter.
+    workdir = tempfile.mkdtemp()
+    try:
+        # Posters are generated here, not in the measured interpreters, so
+        # drawing them does not count towards scan memory.
+        images = [os.path.abspath(path) for path in args.images]
+        images += write_synthetic(args.synthetic, args.synthetic_size, workdir)
+        args.child_args = images + [
+            '--path', args.path, '--repeat', str(args.repeat), '--latency', str(args.latency),
+            '--max-pixels', str(args.max_pixels), '--poll', str(args.poll),
+        ] + (['--recorded', os.path.abspath(args.recorded)] if args.recorded else []) + \
+            (['--crop-margins'] if args.crop_margins else []) + (['--multi'] if args.multi else []) + \
+            (['--cache'] if args.cache else [])
+        levels = [run_level_subprocess(args, int(level), workdir) for level in args.concurrency.split(',')]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        'path': args.path,
+        'model': 'recorded' if args.recorded else 'fake',
+        'latency_s': args.latency,
+        'levels': levels,
+    }
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(levels, json.load(f), args.tolerance)
+        results['regressions'] = regressions
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"Scan benchmark: {args.path} path, {results['model']} model, {args.latency}s model latency")
+        print(f"{'conc':>5} {'scans':>6} {'failed':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} "
+              f"{'scans/s':>8} {'MB/scan':>8} {'peak MB':>8}")
+        for level in levels:
+            print(f"{level['concurrency']:>5} {level['scans']:>6} {level['failed']:>6} {level['p50_ms'] or '-':>8} "
+                  f"{level['p95_ms'] or '-':>8} {level['max_ms'] or '-':>8} {level['throughput_per_s'] or '-':>8} "
+                  f"{level['rss_per_scan_mb']:>8} {level['peak_rss_mb']:>8}")
+            for error in level['errors']:
+                print(f'      ! {error}')
+        for regression in regressions:
+            print(f'✗ Regression: {regression}')
+        if args.baseline and not regressions:
+            print(f'✓ No regressions against {args.baseline}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
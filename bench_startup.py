@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Measure web app cold start: import time (via -X importtime), wall time and
+peak memory of a fresh interpreter importing app.py, and whether any of the
+optional AI stack was loaded on the way.
+
+    python3 bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Top-level packages that a worker should only load once it scans an image.
+AI_MODULES = ('PIL', 'google', 'dotenv', 'ai_event', 'local_backend', 'pytesseract', 'tesserocr')
+
+_PROBE = '''
+import json, sys
+import {module}
+print(json.dumps(sorted({{name.split('.')[0] for name in sys.modules}} & set({ai_modules!r}))))
+'''
+
+
+def parse_importtime(text):
+    """Return {module: (self_us, cumulative_us)} from -X importtime output."""
+    modules = {}
+    for line in text.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def run_once(module, database, cwd):
+    """Import `module` in a fresh interpreter and return its measurements."""
+    env = dict(os.environ, DATABASE=database)
+    probe = _PROBE.format(module=module, ai_modules=AI_MODULES)
+    with tempfile.TemporaryFile() as stderr, tempfile.TemporaryFile() as stdout:
+        started = time.perf_counter()
+        process = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', probe],
+                                   cwd=cwd, env=env, stdout=stdout, stderr=stderr)
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - started
+        process.returncode = os.waitstatus_to_exitcode(status)
+        stderr.seek(0)
+        stdout.seek(0)
+        err, out = stderr.read().decode(), stdout.read().decode()
+    if process.returncode != 0:
+        raise RuntimeError(f'importing {module} failed:\n{err[-2000:]}')
+
+    modules = parse_importtime(err)
+    return {
+        'wall_ms': wall * 1000,
+        'import_ms': modules.get(module, (0, 0))[1] / 1000,
+        # ru_maxrss is in KiB on Linux and bytes on macOS.
+        'max_rss_mb': usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024),
+        'ai_modules': json.loads(out.strip().splitlines()[-1]),
+        'modules': modules,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark app cold-start import time and memory')
+    parser.add_argument('--module', default='app', help='Module to import (default: app)')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to start')
+    parser.add_argument('--top', type=int, default=10, help='Slowest modules to list (by self time)')
+    parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+    args = parser.parse_args()
+
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    workdir = tempfile.mkdtemp()
+    try:
+        database = os.path.join(workdir, 'events.db')
+        # The first run creates and migrates the database; measure warm runs after it.
+        run_once(args.module, database, cwd)
+        runs = [run_once(args.module, database, cwd) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    summary = {
+        'module': args.module,
+        'runs': args.runs,
+        'import_ms_median': round(statistics.median(run['import_ms'] for run in runs), 1),
+        'wall_ms_median': round(statistics.median(run['wall_ms'] for run in runs), 1),
+        'max_rss_mb_median': round(statistics.median(run['max_rss_mb'] for run in runs), 1),
+        'ai_modules_loaded': runs[-1]['ai_modules'],
+        'slowest_modules': [
+            {'module': name, 'self_ms': round(self_us / 1000, 2), 'cumulative_ms': round(cumulative_us / 1000, 2)}
+            for name, (self_us, cumulative_us) in sorted(
+                runs[-1]['modules'].items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+        ],
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return 0
+
+    print(f"import {args.module}: {summary['import_ms_median']} ms "
+          f"(wall {summary['wall_ms_median']} ms, peak RSS {summary['max_rss_mb_median']} MB, "
+          f"median of {args.runs})")
+    loaded = summary['ai_modules_loaded']
+    print(f"AI stack loaded at startup: {', '.join(loaded) if loaded else 'none'}")
+    print('Slowest modules (self time):')
+    for entry in summary['slowest_modules']:
+        print(f"  {entry['self_ms']:8.2f} ms  {entry['module']} (cumulative {entry['cumulative_ms']} ms)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import date
+
+from duty_conflicts import DutyConflict, describe_duty
+from intervals import IntervalIndex, time_interval
+
+# Records validated and inserted per transaction.
+BATCH_ROWS = 1000
+# Per-row errors kept in a report; the rest are only counted.
+MAX_REPORTED_ERRORS = 1000
+# Stay well under SQLite's bound-parameter limit in IN (...) lookups.
+LOOKUP_CHUNK = 500
+
+
+class RowError(ValueError):
+    pass
+
+
+# Field validators, also used by recurrence.py and roster.py. Each reads
+# record[field] as text and raises RowError naming the field.
+
+def required(record, field):
+    """The stripped value, which must not be empty."""
+    value = (record.get(field) or '').strip()
+    if not value:
+        raise RowError(f'{field} is required')
+    return value
+
+
+def optional(record, field):
+    """The stripped value, or '' when missing."""
+    return (record.get(field) or '').strip()
+
+
+def parse_date(record, field):
+    """A required YYYY-MM-DD date."""
+    value = required(record, field)
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise RowError(f'{field} must be a YYYY-MM-DD date, got {value!r}')
+
+
+def parse_time(record, field):
+    """A required HH:MM (or HH:MM:SS) time, returned as zero-padded HH:MM."""
+    value = required(record, field)
+    parts = value.split(':')
+    try:
+        if len(parts) not in (2, 3):
+            raise ValueError
+        hours, minutes = int(parts[0]), int(parts[1])
+        if not (0 <= hours < 24 and 0 <= minutes < 60):
+            raise ValueError
+    except ValueError:
+        raise RowError(f'{field} must be an HH:MM time, got {value!r}')
+    return f'{hours:02d}:{minutes:02d}'
+
+
+def _chunks(values, size=LOOKUP_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def lookup(conn, sql, values):
+    """Run `sql` (containing one {placeholders}) over `values` in IN-list chunks."""
+    rows = []
+    for chunk in _chunks(values):
+        placeholders = ', '.join('?' for _ in chunk)
+        rows.extend(conn.execute(sql.format(placeholders=placeholders), chunk).fetchall())
+    return rows
+
+
+def validate_participant(record):
+    grade = optional(record, 'grade')
+    school = required(record, 'school')
+    participant_type = optional(record, 'type') or 'student'
+    if participant_type != 'student':
+        raise RowError(f"type must be 'student', got {participant_type!r}")
+    return {
+        'unique_id': required(record, 'unique_id'),
+        'name': required(record, 'name'),
+        'type': participant_type,
+        'class_dept': f'Grade {grade}' if grade else school,
+        'school': school,
+        'contact': optional(record, 'contact'),
+        'emergency_contact': optional(record, 'emergency_contact'),
+    }
+
+
+def validate_event(record):
+    return {
+        'name': required(record, 'name'),
+        'type': required(record, 'type'),
+        'event_date': parse_date(record, 'event_date'),
+        'start_time': parse_time(record, 'start_time'),
+        'end_time': parse_time(record, 'end_time'),
+        'venue': required(record, 'venue'),
+        'description': optional(record, 'description'),
+        'host_school': required(record, 'host_school'),
+        'participating_schools': optional(record, 'participating_schools'),
+    }
+
+
+def validate_duty(record):
+    # Accept either the form's "HH:MM - HH:MM" time_slot or separate columns.
+    if optional(record, 'time_slot') and not optional(record, 'start_time'):
+        parts = [part.strip() for part in record['time_slot'].split(' - ')]
+        record = dict(record, start_time=parts[0], end_time=parts[1] if len(parts) > 1 else parts[0])
+    try:
+        event_id = int(required(record, 'event_id'))
+    except ValueError:
+        raise RowError('event_id must be an integer')
+    return {
+        'event_id': event_id,
+        'person_name': optional(record, 'teacher_name') or required(record, 'person_name'),
+        'duty_type': required(record, 'duty_type'),
+        'duty_date': parse_date(record, 'duty_date'),
+        'start_time': parse_time(record, 'start_time'),
+        'end_time': parse_time(record, 'end_time'),
+        'location': required(record, 'location'),
+        'description': optional(record, 'description'),
+        'notes': optional(record, 'notes'),
+    }
+
+
+def insert_participants(conn, batch, force=False):
+    """
+    Insert (line, row) pairs; returns (inserted count, [(line, error)]).
+    `force` has no effect: a duplicate unique_id can never be stored.
+    """
+    errors = []
+    existing = {row['unique_id'] for row in lookup(
+        conn, 'SELECT unique_id FROM participants WHERE unique_id IN ({placeholders})',
+        {row['unique_id'] for _, row in batch})}
+
+    rows = []
+    for line, row in batch:
+        if row['unique_id'] in existing:
+            errors.append((line, f"unique_id {row['unique_id']!r} already exists"))
+            continue
+        existing.add(row['unique_id'])
+        rows.append(row)
+
+    conn.executemany('''
+        INSERT INTO participants (unique_id, name, type, class_dept, school, contact, emergency_contact)
+        VALUES (:unique_id, :name, :type, :class_dept, :school, :contact, :emergency_contact)
+    ''', rows)
+    return len(rows), errors
+
+
+def insert_events(conn, batch, force=False):
+    """
+    Insert (line, row) pairs, reporting rows that clash at their venue with
+    a stored event, a series occurrence or an earlier row as errors unless
+    `force` is set.
+    """
+    # venues imports recurrence, which imports this module.
+    from venues import VenueClash, batch_clashes
+
+    errors = []
+    rows = [row for _, row in batch]
+    if not force:
+        clashes = batch_clashes(conn, rows, skip_clashing=True)
+        errors = [(line, str(VenueClash(row['venue'], row['event_date'], found)))
+                  for (line, row), found in zip(batch, clashes) if found]
+        rows = [row for row, found in zip(rows, clashes) if not found]
+    conn.executemany('''
+        INSERT INTO events (name, type, event_date, start_time, end_time, venue,
+                          description, host_school, participating_schools)
+        VALUES (:name, :type, :event_date, :start_time, :end_time, :venue,
+                :description, :host_school, :participating_schools)
+    ''', rows)
+    return len(rows), errors
+
+
+def resolve_duty_personnel(conn, names):
+    """
+    Map each name to a duty_personnel id, creating the missing people.
+
+    One IN (...) lookup per LOOKUP_CHUNK names replaces the per-row
+    SELECT of assign_duty.
+    """
+    found = {row['name']: row['id'] for row in lookup(
+        conn, 'SELECT id, name FROM duty_personnel WHERE name IN ({placeholders})', names)}
+    missing = [name for name in names if name not in found]
+    if missing:
+        conn.executemany('INSERT INTO duty_personnel (name, designation, school) VALUES (?, "", "")',
+                         [(name,) for name in missing])
+        found.update({row['name']: row['id'] for row in lookup(
+            conn, 'SELECT id, name FROM duty_personnel WHERE name IN ({placeholders})', missing)})
+    return found
+
+
+def duty_clashes(conn, batch, event_names):
+    """
+    Split (line, row) duty pairs into those that fit and (line, error) for
+    those overlapping a duty the person already has that day or an earlier
+    row of the batch. Rows need duty_person_id set.
+    """
+    people = {row['duty_person_id'] for _, row in batch}
+    booked = IntervalIndex()
+    for duty in lookup(conn, '''
+        SELECT d.id, d.duty_person_id, d.duty_date, d.start_time, d.end_time, d.duty_type, d.location,
+               e.name AS event_name
+        FROM duties d LEFT JOIN events e ON d.event_id = e.id
+        WHERE d.duty_date IN ({placeholders})
+    ''', {row['duty_date'] for _, row in batch}):
+        interval = time_interval(duty['start_time'], duty['end_time'])
+        if duty['duty_person_id'] in people and interval is not None:
+            booked.add((duty['duty_person_id'], duty['duty_date']), interval[0], interval[1], describe_duty(duty))
+
+    fits, errors = [], []
+    for line, row in batch:
+        interval = time_interval(row['start_time'], row['end_time'])
+        if interval is None:
+            fits.append((line, row))
+            continue
+        key = (row['duty_person_id'], row['duty_date'])
+        conflicts = booked.overlapping(key, *interval)
+        if conflicts:
+            errors.append((line, str(DutyConflict(row['person_name'], row['duty_date'], conflicts))))
+            continue
+        # Later rows of the batch must not overlap this one either.
+        booked.add(key, interval[0], interval[1],
+                   describe_duty(dict(row, id=None, event_name=event_names[row['event_id']])))
+        fits.append((line, row))
+    return fits, errors
+
+
+def insert_duties(conn, batch, force=False):
+    """
+    Insert (line, row) duty pairs. Rows for unknown events, and unless
+    `force` is set rows that double-book their person, are reported as
+    errors instead.
+    """
+    errors = []
+    event_names = {row['id']: row['name'] for row in lookup(
+        conn, 'SELECT id, name FROM events WHERE id IN ({placeholders})',
+        {row['event_id'] for _, row in batch})}
+
+    valid = []
+    for line, row in batch:
+        if row['event_id'] not in event_names:
+            errors.append((line, f"event_id {row['event_id']} does not exist"))
+        else:
+            valid.append((line, row))
+
+    person_ids = resolve_duty_personnel(conn, {row['person_name'] for _, row in valid})
+    for _, row in valid:
+        row['duty_person_id'] = person_ids[row['person_name']]
+    if not force:
+        valid, clashes = duty_clashes(conn, valid, event_names)
+        errors.extend(clashes)
+    valid = [row for _, row in valid]
+
+    conn.executemany('''
+        INSERT INTO duties (event_id, duty_person_id, duty_type,
+                          duty_date, start_time, end_time, location, description, notes)
+        VALUES (:event_id, :duty_person_id, :duty_type,
+                :duty_date, :start_time, :end_time, :location, :description, :notes)
+    ''', valid)
+    return len(valid), errors
+
+
+IMPORTERS = {
+    'participants': (validate_participant, insert_participants),
+    'events': (validate_event, insert_events),
+    'duties': (validate_duty, insert_duties),
+}
+
+
+def detect_format(filename, default='csv'):
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if extension == '.csv':
+        return 'csv'
+    return default
+
+
+def iter_records(stream, fmt):
+    """
+    Yield (line number, record dict) from a binary stream without reading it all.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, RowError(f'invalid JSON: {e.msg}')
+                continue
+            if not isinstance(record, dict):
+                yield line_number, RowError('expected a JSON object')
+                continue
+            yield line_number, {key: '' if value is None else str(value) for key, value in record.items()}
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+def run_import(stream, entity, fmt, write, batch_rows=BATCH_ROWS, force=False):
+    """
+    Validate and insert every record of `stream` into `entity`.
+
+    Args:
+        stream: Binary file object (an upload or an open file)
+        entity (str): 'participants', 'events' or 'duties'
+        fmt (str): 'csv' or 'jsonl'
+        write: Callable running fn(conn) as one write transaction, e.g. db.write
+        batch_rows (int): Records per validation batch and transaction
+        force (bool): Insert events that clash at their venue, and duties
+            that double-book a person, instead of reporting them as errors
+
+    Returns:
+        dict: Counts, elapsed time and per-row errors (line numbers refer to
+        the input file). Each batch commits on its own, so rows before a
+        failing batch stay imported.
+    """
+    validate, insert = IMPORTERS[entity]
+    report = {'entity': entity, 'format': fmt, 'rows_read': 0, 'inserted': 0,
+              'failed': 0, 'batches': 0, 'errors': []}
+    started = time.perf_counter()
+
+    def add_errors(errors):
+        report['failed'] += len(errors)
+        room = MAX_REPORTED_ERRORS - len(report['errors'])
+        report['errors'].extend({'line': line, 'error': message} for line, message in errors[:max(room, 0)])
+
+    def flush(batch):
+        inserted, errors = write(lambda conn: insert(conn, batch, force))
+        report['inserted'] += inserted
+        report['batches'] += 1
+        add_errors(errors)
+
+    batch = []
+    for line, record in iter_records(stream, fmt):
+        report['rows_read'] += 1
+        try:
+            if isinstance(record, RowError):
+                raise record
+            batch.append((line, validate(record)))
+        except RowError as e:
+            add_errors([(line, str(e))])
+        if len(batch) >= batch_rows:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    report['errors'].sort(key=lambda error: error['line'])
+    report['errors_truncated'] = report['failed'] > len(report['errors'])
+    report['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+def connection_writer(conn):
+    """A `write` callable for run_import() outside the web app."""
+    def write(fn):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = fn(conn)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return result
+    return write
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import participants, events or duties from CSV/JSONL')
+    parser.add_argument('entity', choices=sorted(IMPORTERS))
+    parser.add_argument('file', help='CSV or JSONL file to import')
+    parser.add_argument('--database', '-d', default='events.db', help='Path to the SQLite database')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format (default: from the file extension)')
+    parser.add_argument('--batch-rows', type=int, default=BATCH_ROWS, help='Rows per transaction')
+    parser.add_argument('--force', action='store_true', help='Insert venue clashes and double-booked duties')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.database, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA busy_timeout = 30000')
+    try:
+        with open(args.file, 'rb') as f:
+            report = run_import(f, args.entity, args.format or detect_format(args.file),
+                                connection_writer(conn), args.batch_rows, args.force)
+    finally:
+        conn.close()
+
+    for error in report['errors']:
+        print(f"line {error['line']}: {error['error']}", file=sys.stderr)
+    print(f"✓ Imported {report['inserted']} of {report['rows_read']} {args.entity} "
+          f"in {report['elapsed_ms']} ms ({report['failed']} failed)")
+    return 1 if report['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+
+from flask import current_app, make_response, request, session
+
+from db import get_db
+
+# Scopes bumped in data_versions by the triggers of migrations 5 and 8:
+#   events                    'events', and 'events:YYYY-MM' of the old and new date
+#   participants              'participants'
+#   duty_personnel            'duty_personnel'
+#   duties                    'duties'
+#   event_series(_exceptions) 'event_series'
+# Cached pages name the scopes they depend on, so a write only invalidates
+# the keys it affects.
+
+MISSING = object()
+
+
+def month_scope(year, month):
+    return f'events:{year:04d}-{month:02d}'
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with a per-entry time to live.
+
+    Args:
+        max_entries (int): Entries kept before the least recently used is evicted
+        ttl (float): Seconds an entry stays valid; None keeps entries until evicted
+    """
+
+    def __init__(self, max_entries=256, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return MISSING
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+def init_app(app):
+    app.config.setdefault('CACHE_MAX_ENTRIES', int(os.environ.get('CACHE_MAX_ENTRIES', 512)))
+    app.config.setdefault('CACHE_TTL', float(os.environ.get('CACHE_TTL', 300)))
+    app.extensions['page_cache'] = LRUCache(app.config['CACHE_MAX_ENTRIES'], app.config['CACHE_TTL'])
+
+
+def get_cache():
+    return current_app.extensions['page_cache']
+
+
+def get_versions(conn, scopes):
+    """
+    Current versions of `scopes` and the time of the latest write to any of them.
+
+    Returns:
+        tuple: (tuple of versions in scope order, datetime or None)
+    """
+    placeholders = ', '.join('?' for _ in scopes)
+    rows = conn.execute(f'SELECT scope, version, updated_at FROM data_versions WHERE scope IN ({placeholders})',
+                        list(scopes)).fetchall()
+    found = {row['scope']: row for row in rows}
+    versions = tuple(found[scope]['version'] if scope in found else 0 for scope in scopes)
+    stamps = [row['updated_at'] for row in rows if row['updated_at']]
+    last_modified = None
+    if stamps:
+        last_modified = datetime.fromisoformat(max(stamps)).replace(tzinfo=timezone.utc)
+    return versions, last_modified
+
+
+class CachedPage:
+    """
+    A cache lookup for one page view: the key, its ETag and Last-Modified.
+
+    The key combines the page name, whatever the page varies on (month,
+    today's date, ...) and the versions of the scopes it reads, so entries
+    for untouched scopes stay valid across writes and across workers.
+    Pass per_user=True for pages rendered inside base.html (user name,
+    flashes): their ETag is tied to the session user.
+    """
+
+    def __init__(self, name, scopes, vary=(), per_user=False):
+        self.per_user = per_user
+        versions, last_modified = get_versions(get_db(), scopes)
+        # Pages that depend on "today" also change at midnight.
+        today = date.today()
+        midnight = datetime(today.year, today.month, today.day, tzinfo=timezone.utc)
+        self.last_modified = max(last_modified, midnight) if last_modified else midnight
+        self.key = (name, tuple(vary), today.isoformat(), versions)
+        validator = self.key + ((session.get('user_id'),) if per_user else ())
+        self.etag = hashlib.sha1(repr(validator).encode()).hexdigest()
+
+    def get_or_compute(self, compute):
+        cache = get_cache()
+        value = cache.get(self.key)
+        if value is MISSING:
+            value = compute()
+            cache.set(self.key, value)
+        return value
+
+    def not_modified(self):
+        # Per-user pages render pending flash messages, so they must be sent.
+        if self.per_user and session.get('_flashes'):
+            return False
+        if request.if_none_match:
+            return request.if_none_match.contains(self.etag)
+        if request.if_modified_since:
+            return self.last_modified.replace(microsecond=0) <= request.if_modified_since
+        return False
+
+    def respond(self, render):
+        """Return 304 if the client copy is current, else render() with validators set."""
+        if self.not_modified():
+            response = make_response('', 304)
+        else:
+            response = make_response(render())
+        response.set_etag(self.etag)
+        response.last_modified = self.last_modified
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
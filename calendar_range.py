@@ -0,0 +1,159 @@
+import calendar
+import os
+from datetime import date, timedelta
+
+from cache import month_scope
+from recurrence import expand
+
+GRANULARITIES = ('week', 'month', 'term')
+MAX_RANGE_DAYS = 366
+MAX_PER_DAY = 20
+SUMMARY_FIELDS = ('id', 'name', 'type', 'start_time', 'end_time', 'venue')
+
+# Per-day counts from the covering idx_events_date_start, then each day's
+# first `per_day` events (at least one) by an index seek on that day, so
+# busy days cost no more than their first few rows.
+RANGE_SQL = '''
+    SELECT e.id, e.name, e.type, e.event_date, e.start_time, e.end_time, e.venue, d.day_count
+    FROM (
+        SELECT event_date, COUNT(*) AS day_count FROM events
+        WHERE event_date >= ? AND event_date <= ?
+        GROUP BY event_date
+    ) d
+    JOIN events e ON e.id IN (
+        SELECT id FROM events WHERE event_date = d.event_date
+        -- At least one row per day, so per_day=0 still returns every day's count.
+        ORDER BY start_time, id LIMIT max(?, 1)
+    )
+    ORDER BY e.event_date, e.start_time, e.id
+'''
+
+
+def init_app(app):
+    # Month-day each school term starts on; a term runs until the next one.
+    app.config.setdefault('CALENDAR_TERM_STARTS', os.environ.get('CALENDAR_TERM_STARTS', '01-01,05-01,09-01'))
+
+
+def term_starts(spec):
+    """'01-06,04-20,09-01' as sorted (month, day) pairs."""
+    try:
+        starts = sorted(tuple(int(part) for part in item.strip().split('-')) for item in spec.split(','))
+        for month, day in starts:
+            date(2000, month, day)
+    except ValueError:
+        raise ValueError(f'term starts must be MM-DD,MM-DD,..., got {spec!r}')
+    return starts
+
+
+def period_bounds(granularity, day, terms):
+    """First and last day of the week (Monday to Sunday), month or term containing `day`."""
+    if granularity == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    if granularity == 'month':
+        return day.replace(day=1), day.replace(day=calendar.monthrange(day.year, day.month)[1])
+    starts = [date(year, month, dom) for year in (day.year - 1, day.year, day.year + 1) for month, dom in terms]
+    current = max(start for start in starts if start <= day)
+    following = min(start for start in starts if start > day)
+    return current, following - timedelta(days=1)
+
+
+def _label(granularity, start, terms):
+    if granularity == 'week':
+        return f'Week of {start.isoformat()}'
+    if granularity == 'month':
+        return f'{calendar.month_name[start.month]} {start.year}'
+    return f'Term {terms.index((start.month, start.day)) + 1} {start.year}'
+
+
+def parse_range(args, terms):
+    """
+    The window a request asks for: explicit ?start=&end=, or the period
+    of ?granularity= around ?date= (default today).
+
+    Returns:
+        tuple: (start date, end date, granularity)
+
+    Raises:
+        ValueError: Unreadable dates, an unknown granularity or a window
+            longer than MAX_RANGE_DAYS
+    """
+    granularity = args.get('granularity', 'month')
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    try:
+        if args.get('start') or args.get('end'):
+            start = date.fromisoformat(args.get('start', ''))
+            end = date.fromisoformat(args.get('end', ''))
+        else:
+            start, end = period_bounds(granularity, date.fromisoformat(args.get('date') or date.today().isoformat()),
+                                       terms)
+    except ValueError:
+        raise ValueError('start, end and date must be YYYY-MM-DD dates (give both start and end)')
+    if end < start:
+        raise ValueError('end must not be before start')
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError(f'The range may span at most {MAX_RANGE_DAYS} days')
+    return start, end, granularity
+
+
+def month_scopes(start, end):
+    """The events:YYYY-MM cache scopes a window touches."""
+    scopes = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        scopes.append(month_scope(year, month))
+        year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+    return scopes
+
+
+def range_summary(conn, start, end, granularity, terms, per_day=3):
+    """
+    Per-day event summary for start-end: stored events in one indexed
+    query, plus the occurrences of recurring series in the window.
+
+    Returns:
+        dict: `days` maps each date with events to its count and first
+        `per_day` events; `periods` splits the window into weeks, months
+        or terms with their counts; `prev` and `next` are the windows
+        either side for navigation
+    """
+    days = {}
+    for row in conn.execute(RANGE_SQL, (start.isoformat(), end.isoformat(), per_day)):
+        day = days.setdefault(row['event_date'], {'count': row['day_count'], 'events': []})
+        day['events'].append(dict({key: row[key] for key in SUMMARY_FIELDS}, series_id=None))
+    # Recurring series are expanded for the window only and merged in.
+    for occurrence in expand(conn, start, end):
+        day = days.setdefault(occurrence['event_date'], {'count': 0, 'events': []})
+        day['count'] += 1
+        day['events'].append({key: occurrence[key] for key in SUMMARY_FIELDS + ('series_id',)})
+    for day in days.values():
+        # Stored events and occurrences interleave by time; keep the first per_day of both.
+        day['events'] = sorted(day['events'], key=lambda event: event['start_time'])[:per_day]
+
+    periods = []
+    cursor = start
+    while cursor <= end:
+        bounds = period_bounds(granularity, cursor, terms)
+        period_start, period_end = max(bounds[0], start), min(bounds[1], end)
+        periods.append({
+            'label': _label(granularity, bounds[0], terms),
+            'start': period_start.isoformat(),
+            'end': period_end.isoformat(),
+            'count': sum(day['count'] for key, day in days.items()
+                         if period_start.isoformat() <= key <= period_end.isoformat()),
+        })
+        cursor = period_end + timedelta(days=1)
+
+    previous = period_bounds(granularity, start - timedelta(days=1), terms)
+    following = period_bounds(granularity, end + timedelta(days=1), terms)
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'granularity': granularity,
+        'total': sum(day['count'] for day in days.values()),
+        'days': days,
+        'periods': periods,
+        'prev': {'start': previous[0].isoformat(), 'end': previous[1].isoformat()},
+        'next': {'start': following[0].isoformat(), 'end': following[1].isoformat()},
+    }
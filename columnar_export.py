@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Typed, column-batched JSONL exports for analytics loads.
+
+Each export is a gzip-compressed JSON Lines stream:
+
+    {"schema": {...}}                                   first line
+    {"batch": 0, "rows": 5000, "columns": {...}}        one line per batch
+    {"manifest": {...}}                                 last line
+
+Batches are column-major (one array per column), in the spirit of Arrow
+record batches, and values carry their types: dates are days since
+1970-01-01 (date32), times are seconds since midnight (time32[s]) and
+timestamps are seconds since the epoch (timestamp[s], UTC). Values that do
+not parse as their declared type are exported as null and counted in the
+manifest's `invalid` map, so loaders never have to re-parse strings.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import date, datetime, timezone
+
+from flask import Response
+
+import db
+from exports import DUTIES_SQL, gzip_stream
+
+FORMAT_VERSION = 1
+BATCH_ROWS = 5000
+
+_EPOCH = date(1970, 1, 1)
+
+
+def _to_date32(value):
+    return (date.fromisoformat(str(value)[:10]) - _EPOCH).days
+
+
+def _to_time32(value):
+    parts = str(value).strip().split(':')
+    if not 2 <= len(parts) <= 3:
+        raise ValueError(value)
+    hours, minutes = int(parts[0]), int(parts[1])
+    seconds = int(float(parts[2])) if len(parts) == 3 else 0
+    if not (0 <= hours < 24 and 0 <= minutes < 60 and 0 <= seconds < 60):
+        raise ValueError(value)
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def _to_timestamp(value):
+    # CURRENT_TIMESTAMP values are UTC without an offset.
+    parsed = datetime.fromisoformat(str(value))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+ENCODERS = {
+    'int64': int,
+    'string': str,
+    'date32[day]': _to_date32,
+    'time32[s]': _to_time32,
+    'timestamp[s]': _to_timestamp,
+}
+
+_EVENT_FIELDS = [
+    ('id', 'int64'),
+    ('name', 'string'),
+    ('type', 'string'),
+    ('event_date', 'date32[day]'),
+    ('start_time', 'time32[s]'),
+    ('end_time', 'time32[s]'),
+    ('venue', 'string'),
+    ('description', 'string'),
+    ('host_school', 'string'),
+    ('participating_schools', 'string'),
+    ('status', 'string'),
+    ('created_at', 'timestamp[s]'),
+]
+
+_PARTICIPANT_FIELDS = [
+    ('id', 'int64'),
+    ('unique_id', 'string'),
+    ('name', 'string'),
+    ('type', 'string'),
+    ('class_dept', 'string'),
+    ('school', 'string'),
+    ('grade', 'string'),
+    ('contact', 'string'),
+    ('emergency_contact', 'string'),
+    ('created_at', 'timestamp[s]'),
+]
+
+_DUTY_FIELDS = [
+    ('id', 'int64'),
+    ('event_id', 'int64'),
+    ('duty_person_id', 'int64'),
+    ('event_name', 'string'),
+    ('person_name', 'string'),
+    ('duty_type', 'string'),
+    ('duty_date', 'date32[day]'),
+    ('start_time', 'time32[s]'),
+    ('end_time', 'time32[s]'),
+    ('location', 'string'),
+    ('description', 'string'),
+    ('notes', 'string'),
+    ('assigned_at', 'timestamp[s]'),
+]
+
+TABLES = {
+    'events': ('SELECT * FROM events ORDER BY id', _EVENT_FIELDS),
+    'participants': ('SELECT * FROM participants ORDER BY id', _PARTICIPANT_FIELDS),
+    'duties': (DUTIES_SQL, _DUTY_FIELDS),
+}
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+def iter_lines(rows, entity, batch_rows=BATCH_ROWS, summary=None):
+    """
+    Encode `rows` of `entity` as schema, batch and manifest lines.
+
+    Args:
+        rows: Iterable of sqlite3.Row (or dicts) from the entity's query
+        entity (str): Key of TABLES
+        batch_rows (int): Rows per column batch
+        summary (dict): If given, filled with the manifest once the rows run out
+
+    Yields:
+        str: Newline-terminated JSON lines
+    """
+    _, fields = TABLES[entity]
+    names = [name for name, _ in fields]
+    encoders = [ENCODERS[kind] for _, kind in fields]
+
+    yield _dumps({'schema': {
+        'format_version': FORMAT_VERSION,
+        'entity': entity,
+        'fields': [{'name': name, 'type': kind} for name, kind in fields],
+    }}) + '\n'
+
+    invalid = dict.fromkeys(names, 0)
+    total = 0
+    batch_count = 0
+    columns = [[] for _ in names]
+
+    def flush():
+        line = _dumps({
+            'batch': batch_count,
+            'rows': len(columns[0]),
+            'columns': dict(zip(names, columns)),
+        })
+        return line + '\n'
+
+    for row in rows:
+        for index, name in enumerate(names):
+            value = row[name]
+            if value is not None:
+                try:
+                    value = encoders[index](value)
+                except (TypeError, ValueError):
+                    invalid[name] += 1
+                    value = None
+            columns[index].append(value)
+        total += 1
+        if len(columns[0]) >= batch_rows:
+            yield flush()
+            batch_count += 1
+            columns = [[] for _ in names]
+
+    if columns[0]:
+        yield flush()
+        batch_count += 1
+
+    manifest = {
+        'entity': entity,
+        'rows': total,
+        'batches': batch_count,
+        'invalid': {name: count for name, count in invalid.items() if count},
+        'exported_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+    if summary is not None:
+        summary.update(manifest)
+    yield _dumps({'manifest': manifest}) + '\n'
+
+
+def columnar_response(pool, entity):
+    """Stream one entity as a gzip-compressed columnar JSONL attachment."""
+    sql, _ = TABLES[entity]
+    lines = iter_lines(db.iter_query(pool, sql, fetch_size=BATCH_ROWS), entity)
+    response = Response(gzip_stream(lines), mimetype='application/gzip')
+    response.headers['Content-Disposition'] = f'attachment; filename={entity}.jsonl.gz'
+    return response
+
+
+def export_directory(database, out_dir, entities=None, batch_rows=BATCH_ROWS):
+    """
+    Write <entity>.jsonl.gz for each entity plus a manifest.json describing them.
+
+    Returns:
+        dict: The manifest that was written
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    conn = sqlite3.connect(database)
+    conn.row_factory = sqlite3.Row
+    manifest = {'format_version': FORMAT_VERSION, 'files': {}}
+    try:
+        for entity in entities or TABLES:
+            sql, fields = TABLES[entity]
+            path = os.path.join(out_dir, f'{entity}.jsonl.gz')
+            digest = hashlib.sha256()
+            summary = {}
+            with open(path, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as out:
+                for line in iter_lines(conn.execute(sql), entity, batch_rows, summary):
+                    out.write(line.encode('utf-8'))
+            with open(path, 'rb') as written:
+                for block in iter(lambda: written.read(1 << 20), b''):
+                    digest.update(block)
+            manifest['files'][entity] = {
+                'path': os.path.basename(path),
+                'bytes': os.path.getsize(path),
+                'sha256': digest.hexdigest(),
+                'rows': summary['rows'],
+                'batches': summary['batches'],
+                'invalid': summary['invalid'],
+                'fields': [{'name': name, 'type': kind} for name, kind in fields],
+            }
+    finally:
+        conn.close()
+
+    manifest['exported_at'] = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export events, participants and duties as typed columnar JSONL')
+    parser.add_argument('out_dir', help='Directory to write <entity>.jsonl.gz and manifest.json into')
+    parser.add_argument('--database', '-d', default='events.db', help='Path to the SQLite database')
+    parser.add_argument('--entity', action='append', choices=sorted(TABLES), help='Limit to this entity (repeatable)')
+    parser.add_argument('--batch-rows', type=int, default=BATCH_ROWS, help='Rows per column batch')
+    args = parser.parse_args()
+
+    manifest = export_directory(args.database, args.out_dir, args.entity, args.batch_rows)
+    for entity, info in manifest['files'].items():
+        print(f"✓ {entity}: {info['rows']} rows, {info['bytes']} bytes -> {info['path']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,374 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from flask import current_app, g
+
+# PRAGMAs applied to every pooled connection. Values can be overridden (or
+# extended) through app.config['DB_PRAGMAS'].
+DEFAULT_PRAGMAS = {
+    'cache_size': -16000,
+    'temp_store': 'MEMORY',
+    'mmap_size': 64 * 1024 * 1024,
+}
+
+
+# Storage-level settings. journal_mode is persistent in the database file and
+# is set once per process; synchronous and busy_timeout are per connection.
+DEFAULT_STORAGE = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+}
+
+
+# The writer thread's connection, set only on that thread. Jobs that write
+# again (directly or through get_db()) join the running transaction on it
+# instead of queueing behind themselves.
+_writer = threading.local()
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def storage_pragmas(storage):
+    return {
+        'synchronous': storage['synchronous'],
+        'busy_timeout': int(storage['busy_timeout']),
+    }
+
+
+def apply_journal_mode(database, journal_mode, timeout=10.0):
+    conn = sqlite3.connect(database, timeout=timeout)
+    try:
+        return conn.execute(f'PRAGMA journal_mode = {journal_mode}').fetchone()[0]
+    finally:
+        conn.close()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections shared by the threads of one worker.
+
+    Connections keep their page cache between requests, which is most of the
+    win over opening events.db on every call. A connection that has been idle
+    for longer than `health_check_after` seconds is pinged before it is handed
+    out again and replaced if the ping fails.
+    """
+
+    def __init__(self, database, max_size=8, pragmas=None, timeout=10.0,
+                 health_check_after=30.0):
+        self.database = database
+        self.max_size = max_size
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        self.pragmas.update(pragmas or {})
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+
+        self._lock = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = deque()
+        self._in_use = 0
+        self._created = 0
+        self._reused = 0
+        self._waits = 0
+        self._discarded = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        self._created += 1
+        return conn
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _check_fork(self):
+        # A pool inherited through fork (gunicorn --preload) must not share
+        # file handles with the parent, so start over in the child.
+        if self._pid != os.getpid():
+            self._reset()
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._lock:
+            self._check_fork()
+            while True:
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    if time.monotonic() - released_at > self.health_check_after \
+                            and not self._is_healthy(conn):
+                        self._discard(conn)
+                        continue
+                    self._in_use += 1
+                    self._reused += 1
+                    return conn
+                if self._in_use < self.max_size:
+                    conn = self._connect()
+                    self._in_use += 1
+                    return conn
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f'No database connection available after {self.timeout}s')
+                self._waits += 1
+                self._lock.wait(remaining)
+
+    def release(self, conn):
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._in_use -= 1
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.append((conn, time.monotonic()))
+            except sqlite3.Error:
+                self._discard(conn)
+            self._lock.notify()
+
+    def _discard(self, conn):
+        self._discarded += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close_all(self):
+        with self._lock:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                conn.close()
+
+    def health_check(self):
+        conn = self.acquire()
+        try:
+            return self._is_healthy(conn)
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        with self._lock:
+            self._check_fork()
+            return {
+                'pid': self._pid,
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'created': self._created,
+                'reused': self._reused,
+                'waits': self._waits,
+                'discarded': self._discarded,
+            }
+
+
+class WriteQueue:
+    """
+    Serializes all writes of one worker process through a single thread.
+
+    Each job runs on the writer's own connection inside BEGIN IMMEDIATE, so
+    it takes the database write lock up front instead of failing halfway
+    through with "database is locked". Writers in other gunicorn workers are
+    serialized by SQLite itself and wait up to busy_timeout for the lock.
+
+    A job that submits another write runs it inline, inside its own
+    transaction: waiting for the queue from the writer thread would never
+    return.
+    """
+
+    def __init__(self, database, pragmas=None, timeout=10.0):
+        self.database = database
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        self.pragmas.update(pragmas or {})
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._jobs = None
+        self._thread = None
+        self._completed = 0
+        self._failed = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._jobs = queue.Queue()
+            self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        conn = sqlite3.connect(self.database, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        _writer.conn = conn
+
+        jobs = self._jobs
+        while True:
+            fn, future = jobs.get()
+            if fn is None:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                result = fn(conn)
+                conn.commit()
+            except BaseException as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._failed += 1
+                future.set_exception(e)
+            else:
+                self._completed += 1
+                future.set_result(result)
+        _writer.conn = None
+        conn.close()
+
+    def submit(self, fn):
+        if threading.current_thread() is self._thread:
+            future = Future()
+            try:
+                future.set_result(fn(_writer.conn))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+        self._ensure_started()
+        future = Future()
+        self._jobs.put((fn, future))
+        return future
+
+    def run(self, fn):
+        return self.submit(fn).result()
+
+    def stop(self):
+        if self._thread is not None and self._pid == os.getpid():
+            self._jobs.put((None, None))
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return {
+            'pending': self._jobs.qsize() if self._jobs is not None else 0,
+            'completed': self._completed,
+            'failed': self._failed,
+        }
+
+
+def init_app(app):
+    app.config.setdefault('DATABASE', os.environ.get('DATABASE', 'events.db'))
+    app.config.setdefault('DB_POOL_SIZE', int(os.environ.get('DB_POOL_SIZE', 8)))
+    app.config.setdefault('DB_PRAGMAS', {})
+    app.config.setdefault('DB_JOURNAL_MODE', os.environ.get('DB_JOURNAL_MODE', DEFAULT_STORAGE['journal_mode']))
+    app.config.setdefault('DB_SYNCHRONOUS', os.environ.get('DB_SYNCHRONOUS', DEFAULT_STORAGE['synchronous']))
+    app.config.setdefault('DB_BUSY_TIMEOUT', int(os.environ.get('DB_BUSY_TIMEOUT', DEFAULT_STORAGE['busy_timeout'])))
+    app.config.setdefault('DB_WRITE_QUEUE', os.environ.get('DB_WRITE_QUEUE', '1') != '0')
+
+    pragmas = storage_pragmas({
+        'synchronous': app.config['DB_SYNCHRONOUS'],
+        'busy_timeout': app.config['DB_BUSY_TIMEOUT'],
+    })
+    pragmas.update(app.config['DB_PRAGMAS'])
+
+    app.extensions['db_pool'] = ConnectionPool(
+        app.config['DATABASE'],
+        max_size=app.config['DB_POOL_SIZE'],
+        pragmas=pragmas,
+    )
+    app.extensions['db_writer'] = WriteQueue(app.config['DATABASE'], pragmas=pragmas)
+    app.extensions['db_journal_mode'] = None
+    app.before_request(_ensure_journal_mode)
+    app.teardown_appcontext(close_db)
+
+
+def _ensure_journal_mode():
+    if current_app.extensions['db_journal_mode'] is None:
+        current_app.extensions['db_journal_mode'] = apply_journal_mode(
+            current_app.config['DATABASE'], current_app.config['DB_JOURNAL_MODE'])
+
+
+def get_pool():
+    return current_app.extensions['db_pool']
+
+
+def get_db():
+    """Return the connection bound to the current request, checking one out if needed."""
+    if getattr(_writer, 'conn', None) is not None:
+        return _writer.conn
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+
+def get_writer():
+    return current_app.extensions['db_writer']
+
+
+def write(fn):
+    """
+    Run fn(conn) as one write transaction and return its result.
+
+    With DB_WRITE_QUEUE enabled (the default) the job is handed to the
+    process's writer thread; otherwise it runs on the request connection.
+    Called from a job already running on the writer thread, fn runs inline
+    as part of that job's transaction.
+    """
+    if getattr(_writer, 'conn', None) is not None:
+        return fn(_writer.conn)
+    if current_app.config['DB_WRITE_QUEUE']:
+        return get_writer().run(fn)
+
+    conn = get_db()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        result = fn(conn)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return result
+
+
+def execute_write(sql, params=()):
+    return write(lambda conn: conn.execute(sql, params))
+
+
+def iter_query(pool, sql, params=(), fetch_size=500):
+    """
+    Yield the rows of a query while holding at most `fetch_size` of them.
+
+    The generator checks out its own pooled connection and returns it when
+    exhausted or closed, because a streamed response outlives the request's
+    app context (and with it the connection in flask.g).
+    """
+    conn = pool.acquire()
+    try:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        pool.release(conn)
+
+
+def close_db(exc=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().release(conn)
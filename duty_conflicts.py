@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+from intervals import IntervalIndex, time_interval
+
+# A duty whose person row is gone is still reported, under its person id.
+DUTY_COLUMNS = '''
+    d.id, d.duty_person_id, d.duty_date, d.start_time, d.end_time, d.duty_type, d.location,
+    e.name AS event_name, COALESCE(dp.name, 'Person ' || d.duty_person_id) AS person_name
+'''
+
+
+class DutyConflict(ValueError):
+    """An assignment overlaps duties the person already has that day."""
+
+    def __init__(self, person_name, duty_date, conflicts):
+        self.conflicts = conflicts
+        times = ', '.join(f"{c['start_time']}-{c['end_time']} ({c['event_name'] or c['duty_type']})" for c in conflicts)
+        super().__init__(f'{person_name} is already on duty on {duty_date} at {times}')
+
+
+def describe_duty(row):
+    return {
+        'id': row['id'],
+        'event_name': row['event_name'],
+        'duty_type': row['duty_type'],
+        'start_time': row['start_time'],
+        'end_time': row['end_time'],
+        'location': row['location'],
+    }
+
+
+def find_conflicts(conn, person_id, duty_date, start_time, end_time, exclude_id=None):
+    """
+    Duties `person_id` already has on `duty_date` that overlap start-end.
+
+    idx_duties_person_date narrows the lookup to that person's day, so the
+    check costs the same however many duties the table holds. Times that
+    cannot be read never conflict.
+
+    Args:
+        exclude_id (int): Duty being edited, which cannot clash with itself
+
+    Returns:
+        list: Conflicting duties as dicts, in start order
+    """
+    interval = time_interval(start_time, end_time)
+    if interval is None:
+        return []
+    rows = conn.execute(f'''
+        SELECT {DUTY_COLUMNS}
+        FROM duties d
+        LEFT JOIN events e ON d.event_id = e.id
+        LEFT JOIN duty_personnel dp ON d.duty_person_id = dp.id
+        WHERE d.duty_person_id = ? AND d.duty_date = ?
+    ''', (person_id, duty_date)).fetchall()
+    index = IntervalIndex()
+    for row in rows:
+        other = time_interval(row['start_time'], row['end_time'])
+        if other is not None and row['id'] != exclude_id:
+            index.add(None, other[0], other[1], describe_duty(row))
+    return index.overlapping(None, *interval)
+
+
+def check_assignment(conn, person_id, person_name, duty_date, start_time, end_time, exclude_id=None):
+    """
+    Raises:
+        DutyConflict: The person is already on duty during start-end
+    """
+    conflicts = find_conflicts(conn, person_id, duty_date, start_time, end_time, exclude_id)
+    if conflicts:
+        raise DutyConflict(person_name, duty_date, conflicts)
+
+
+def audit(conn):
+    """
+    Every pair of overlapping duties for the same person on the same day.
+
+    One pass over the duties in (person, date) order; each day's duties
+    are checked against an interval index of that day's earlier ones. Only
+    the duties found to clash are looked up in full afterwards.
+
+    Returns:
+        list: {'person_id', 'person_name', 'duty_date', 'duties': [first, second]} dicts
+    """
+    pairs = []
+    index = IntervalIndex()
+    current = None
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute('SELECT id, duty_person_id, duty_date, start_time, end_time FROM duties '
+                   'ORDER BY duty_person_id, duty_date')
+    for duty_id, person_id, duty_date, start_time, end_time in cursor:
+        key = (person_id, duty_date)
+        if key != current:
+            # Days never overlap each other, so only one day is held at a time.
+            index.clear()
+            current = key
+        interval = time_interval(start_time, end_time)
+        if interval is None:
+            continue
+        for other_id in index.overlapping(key, *interval):
+            pairs.append((other_id, duty_id))
+        index.add(key, interval[0], interval[1], duty_id)
+
+    details = {}
+    ids = sorted({duty_id for pair in pairs for duty_id in pair})
+    # Chunked to stay under SQLite's host parameter limit.
+    for offset in range(0, len(ids), 500):
+        chunk = ids[offset:offset + 500]
+        for row in conn.execute(f'''
+            SELECT {DUTY_COLUMNS}
+            FROM duties d
+            LEFT JOIN events e ON d.event_id = e.id
+            LEFT JOIN duty_personnel dp ON d.duty_person_id = dp.id
+            WHERE d.id IN ({', '.join('?' * len(chunk))})
+        ''', chunk):
+            details[row['id']] = row
+
+    conflicts = []
+    for first, second in pairs:
+        row = details[second]
+        conflicts.append({
+            'person_id': row['duty_person_id'],
+            'person_name': row['person_name'],
+            'duty_date': row['duty_date'],
+            'duties': [describe_duty(details[first]), describe_duty(row)],
+        })
+    return conflicts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='List people double-booked on overlapping duties')
+    parser.add_argument('--database', default=os.environ.get('DATABASE', 'events.db'))
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.database)
+    conn.row_factory = sqlite3.Row
+    started = time.perf_counter()
+    conflicts = audit(conn)
+    elapsed = time.perf_counter() - started
+    total = conn.execute('SELECT COUNT(*) FROM duties').fetchone()[0]
+    conn.close()
+
+    for conflict in conflicts:
+        first, second = conflict['duties']
+        print(f"{conflict['duty_date']}  {conflict['person_name']}: "
+              f"#{first['id']} {first['start_time']}-{first['end_time']} {first['event_name'] or first['duty_type']} / "
+              f"#{second['id']} {second['start_time']}-{second['end_time']} {second['event_name'] or second['duty_type']}")
+    mark = '✓' if not conflicts else '✗'
+    print(f'{mark} {len(conflicts)} conflict(s) in {total} duties ({elapsed * 1000:.1f} ms)')
+    return 1 if conflicts else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import re
+from datetime import date, datetime, timedelta
+
+EVENT_TYPES = ('sports', 'cultural', 'academic', 'technical', 'other')
+# Minutes assumed when an extracted event has a start time but no end time.
+DEFAULT_DURATION = 60
+
+# Day-first numeric formats come before month-first ones, matching how
+# dates are written on the posters we receive.
+DATE_FORMATS = [
+    '%Y-%m-%d', '%Y/%m/%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%d/%m/%y', '%m/%d/%Y',
+    '%d %B %Y', '%d %b %Y', '%B %d %Y', '%b %d %Y',
+]
+YEARLESS_FORMATS = ['%d %B', '%d %b', '%B %d', '%b %d']
+
+_ORDINAL = re.compile(r'\b(\d{1,2})(st|nd|rd|th)\b', re.IGNORECASE)
+_WEEKDAY = re.compile(r'\b(mon|tues?|wed(nes)?|thu(rs)?|fri|sat(ur)?|sun)(day)?\b\.?', re.IGNORECASE)
+_SEPT = re.compile(r'\bsept\b', re.IGNORECASE)
+_ABBREVIATION_DOT = re.compile(r'(?<=[a-z])\.', re.IGNORECASE)
+_TIME = re.compile(r'^(\d{1,2})(?:[:.](\d{2}))?\s*(?:([ap])\.?\s*m\.?)?$', re.IGNORECASE)
+_RANGE = re.compile(r'\s*(?:-|–|—|\bto\b|\buntil\b|\btill\b)\s*', re.IGNORECASE)
+
+
+def normalize_date(value, today=None):
+    """
+    Parse a date as written on a poster into YYYY-MM-DD, or None.
+
+    Dates without a year are placed in the current year, or the next one if
+    that would put them more than two months in the past.
+    """
+    if not value:
+        return None
+    text = _ORDINAL.sub(r'\1', str(value))
+    text = _SEPT.sub('Sep', _WEEKDAY.sub('', text))
+    # Drop commas and abbreviation dots ('Sept. 14,') but keep '14.09.2025'.
+    text = ' '.join(_ABBREVIATION_DOT.sub('', text).replace(',', ' ').split())
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            pass
+
+    today = today or date.today()
+    for fmt in YEARLESS_FORMATS:
+        try:
+            parsed = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        try:
+            candidate = date(today.year, parsed.month, parsed.day)
+            if candidate < today - timedelta(days=60):
+                candidate = date(today.year + 1, parsed.month, parsed.day)
+        except ValueError:
+            return None
+        return candidate.isoformat()
+    return None
+
+
+def _parse_time(text, meridiem=None):
+    """Return (hours, minutes, meridiem found) for one time, or None."""
+    text = text.strip().lower()
+    if text == 'noon':
+        return 12, 0, 'p'
+    if text == 'midnight':
+        return 0, 0, 'a'
+    match = _TIME.match(text)
+    if not match:
+        return None
+    hours, minutes = int(match.group(1)), int(match.group(2) or 0)
+    found = match.group(3)
+    suffix = (found or meridiem or '').lower()
+    if suffix == 'p' and hours < 12:
+        hours += 12
+    elif suffix == 'a' and hours == 12:
+        hours = 0
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours, minutes, found
+
+
+def normalize_time(value):
+    """Parse '10 am', '10:30 PM', '14.30' or 'noon' into HH:MM, or None."""
+    start, _ = normalize_time_range(value)
+    return start
+
+
+def normalize_time_range(value):
+    """
+    Parse a time or a range such as '10:00 AM - 12:30 PM' into (start, end)
+    HH:MM strings; either may be None. A single am/pm after the range applies
+    to both ends ('10 - 11:30 am').
+    """
+    if not value:
+        return None, None
+    parts = [part for part in _RANGE.split(str(value).strip(), maxsplit=1) if part]
+    if not parts:
+        return None, None
+    end = _parse_time(parts[1]) if len(parts) > 1 else None
+    start = _parse_time(parts[0], meridiem=end[2] if end and end[2] else None)
+    fmt = lambda parsed: f'{parsed[0]:02d}:{parsed[1]:02d}' if parsed else None
+    return fmt(start), fmt(end)
+
+
+def _add_minutes(hhmm, minutes):
+    hours, mins = map(int, hhmm.split(':'))
+    total = min(hours * 60 + mins + minutes, 23 * 60 + 59)
+    return f'{total // 60:02d}:{total % 60:02d}'
+
+
+def normalize_event(raw, today=None):
+    """
+    Map one extracted event onto the events table's fields and formats.
+
+    Args:
+        raw (dict): Event as returned by the model (event_name, location,
+            date, time or start_time/end_time, event_type, description)
+
+    Returns:
+        dict: name, type, event_date, start_time, end_time, venue and
+        description, plus a `warnings` list naming anything that was guessed
+        or could not be read
+    """
+    warnings = []
+    start, end = normalize_time_range(raw.get('start_time') or raw.get('time'))
+    if raw.get('end_time'):
+        end = normalize_time(raw['end_time']) or end
+    if start is None:
+        warnings.append('start time not recognised')
+    elif end is None:
+        end = _add_minutes(start, DEFAULT_DURATION)
+        warnings.append(f'end time assumed ({DEFAULT_DURATION} minutes)')
+
+    event_date = normalize_date(raw.get('date'), today)
+    if event_date is None:
+        warnings.append('date not recognised')
+
+    name = (raw.get('event_name') or raw.get('name') or '').strip()
+    venue = (raw.get('location') or raw.get('venue') or '').strip()
+    if not name:
+        warnings.append('name not found')
+    if not venue:
+        warnings.append('venue not found')
+
+    event_type = (raw.get('event_type') or raw.get('type') or '').strip().lower()
+    if event_type not in EVENT_TYPES:
+        event_type = 'other'
+
+    return {
+        'name': name,
+        'type': event_type,
+        'event_date': event_date or '',
+        'start_time': start or '',
+        'end_time': end or '',
+        'venue': venue,
+        'description': (raw.get('additional_info') or raw.get('description') or '').strip(),
+        'warnings': warnings,
+    }
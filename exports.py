@@ -0,0 +1,198 @@
+import csv
+import heapq
+import zlib
+
+from flask import Response
+
+import db
+from recurrence import expand
+
+# Rows written per chunk handed to the WSGI server.
+CHUNK_ROWS = 500
+
+
+class Column:
+    """
+    One CSV column: a header and either a row field name or a function of the row.
+    """
+
+    def __init__(self, header, source):
+        self.header = header
+        self.source = source
+
+    def value(self, row):
+        if callable(self.source):
+            return self.source(row)
+        return row[self.source]
+
+
+class ExportSpec:
+    def __init__(self, sql, columns, rows=None):
+        self.sql = sql
+        self.columns = columns
+        # Optional callable(pool) yielding the rows instead of running `sql`.
+        self.rows = rows
+
+    def header(self):
+        return [column.header for column in self.columns]
+
+    def values(self, row):
+        return [column.value(row) for column in self.columns]
+
+
+EVENT_COLUMNS = [
+    Column('ID', 'id'),
+    Column('Name', 'name'),
+    Column('Type', 'type'),
+    Column('Date', 'event_date'),
+    Column('Start Time', 'start_time'),
+    Column('End Time', 'end_time'),
+    Column('Venue', 'venue'),
+    Column('Host School', 'host_school'),
+]
+
+PARTICIPANT_COLUMNS = [
+    Column('ID', 'id'),
+    Column('Unique ID', 'unique_id'),
+    Column('Name', 'name'),
+    Column('Type', 'type'),
+    Column('Class/Dept', 'class_dept'),
+    Column('School', 'school'),
+    Column('Contact', 'contact'),
+]
+
+DUTIES_SQL = '''
+    SELECT d.*, e.name as event_name, dp.name as person_name
+    FROM duties d
+    JOIN events e ON d.event_id = e.id
+    JOIN duty_personnel dp ON d.duty_person_id = dp.id
+    ORDER BY d.duty_date
+'''
+
+DUTY_COLUMNS = [
+    Column('ID', 'id'),
+    Column('Event Name', 'event_name'),
+    Column('Person Name', 'person_name'),
+    Column('Duty Type', 'duty_type'),
+    Column('Date', 'duty_date'),
+]
+
+EXPORTS = {
+    'events': ExportSpec(
+        'SELECT * FROM events ORDER BY event_date',
+        EVENT_COLUMNS + [Column('Description', 'description')],
+    ),
+    'participants': ExportSpec(
+        'SELECT * FROM participants ORDER BY name',
+        PARTICIPANT_COLUMNS,
+    ),
+    'duties': ExportSpec(
+        DUTIES_SQL,
+        DUTY_COLUMNS + [
+            Column('Start Time', 'start_time'),
+            Column('End Time', 'end_time'),
+            Column('Location', 'location'),
+        ],
+    ),
+    'teachers': ExportSpec(
+        'SELECT * FROM duty_personnel ORDER BY name',
+        [
+            Column('ID', 'id'),
+            Column('Name', 'name'),
+            Column('Designation', 'designation'),
+            Column('School', 'school'),
+            Column('Contact', 'contact'),
+            Column('Email', 'email'),
+        ],
+    ),
+}
+
+def event_window_export(start, end):
+    """
+    Events dated start-end (dates) with the occurrences of recurring series
+    in that window merged in by date and time. Series repeat without end,
+    so they are only exported for a bounded window.
+    """
+    def rows(pool):
+        stored = db.iter_query(pool, 'SELECT * FROM events WHERE event_date >= ? AND event_date <= ? '
+                                     'ORDER BY event_date, start_time', (start.isoformat(), end.isoformat()),
+                               fetch_size=CHUNK_ROWS)
+        conn = pool.acquire()
+        try:
+            occurrences = expand(conn, start, end)
+        finally:
+            pool.release(conn)
+        return heapq.merge(stored, occurrences, key=lambda row: (row['event_date'], row['start_time']))
+
+    return ExportSpec(None, EVENT_COLUMNS + [
+        Column('Description', 'description'),
+        Column('Series', lambda row: row['series_id'] if 'series_id' in row.keys() else ''),
+    ], rows)
+
+
+# /reports/export: one CSV with a titled section per entity.
+REPORT_SECTIONS = [
+    ('Events Report', ExportSpec('SELECT * FROM events ORDER BY event_date', EVENT_COLUMNS)),
+    ('Participants Report', EXPORTS['participants']),
+    ('Duties Report', ExportSpec(DUTIES_SQL, DUTY_COLUMNS + [
+        Column('Time', lambda row: f"{row['start_time']} - {row['end_time']}"),
+        Column('Location', 'location'),
+    ])),
+]
+
+
+class _Echo:
+    """File-like object whose write() hands the formatted line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(pool, sections):
+    """
+    Yield CSV text for `sections` in chunks of about CHUNK_ROWS rows.
+
+    Args:
+        pool: ConnectionPool to read from
+        sections (list): (title or None, ExportSpec) pairs; titled sections
+            are separated by a blank line as in the reports export
+    """
+    writer = csv.writer(_Echo())
+    chunk = []
+    for index, (title, spec) in enumerate(sections):
+        if title:
+            if index:
+                chunk.append(writer.writerow([]))
+            chunk.append(writer.writerow([title]))
+        chunk.append(writer.writerow(spec.header()))
+        rows = spec.rows(pool) if spec.rows else db.iter_query(pool, spec.sql, fetch_size=CHUNK_ROWS)
+        for row in rows:
+            chunk.append(writer.writerow(spec.values(row)))
+            if len(chunk) >= CHUNK_ROWS:
+                yield ''.join(chunk)
+                chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def gzip_stream(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def csv_response(pool, sections, filename, compress=False):
+    """
+    Stream `sections` as a CSV attachment, gzip-compressed if `compress`.
+    """
+    chunks = iter_csv(pool, sections)
+    if compress:
+        response = Response(gzip_stream(chunks), mimetype='application/gzip')
+        filename += '.gz'
+    else:
+        response = Response(chunks, mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_PATH = 'extraction_cache.db'
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+SCHEMA_STATEMENTS = [
+    '''
+    CREATE TABLE IF NOT EXISTS extractions (
+        key TEXT PRIMARY KEY,
+        model TEXT NOT NULL,
+        result TEXT NOT NULL,
+        bytes INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        last_used_at REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_extractions_last_used ON extractions(last_used_at)',
+    '''
+    CREATE TABLE IF NOT EXISTS cache_counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    ''',
+]
+
+
+def cache_key(image_bytes, variant):
+    """
+    Content address of one extraction: the image bytes plus `variant`, a
+    digest of everything else that shapes the answer (model and prompt).
+    """
+    digest = hashlib.sha256(image_bytes)
+    digest.update(b'\0' + variant.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def variant_for(model_name, prompt, *options):
+    """Digest of the model, prompt and any input options (e.g. preprocessing)."""
+    text = '\0'.join([model_name, prompt] + [str(option) for option in options])
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+class ExtractionCache:
+    """
+    Persistent, size-bounded cache of extraction results in a SQLite file.
+
+    When the stored results exceed max_bytes, the least recently used
+    entries are evicted down to 90% of the limit. Hit and miss counts are
+    kept both for this process and, in cache_counters, across runs.
+
+    Args:
+        path (str): SQLite file holding the cache
+        max_bytes (int): Upper bound on the size of the stored results
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def _connect(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode = WAL')
+            self._conn.execute('PRAGMA synchronous = NORMAL')
+            for statement in SCHEMA_STATEMENTS:
+                self._conn.execute(statement)
+        return self._conn
+
+    def _count(self, conn, name):
+        conn.execute('''
+            INSERT INTO cache_counters (name, value) VALUES (?, 1)
+            ON CONFLICT (name) DO UPDATE SET value = value + 1
+        ''', (name,))
+
+    def get(self, key):
+        """Return the cached result dict for `key`, or None."""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute('SELECT result FROM extractions WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                self._count(conn, 'misses')
+                return None
+            conn.execute('UPDATE extractions SET last_used_at = ?, hits = hits + 1 WHERE key = ?',
+                         (time.time(), key))
+            self.hits += 1
+            self._count(conn, 'hits')
+            return json.loads(row[0])
+
+    def set(self, key, model, result):
+        value = json.dumps(result, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute('''
+                INSERT OR REPLACE INTO extractions (key, model, result, bytes, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (key, model, value, len(value.encode('utf-8')), now, now))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT COALESCE(SUM(bytes), 0) FROM extractions').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        victims = []
+        for key, size in conn.execute('SELECT key, bytes FROM extractions ORDER BY last_used_at'):
+            if total <= target:
+                break
+            victims.append((key,))
+            total -= size
+        conn.executemany('DELETE FROM extractions WHERE key = ?', victims)
+        self.evictions += len(victims)
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute('DELETE FROM extractions')
+            conn.execute('DELETE FROM cache_counters')
+
+    def stats(self):
+        with self._lock:
+            conn = self._connect()
+            entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM extractions').fetchone()
+            lifetime = dict(conn.execute('SELECT name, value FROM cache_counters').fetchall())
+        lookups = self.hits + self.misses
+        lifetime_lookups = lifetime.get('hits', 0) + lifetime.get('misses', 0)
+        return {
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            'evictions': self.evictions,
+            'lifetime_hits': lifetime.get('hits', 0),
+            'lifetime_misses': lifetime.get('misses', 0),
+            'lifetime_hit_rate': round(lifetime.get('hits', 0) / lifetime_lookups, 3) if lifetime_lookups else None,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+            self._pid = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or clear the image extraction cache')
+    parser.add_argument('command', choices=['stats', 'clear'])
+    parser.add_argument('--path', default=os.getenv('EXTRACTION_CACHE', DEFAULT_PATH), help='Cache database file')
+    args = parser.parse_args()
+
+    cache = ExtractionCache(args.path)
+    if args.command == 'clear':
+        cache.clear()
+        print('✓ Extraction cache cleared')
+    stats = cache.stats()
+    cache.close()
+    print(f"Entries: {stats['entries']} ({stats['bytes']} of {stats['max_bytes']} bytes)")
+    print(f"Lifetime hits: {stats['lifetime_hits']}, misses: {stats['lifetime_misses']}, "
+          f"hit rate: {stats['lifetime_hit_rate']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,426 @@
+import hashlib
+import hmac
+import os
+import threading
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+
+from flask import current_app, make_response, request
+
+from cache import MISSING, LRUCache
+from intervals import DAY_MINUTES, to_minutes
+from recurrence import WEEKDAYS, is_occurrence
+from venues import venue_key
+
+KINDS = ('venue', 'school', 'person')
+
+# Writes to events, duties, event_series and event_series_exceptions are
+# logged to feed_log by the triggers of migration 9, one row per feed
+# entity: an exception is logged as a change to its series.
+EVENT_SQL = '''
+    SELECT e.*, COALESCE(l.sequence, 0) AS sequence, COALESCE(l.changed_at, e.created_at) AS changed_at
+    FROM events e LEFT JOIN feed_log l ON l.source = 'events' AND l.row_id = e.id
+'''
+
+SERIES_SQL = '''
+    SELECT s.*, COALESCE(l.sequence, 0) AS sequence, COALESCE(l.changed_at, s.created_at) AS changed_at
+    FROM event_series s LEFT JOIN feed_log l ON l.source = 'event_series' AND l.row_id = s.id
+'''
+
+# A duty's VEVENT shows its event's name and venue, so it changes with
+# either row; its SEQUENCE is the sum of both.
+DUTY_SQL = '''
+    SELECT d.*, e.name AS event_name, e.venue AS event_venue,
+           COALESCE(ld.sequence, 0) + COALESCE(le.sequence, 0) AS sequence,
+           MAX(COALESCE(ld.changed_at, d.assigned_at), COALESCE(le.changed_at, '')) AS changed_at
+    FROM duties d
+    LEFT JOIN events e ON e.id = d.event_id
+    LEFT JOIN feed_log ld ON ld.source = 'duties' AND ld.row_id = d.id
+    LEFT JOIN feed_log le ON le.source = 'events' AND le.row_id = d.event_id
+'''
+
+
+def init_app(app):
+    # Signs feed URLs. It has no default: a guessable secret would let anyone
+    # mint a feed URL, so without one the app does not serve feeds.
+    app.config.setdefault('ICS_SECRET', os.environ.get('ICS_SECRET', ''))
+    # Stable domain part of every VEVENT UID.
+    app.config.setdefault('ICS_DOMAIN', os.environ.get('ICS_DOMAIN', 'event-management'))
+    # Feeds start this many days back; later events are all included.
+    app.config.setdefault('ICS_PAST_DAYS', int(os.environ.get('ICS_PAST_DAYS', 90)))
+    app.config.setdefault('ICS_MAX_FEEDS', int(os.environ.get('ICS_MAX_FEEDS', 256)))
+    # A feed further behind than this many changes is rebuilt instead of patched.
+    app.config.setdefault('ICS_MAX_CHANGES', int(os.environ.get('ICS_MAX_CHANGES', 500)))
+    app.extensions['ics_feeds'] = FeedStore(app.config['ICS_MAX_FEEDS'], app.config['ICS_MAX_CHANGES'])
+
+
+def get_feeds():
+    return current_app.extensions['ics_feeds']
+
+
+def feed_key(kind, key):
+    """The canonical key of a feed: venues and schools match ignoring case and spacing, people by id."""
+    if kind == 'person':
+        return str(int(key))
+    return venue_key(key)
+
+
+def feed_token(secret, kind, key):
+    """Subscription token for one feed; calendar apps cannot log in, so the URL carries it."""
+    message = f'{kind}:{feed_key(kind, key)}'.encode()
+    return hmac.new(str(secret).encode(), message, hashlib.sha256).hexdigest()[:32]
+
+
+def check_token(secret, kind, key, token):
+    return hmac.compare_digest(feed_token(secret, kind, key), token or '')
+
+
+# Venue and school names repeat across events, so full builds match them cheaply.
+_name_key = lru_cache(maxsize=4096)(venue_key)
+
+
+def _escape(text):
+    return (str(text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _line(name, value):
+    """One content line, folded at 75 octets as RFC 5545 requires."""
+    line = f'{name}:{value}'
+    if len(line) <= 75 and line.isascii():
+        return line + '\r\n'
+    data = line.encode()
+    chunks = []
+    while len(data) > 75:
+        cut = 75 if not chunks else 74
+        # Never split a UTF-8 sequence.
+        while data[cut] & 0xC0 == 0x80:
+            cut -= 1
+        chunks.append(data[:cut])
+        data = data[cut:]
+    chunks.append(data)
+    return b'\r\n '.join(chunks).decode() + '\r\n'
+
+
+def _stamp(value):
+    """DTSTAMP from a stored UTC 'YYYY-MM-DD HH:MM:SS' timestamp."""
+    try:
+        moment = datetime.fromisoformat(str(value))
+    except ValueError:
+        moment = datetime.now(timezone.utc)
+    return moment.strftime('%Y%m%dT%H%M%SZ')
+
+
+def _times(event_date, start_time, end_time):
+    """
+    DTSTART and DTEND properties for a stored date and times. Times are
+    floating (the subscriber's local time); an unreadable start makes an
+    all-day event and an end not after the start is left out.
+    """
+    day = date.fromisoformat(event_date)
+    start = to_minutes(start_time)
+    if start is None:
+        return [('DTSTART;VALUE=DATE', day.strftime('%Y%m%d'))]
+    end = DAY_MINUTES if end_time == '24:00' else to_minutes(end_time)
+
+    def moment(minutes):
+        days, minutes = divmod(minutes, DAY_MINUTES)
+        return f'{day + timedelta(days=days):%Y%m%d}T{minutes // 60:02d}{minutes % 60:02d}00'
+
+    properties = [('DTSTART', moment(start))]
+    if end is not None and end > start:
+        properties.append(('DTEND', moment(end)))
+    return properties
+
+
+def _component(properties):
+    lines = ''.join(_line(name, value) for name, value in properties if value != '')
+    return 'BEGIN:VEVENT\r\n' + lines + 'END:VEVENT\r\n'
+
+
+def _event_description(row):
+    parts = [row['description'] or '', f"Host: {row['host_school']}"]
+    if row['participating_schools']:
+        parts.append(f"Participating: {row['participating_schools']}")
+    return '\n'.join(part for part in parts if part)
+
+
+def render_event(row, domain):
+    properties = [
+        ('UID', f"event-{row['id']}@{domain}"),
+        ('DTSTAMP', _stamp(row['changed_at'])),
+        ('SEQUENCE', row['sequence']),
+    ] + _times(row['event_date'], row['start_time'], row['end_time']) + [
+        ('SUMMARY', _escape(row['name'])),
+        ('LOCATION', _escape(row['venue'])),
+        ('CATEGORIES', _escape(row['type'])),
+        ('DESCRIPTION', _escape(_event_description(row))),
+        ('STATUS', 'CANCELLED' if row['status'] == 'cancelled' else 'CONFIRMED'),
+    ]
+    return _component(properties)
+
+
+def _rrule(series):
+    """The RRULE equivalent of recurrence.occurrence_dates for a series row."""
+    start = date.fromisoformat(series['start_date'])
+    parts = [f"FREQ={series['frequency'].upper()}", f"INTERVAL={series['interval']}"]
+    if series['frequency'] == 'weekly':
+        weekdays = [int(day) for day in series['weekdays'].split(',')] if series['weekdays'] else [start.weekday()]
+        parts += ['BYDAY=' + ','.join(WEEKDAYS[day][:2].upper() for day in weekdays), 'WKST=MO']
+    elif series['frequency'] == 'monthly':
+        # RFC 5545 skips months without the day, as occurrence_dates does.
+        parts.append(f'BYMONTHDAY={start.day}')
+    if series['until_date']:
+        parts.append('UNTIL=' + date.fromisoformat(series['until_date']).strftime('%Y%m%d') + 'T235959')
+    return ';'.join(parts)
+
+
+def render_series(series, exceptions, domain):
+    """
+    A series as one recurring VEVENT: RRULE for the rule, EXDATE for
+    cancelled occurrences, and one VEVENT with RECURRENCE-ID per changed
+    occurrence, all under the series' UID.
+    """
+    uid = f"series-{series['id']}@{domain}"
+    common = [('UID', uid), ('DTSTAMP', _stamp(series['changed_at'])), ('SEQUENCE', series['sequence'])]
+    details = lambda row: [
+        ('SUMMARY', _escape(row['name'])),
+        ('LOCATION', _escape(row['venue'])),
+        ('CATEGORIES', _escape(series['type'])),
+        ('DESCRIPTION', _escape(_event_description(dict(series, description=row['description'])))),
+    ]
+    original = lambda day: _times(day, series['start_time'], series['end_time'])[0]
+
+    master = common + _times(series['start_date'], series['start_time'], series['end_time'])
+    master.append(('RRULE', _rrule(series)))
+    overrides = []
+    for exception in exceptions:
+        if not is_occurrence(series, date.fromisoformat(exception['occurrence_date'])):
+            continue
+        name, value = original(exception['occurrence_date'])
+        if exception['cancelled']:
+            master.append((name.replace('DTSTART', 'EXDATE'), value))
+            continue
+        row = {field: exception[field] or series[field] for field in ('name', 'venue', 'description')}
+        properties = common + [(name.replace('DTSTART', 'RECURRENCE-ID'), value)]
+        properties += _times(exception['event_date'] or exception['occurrence_date'],
+                             exception['start_time'] or series['start_time'],
+                             exception['end_time'] or series['end_time'])
+        overrides.append(_component(properties + details(row)))
+    return _component(master + details(series)) + ''.join(overrides)
+
+
+def render_duty(row, domain):
+    summary = f"Duty: {row['duty_type']}" + (f" - {row['event_name']}" if row['event_name'] else '')
+    description = '\n'.join(part for part in (row['description'], row['notes']) if part)
+    properties = [
+        ('UID', f"duty-{row['id']}@{domain}"),
+        ('DTSTAMP', _stamp(row['changed_at'])),
+        ('SEQUENCE', row['sequence']),
+    ] + _times(row['duty_date'], row['start_time'], row['end_time']) + [
+        ('SUMMARY', _escape(summary)),
+        ('LOCATION', _escape(row['location'] or row['event_venue'])),
+        ('DESCRIPTION', _escape(description)),
+    ]
+    return _component(properties)
+
+
+class Feed:
+    """
+    One serialized feed and the VEVENTs it was built from.
+
+    `components` maps each entity ('events', 12) to its (sort key, text).
+    `seq` is the feed_log position the feed reflects: later changes are
+    patched in one entity at a time, and the body is serialized again only
+    when a component actually changed.
+    """
+
+    def __init__(self, kind, key):
+        self.kind = kind
+        self.key = key
+        self.lock = threading.Lock()
+        self.components = {}
+        self.title = None
+        self.seq = None
+        self.since = None
+        self.body = None
+        self.etag = None
+
+    def _matches(self, venue, host_school, participating_schools):
+        if self.kind == 'venue':
+            return _name_key(venue) == self.key
+        return self.key in {_name_key(school) for school in [host_school] + (participating_schools or '').split(',')}
+
+    def matches(self, row):
+        return self._matches(row['venue'], row['host_school'], row['participating_schools'])
+
+    def _put(self, entity, sort_key, text):
+        if self.components.get(entity, (None, None))[1] == text:
+            return False
+        self.components[entity] = (sort_key, text)
+        return True
+
+    def _drop(self, entity):
+        return self.components.pop(entity, None) is not None
+
+    def _event(self, row, domain):
+        entity = ('events', row['id'])
+        if row['event_date'] >= self.since and self.matches(row):
+            return self._put(entity, (row['event_date'], row['start_time']), render_event(row, domain))
+        return self._drop(entity)
+
+    def _series(self, conn, row, domain):
+        entity = ('event_series', row['id'])
+        if (row['until_date'] is None or row['until_date'] >= self.since) and self.matches(row):
+            exceptions = conn.execute('SELECT * FROM event_series_exceptions WHERE series_id = ? '
+                                      'ORDER BY occurrence_date', (row['id'],)).fetchall()
+            return self._put(entity, (row['start_date'], row['start_time']), render_series(row, exceptions, domain))
+        return self._drop(entity)
+
+    def _duty(self, row, domain):
+        entity = ('duties', row['id'])
+        if row['duty_date'] >= self.since and str(row['duty_person_id']) == self.key:
+            return self._put(entity, (row['duty_date'], row['start_time']), render_duty(row, domain))
+        return self._drop(entity)
+
+    def build(self, conn, head, since, domain):
+        """
+        Build from scratch. Raises LookupError for a person that does not exist.
+        """
+        self.components = {}
+        self.since = since
+        if self.kind == 'person':
+            person = conn.execute('SELECT name FROM duty_personnel WHERE id = ?', (int(self.key),)).fetchone()
+            if person is None:
+                raise LookupError(f'No duty person {self.key}')
+            self.title = f"Duties: {person['name']}"
+            for row in conn.execute(DUTY_SQL + ' WHERE d.duty_person_id = ? AND d.duty_date >= ?',
+                                    (int(self.key), since)):
+                self._duty(row, domain)
+        else:
+            self.title = None
+            # Pick this feed's events from the narrow columns first; only
+            # those are read in full and rendered.
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute('SELECT id, venue, host_school, participating_schools FROM events WHERE event_date >= ?',
+                           (since,))
+            ids = [row[0] for row in cursor if self._matches(*row[1:])]
+            for offset in range(0, len(ids), 500):
+                chunk = ids[offset:offset + 500]
+                placeholders = ', '.join('?' for _ in chunk)
+                for row in conn.execute(EVENT_SQL + f' WHERE e.id IN ({placeholders})', chunk):
+                    if self._event(row, domain) and self.title is None:
+                        self.title = row['venue'] if self.kind == 'venue' else None
+            for row in conn.execute(SERIES_SQL + ' WHERE s.until_date IS NULL OR s.until_date >= ?', (since,)):
+                self._series(conn, row, domain)
+            if self.kind == 'school' or self.title is None:
+                self.title = self.key.title()
+        self.seq = head
+        self.serialize()
+
+    def patch(self, conn, changes, head, domain):
+        """Apply feed_log rows changed since `seq`; returns True if any VEVENT changed."""
+        changed = False
+        for source, row_id in changes:
+            if self.kind == 'person':
+                if source == 'duties':
+                    row = conn.execute(DUTY_SQL + ' WHERE d.id = ?', (row_id,)).fetchone()
+                    changed |= self._duty(row, domain) if row else self._drop(('duties', row_id))
+                elif source == 'events':
+                    for row in conn.execute(DUTY_SQL + ' WHERE d.event_id = ? AND d.duty_person_id = ?',
+                                            (row_id, int(self.key))):
+                        changed |= self._duty(row, domain)
+            elif source == 'events':
+                row = conn.execute(EVENT_SQL + ' WHERE e.id = ?', (row_id,)).fetchone()
+                changed |= self._event(row, domain) if row else self._drop(('events', row_id))
+            elif source == 'event_series':
+                row = conn.execute(SERIES_SQL + ' WHERE s.id = ?', (row_id,)).fetchone()
+                changed |= self._series(conn, row, domain) if row else self._drop(('event_series', row_id))
+        self.seq = head
+        if changed:
+            self.serialize()
+        return changed
+
+    def serialize(self):
+        lines = ''.join([
+            'BEGIN:VCALENDAR\r\n',
+            'VERSION:2.0\r\n',
+            'PRODID:-//Event Management//ICS Feeds//EN\r\n',
+            'CALSCALE:GREGORIAN\r\n',
+            'METHOD:PUBLISH\r\n',
+            _line('X-WR-CALNAME', _escape(self.title)),
+        ] + [text for _, text in sorted(self.components.values())] + ['END:VCALENDAR\r\n'])
+        self.body = lines.encode()
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+
+class FeedStore:
+    """
+    Serialized feeds kept per worker, least recently polled evicted first.
+
+    A poll costs one indexed read of the feed_log head when nothing
+    changed; otherwise only the entities logged since the feed's `seq` are
+    re-rendered. Feeds evicted, or further behind than `max_changes`, are
+    rebuilt.
+    """
+
+    def __init__(self, max_feeds=256, max_changes=500):
+        self._feeds = LRUCache(max_feeds, ttl=None)
+        self.max_changes = max_changes
+        self.builds = 0
+        self.patches = 0
+        self._lock = threading.Lock()
+
+    def get(self, conn, kind, key, past_days, domain):
+        """
+        The current Feed for `kind`/`key`.
+
+        Raises:
+            LookupError: A person feed for someone who does not exist
+        """
+        key = feed_key(kind, key)
+        since = (date.today() - timedelta(days=past_days)).isoformat()
+        feed = self._feeds.get((kind, key))
+        if feed is MISSING:
+            feed = Feed(kind, key)
+            self._feeds.set((kind, key), feed)
+        with feed.lock:
+            # Read the head first: a write landing during the build is
+            # applied again on the next poll.
+            head = conn.execute('SELECT MAX(seq) FROM feed_log').fetchone()[0] or 0
+            if feed.seq == head and feed.since == since:
+                return feed
+            changes = None
+            if feed.seq is not None and feed.since == since:
+                changes = conn.execute('SELECT source, row_id FROM feed_log WHERE seq > ? ORDER BY seq LIMIT ?',
+                                       (feed.seq, self.max_changes + 1)).fetchall()
+            if changes is None or len(changes) > self.max_changes:
+                feed.build(conn, head, since, domain)
+                self._count('builds')
+            else:
+                feed.patch(conn, changes, head, domain)
+                self._count('patches')
+            return feed
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        return dict(self._feeds.stats(), builds=self.builds, patches=self.patches)
+
+
+def feed_response(feed):
+    """The feed as text/calendar, or 304 when the client's ETag is current."""
+    # Another request may be patching the feed; take a matching body and ETag.
+    with feed.lock:
+        body, etag = feed.body, feed.etag
+    if request.if_none_match and request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(body)
+        response.mimetype = 'text/calendar'
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,111 @@
+import io
+import math
+import time
+
+# PIL is imported inside the functions so that importing this module (for
+# its defaults) does not load it into workers that never scan an image.
+
+# Images above this many pixels are downscaled before upload. Around two
+# megapixels keeps poster text legible while cutting most of the bytes.
+DEFAULT_MAX_PIXELS = 2_000_000
+DEFAULT_QUALITY = 85
+# Pixels differing from the corner colour by less than this count as margin.
+MARGIN_THRESHOLD = 24
+MARGIN_PADDING = 8
+
+MIME_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp', 'GIF': 'image/gif'}
+
+
+def _flatten(image):
+    """Convert to RGB, putting transparent areas on white rather than black."""
+    from PIL import Image
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _content_box(image):
+    """Bounding box of everything that differs from the top-left corner colour."""
+    from PIL import Image, ImageChops
+    gray = image.convert('L')
+    background = Image.new('L', gray.size, gray.getpixel((0, 0)))
+    mask = ImageChops.difference(gray, background).point(lambda value: 255 if value > MARGIN_THRESHOLD else 0)
+    box = mask.getbbox()
+    if box is None:
+        return None
+    left, top, right, bottom = box
+    return (max(left - MARGIN_PADDING, 0), max(top - MARGIN_PADDING, 0),
+            min(right + MARGIN_PADDING, image.width), min(bottom + MARGIN_PADDING, image.height))
+
+
+def prepare_image(data, max_pixels=DEFAULT_MAX_PIXELS, quality=DEFAULT_QUALITY, crop_margins=False):
+    """
+    Make uploaded image bytes cheap to send to the model, entirely in memory.
+
+    The image is decoded (JPEGs at a reduced scale when they are far over
+    budget), rotated upright from its EXIF orientation, optionally cropped to
+    its content, downscaled to at most `max_pixels` and re-encoded as JPEG.
+    When nothing needed changing and re-encoding would not make the file
+    smaller, the original bytes are sent unchanged.
+
+    Args:
+        data (bytes): The uploaded file
+        max_pixels (int): Pixel budget; None sends the original bytes as they are
+        quality (int): JPEG quality for the re-encoded image
+        crop_margins (bool): Trim uniform borders around the content
+
+    Returns:
+        tuple: (bytes to upload, their MIME type, stats dict)
+
+    Raises:
+        PIL.UnidentifiedImageError: `data` is not an image
+    """
+    from PIL import Image, ImageOps
+
+    started = time.perf_counter()
+    image = Image.open(io.BytesIO(data))
+    original_size, source_format = image.size, image.format
+    stats = {'input_bytes': len(data), 'original_size': list(original_size)}
+
+    if max_pixels is None:
+        image.verify()
+        stats.update(upload_bytes=len(data), upload_size=list(original_size), bytes_saved=0,
+                     preprocess_ms=round((time.perf_counter() - started) * 1000, 1))
+        return data, MIME_TYPES.get(source_format, 'application/octet-stream'), stats
+
+    width, height = original_size
+    if width * height > max_pixels and source_format == 'JPEG':
+        scale = math.sqrt(max_pixels / (width * height))
+        image.draft('RGB', (int(width * scale), int(height * scale)))
+
+    # 0x0112 is the EXIF Orientation tag; 1 means already upright.
+    changed = image.size != original_size or image.getexif().get(0x0112, 1) != 1
+    image = _flatten(ImageOps.exif_transpose(image))
+
+    if crop_margins:
+        box = _content_box(image)
+        if box and box != (0, 0, image.width, image.height):
+            image = image.crop(box)
+            changed = True
+
+    if image.width * image.height > max_pixels:
+        scale = math.sqrt(max_pixels / (image.width * image.height))
+        image = image.resize((max(int(image.width * scale), 1), max(int(image.height * scale), 1)), Image.LANCZOS)
+        changed = True
+
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=quality)
+    upload, mime_type = out.getvalue(), 'image/jpeg'
+    if not changed and len(upload) >= len(data) and source_format in MIME_TYPES:
+        upload, mime_type = data, MIME_TYPES[source_format]
+
+    stats.update(
+        upload_bytes=len(upload),
+        upload_size=list(image.size),
+        bytes_saved=len(data) - len(upload),
+        preprocess_ms=round((time.perf_counter() - started) * 1000, 1),
+    )
+    return upload, mime_type, stats
@@ -0,0 +1,91 @@
+import bisect
+from collections import defaultdict
+from functools import lru_cache
+
+from event_normalize import normalize_time
+
+DAY_MINUTES = 24 * 60
+
+
+@lru_cache(maxsize=4096)
+def to_minutes(value):
+    """Minutes since midnight for a stored time ('09:00', '9:00 AM', 'noon'), or None."""
+    # Stored times repeat heavily, so the cache makes bulk checks cheap.
+    hhmm = normalize_time(value)
+    if hhmm is None:
+        return None
+    hours, minutes = hhmm.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def time_interval(start_time, end_time):
+    """
+    Half-open [start, end) in minutes for a start and end time, or None if
+    the start cannot be read. A missing end, or one that is not after the
+    start, makes a one-minute interval: a single time still clashes with
+    anything running over it.
+    """
+    start = to_minutes(start_time)
+    if start is None:
+        return None
+    end = to_minutes(end_time)
+    if end is None or end <= start:
+        end = start + 1
+    return start, min(end, DAY_MINUTES)
+
+
+class IntervalIndex:
+    """
+    Intervals grouped by key (e.g. (person id, date)), each group kept
+    sorted by start so overlap queries bisect instead of scanning.
+
+    Only entries that start before the query ends and no earlier than the
+    query start minus the group's longest interval are examined.
+    """
+
+    def __init__(self):
+        self._starts = defaultdict(list)
+        self._entries = defaultdict(list)
+        self._longest = defaultdict(int)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        self._starts.clear()
+        self._entries.clear()
+        self._longest.clear()
+        self._count = 0
+
+    def add(self, key, start, end, item):
+        starts = self._starts[key]
+        position = bisect.bisect_right(starts, start)
+        starts.insert(position, start)
+        self._entries[key].insert(position, (start, end, item))
+        self._longest[key] = max(self._longest[key], end - start)
+        self._count += 1
+
+    def remove(self, key, item):
+        """Remove `item` from `key`'s group; returns whether it was there."""
+        entries = self._entries.get(key, [])
+        for position, entry in enumerate(entries):
+            if entry[2] == item:
+                del entries[position]
+                del self._starts[key][position]
+                self._count -= 1
+                return True
+        return False
+
+    def overlapping(self, key, start, end):
+        """Items in `key`'s group whose interval overlaps [start, end)."""
+        starts = self._starts.get(key)
+        if not starts:
+            return []
+        low = bisect.bisect_left(starts, start - self._longest[key])
+        high = bisect.bisect_left(starts, end)
+        return [item for entry_start, entry_end, item in self._entries[key][low:high] if entry_end > start]
+
+    def intervals(self, key):
+        """(start, end, item) tuples of `key`'s group, in start order."""
+        return list(self._entries.get(key, []))
@@ -0,0 +1,220 @@
+import io
+import json
+import re
+
+from event_normalize import normalize_date, normalize_time_range
+
+# Words that mark a line (or part of one) as naming a place.
+VENUE_WORDS = re.compile(
+    r'\b(hall|auditorium|ground|grounds|field|court|courts|stadium|room|lab|laboratory|library|campus|'
+    r'gym|gymnasium|theatre|theater|centre|center|block|building|pavilion|arena|park|quad|studio|pool)\b',
+    re.IGNORECASE)
+# Lines that introduce the poster rather than name the event.
+FILLER = re.compile(r'\b(presents|proudly|invites?|invitation|cordially|welcome|organi[sz]ed by|all are)\b',
+                    re.IGNORECASE)
+
+_MONTH = r'(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?'
+_DAY = r'\d{1,2}(?:st|nd|rd|th)?'
+_WEEKDAY = r'(?:(?:mon|tue|wed|thu|fri|sat|sun)[a-z]*\.?,?\s+)?'
+_DATE = re.compile(
+    rf'\b{_WEEKDAY}(?:\d{{4}}-\d{{1,2}}-\d{{1,2}}|\d{{1,2}}[/.-]\d{{1,2}}[/.-]\d{{2,4}}'
+    rf'|{_DAY}\s+(?:of\s+)?{_MONTH}(?:,?\s+\d{{4}})?|{_MONTH}\s+{_DAY}(?:,?\s+\d{{4}})?)(?![\w/])',
+    re.IGNORECASE)
+_CLOCK = r'\d{1,2}(?:[:.]\d{2})?\s*(?:[ap]\.?\s*m\b\.?)?'
+_TIME = re.compile(
+    rf'(?<![\w/.-])(?:{_CLOCK}\s*(?:-|–|—|\bto\b|\btill\b|\buntil\b)\s*{_CLOCK}'
+    r'|\d{1,2}[:.]\d{2}\s*(?:[ap]\.?\s*m\b\.?)?|\d{1,2}\s*[ap]\.?\s*m\b\.?|\bnoon\b)',
+    re.IGNORECASE)
+_LABEL = re.compile(
+    r'^(venue|location|place|where|date|day|when|time|timings?|event|title)\s*(?::|\||\s[-–]\s)\s*(.+)$',
+    re.IGNORECASE)
+_AT = re.compile(r'(?:^|\s)(?:@|at)\s+(.+)$', re.IGNORECASE)
+_SEPARATORS = ' \t-–—|:,;•·*'
+
+LABEL_FIELDS = {
+    'venue': 'location', 'location': 'location', 'place': 'location', 'where': 'location',
+    'date': 'date', 'day': 'date', 'when': 'date',
+    'time': 'time', 'timing': 'time', 'timings': 'time',
+    'event': 'event_name', 'title': 'event_name',
+}
+
+
+def tesseract_ocr(data):
+    """Text of an image via Tesseract: tesserocr in-process when installed, else pytesseract."""
+    from PIL import Image, ImageOps
+    image = ImageOps.autocontrast(ImageOps.grayscale(Image.open(io.BytesIO(data))))
+    try:
+        import tesserocr
+    except ImportError:
+        import pytesseract
+        return pytesseract.image_to_string(image)
+    return tesserocr.image_to_text(image)
+
+
+def _find_date(text):
+    """Return (ISO date, matched text) for the first readable date in `text`."""
+    for match in _DATE.finditer(text):
+        iso = normalize_date(re.sub(r'\bof\s+', '', match.group(0), flags=re.IGNORECASE))
+        if iso:
+            return iso, match.group(0)
+    return None, None
+
+
+def _find_time(text):
+    """Return (start, end, matched text) for the first time or time range in `text`."""
+    for match in _TIME.finditer(text):
+        found = match.group(0)
+        # A bare '12-14' is more likely a date or score than a time range.
+        if not re.search(r'[:.]\d{2}|[ap]\.?\s*m|noon', found, re.IGNORECASE):
+            continue
+        start, end = normalize_time_range(found)
+        if start:
+            return start, end, found
+    return None, None, None
+
+
+def _strip(text, *parts):
+    for part in parts:
+        if part:
+            text = text.replace(part, ' ')
+    return ' '.join(text.split()).strip(_SEPARATORS)
+
+
+def _split_venue(text):
+    """Split 'Debate @ Room 12' or 'Debate, Room 12' into (name, venue or None)."""
+    match = _AT.search(text)
+    if match and match.start() > 0:
+        return text[:match.start()].strip(_SEPARATORS), match.group(1).strip(_SEPARATORS)
+    pieces = [piece.strip() for piece in re.split(r'\s[-–|]\s|,', text) if piece.strip()]
+    if len(pieces) > 1 and VENUE_WORDS.search(pieces[-1]):
+        return ', '.join(pieces[:-1]).strip(_SEPARATORS), pieces[-1].strip(_SEPARATORS)
+    return text, None
+
+
+def _confidence(found, total):
+    if found == total:
+        return 'high'
+    return 'medium' if found == total - 1 else 'low'
+
+
+def parse_poster_text(text):
+    """
+    Read event details out of OCR text with simple rules.
+
+    Labelled lines ('Venue: Main Hall') win; otherwise dates, times and
+    venues are recognised by pattern and the first remaining line is taken
+    as the event name. Two or more lines that each carry a time and a
+    title are read as a schedule, one event per line, taking the date from
+    the nearest date line above.
+
+    Returns:
+        dict: event_name, location, date, time, confidence and
+        additional_info (as the single-event prompt asks for), plus an
+        `events` list (as the multi-event prompt asks for)
+    """
+    lines = [' '.join(line.split()) for line in (text or '').splitlines()]
+    lines = [line for line in lines if line.strip(_SEPARATORS)]
+
+    labelled = {}
+    rows = []
+    venues = []
+    names = []
+    extra = []
+    current_date = None
+    for line in lines:
+        label = _LABEL.match(line)
+        if label and LABEL_FIELDS[label.group(1).lower()] not in labelled:
+            labelled[LABEL_FIELDS[label.group(1).lower()]] = label.group(2).strip()
+            continue
+
+        iso, date_text = _find_date(line)
+        current_date = iso or current_date
+        start, end, time_text = _find_time(_strip(line, date_text))
+        rest = _strip(line, date_text, time_text)
+        if start and re.search(r'[a-z]{3}', rest, re.IGNORECASE):
+            name, venue = _split_venue(rest)
+            rows.append({'event_name': name, 'location': venue, 'date': current_date,
+                         'start_time': start, 'end_time': end})
+        elif iso or start:
+            rows.append({'event_name': None, 'location': _split_venue(rest)[1], 'date': iso,
+                         'start_time': start, 'end_time': end})
+        elif FILLER.search(line):
+            extra.append(line)
+        elif _AT.match(line):
+            venues.append(_AT.match(line).group(1))
+        elif VENUE_WORDS.search(line) and names:
+            venues.append(line)
+        elif re.search(r'[a-z]{3}', line, re.IGNORECASE):
+            names.append(line)
+
+    schedule = [row for row in rows if row['event_name']]
+    shared_venue = labelled.get('location') or (venues[0] if venues else None)
+    if len(schedule) >= 2:
+        events = [dict(row, location=row['location'] or shared_venue) for row in schedule]
+        complete = sum(1 for event in events if event['date'] and event['location'])
+        confidence = 'high' if complete == len(events) else 'medium' if complete else 'low'
+    else:
+        date_iso = normalize_date(labelled['date']) if 'date' in labelled else None
+        start, end = normalize_time_range(labelled['time']) if 'time' in labelled else (None, None)
+        for row in rows:
+            date_iso = date_iso or row['date']
+            if not start and row['start_time']:
+                start, end = row['start_time'], row['end_time']
+            shared_venue = shared_venue or row['location']
+        name = labelled.get('event_name') or (names.pop(0) if names else None) or \
+            (schedule[0]['event_name'] if schedule else None)
+        events = [{'event_name': name, 'location': shared_venue, 'date': date_iso or labelled.get('date'),
+                   'start_time': start, 'end_time': end}]
+        found = sum(1 for value in (name, shared_venue, date_iso, start) if value)
+        confidence = _confidence(found, 4)
+
+    first = events[0]
+    time_text = first['start_time'] and (
+        f"{first['start_time']} - {first['end_time']}" if first['end_time'] else first['start_time'])
+    details = ' '.join(names + extra + venues[1:]) or None
+    return {
+        'event_name': first['event_name'],
+        'location': first['location'],
+        'date': first['date'],
+        'time': time_text or labelled.get('time'),
+        'confidence': confidence,
+        'additional_info': details,
+        'events': [dict(event, description=None) for event in events],
+    }
+
+
+class OCRResponse:
+    def __init__(self, text, ocr_text):
+        self.text = text
+        self.ocr_text = ocr_text
+
+
+class OCRModel:
+    """
+    In-process, CPU-only extractor: OCR followed by rule-based parsing.
+
+    It offers the same generate_content(parts) as genai.GenerativeModel and
+    FakeModel, so it can stand in as EventExtractor's model (local only) or
+    run as its `local` first pass ahead of a remote model. Replies are JSON
+    text in the shape both extraction prompts ask for.
+    """
+
+    name = 'ocr'
+    # OCR reads images only, so EventExtractor does not re-ask it about a reply.
+    follows_prompts = False
+
+    def __init__(self, ocr=tesseract_ocr):
+        """
+        Args:
+            ocr: Callable turning image bytes into text (defaults to Tesseract)
+        """
+        self.ocr = ocr
+        self.calls = 0
+
+    def generate_content(self, parts):
+        images = [part for part in parts if isinstance(part, dict)]
+        if not images:
+            raise ValueError('the local OCR backend can only read images, not follow-up prompts')
+        self.calls += 1
+        text = self.ocr(images[0]['data'])
+        return OCRResponse(json.dumps(parse_poster_text(text)), text)
@@ -0,0 +1,820 @@
+#!/usr/bin/env python3
+import argparse
+import sqlite3
+import sys
+
+# Ordered list of (version, name, statements). Applied migrations are recorded
+# in schema_migrations; never edit one that has shipped, add a new version.
+# Statements are literal SQL, not built from other modules, so a change to
+# those modules cannot change what an applied version meant.
+MIGRATIONS = [
+    (1, 'initial schema', [
+        '''
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            event_date DATE NOT NULL,
+            start_time TIME NOT NULL,
+            end_time TIME NOT NULL,
+            venue TEXT NOT NULL,
+            description TEXT,
+            host_school TEXT NOT NULL,
+            participating_schools TEXT,
+            status TEXT DEFAULT 'upcoming',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS participants (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            unique_id TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL CHECK (type IN ('student')),
+            class_dept TEXT NOT NULL,
+            school TEXT NOT NULL,
+            grade TEXT,
+            contact TEXT,
+            emergency_contact TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS duty_personnel (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            designation TEXT,
+            school TEXT,
+            contact TEXT,
+            email TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT DEFAULT 'user',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS duties (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id INTEGER NOT NULL,
+            duty_person_id INTEGER NOT NULL,
+            duty_type TEXT NOT NULL,
+            duty_date DATE NOT NULL,
+            start_time TIME NOT NULL,
+            end_time TIME NOT NULL,
+            location TEXT NOT NULL,
+            description TEXT,
+            notes TEXT,
+            assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (event_id) REFERENCES events (id) ON DELETE CASCADE,
+            FOREIGN KEY (duty_person_id) REFERENCES duty_personnel (id) ON DELETE CASCADE
+        )
+        ''',
+    ]),
+    (2, 'hot path indexes', [
+        'CREATE INDEX IF NOT EXISTS idx_events_date_start ON events (event_date, start_time)',
+        'CREATE INDEX IF NOT EXISTS idx_events_type ON events (type)',
+        'CREATE INDEX IF NOT EXISTS idx_participants_name ON participants (name)',
+        'CREATE INDEX IF NOT EXISTS idx_participants_school ON participants (school)',
+        'CREATE INDEX IF NOT EXISTS idx_duty_personnel_name ON duty_personnel (name)',
+        'CREATE INDEX IF NOT EXISTS idx_duties_event ON duties (event_id)',
+        'CREATE INDEX IF NOT EXISTS idx_duties_person_date ON duties (duty_person_id, duty_date)',
+        'CREATE INDEX IF NOT EXISTS idx_duties_date ON duties (duty_date)',
+        'ANALYZE',
+    ]),
+    (3, 'full-text search', [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5 (
+            name, type, venue, host_school, description,
+            content='events', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN
+            INSERT INTO events_fts (rowid, name, type, venue, host_school, description)
+            VALUES (new.id, new.name, new.type, new.venue, new.host_school, new.description);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN
+            INSERT INTO events_fts (events_fts, rowid, name, type, venue, host_school, description)
+            VALUES ('delete', old.id, old.name, old.type, old.venue, old.host_school, old.description);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE ON events BEGIN
+            INSERT INTO events_fts (events_fts, rowid, name, type, venue, host_school, description)
+            VALUES ('delete', old.id, old.name, old.type, old.venue, old.host_school, old.description);
+            INSERT INTO events_fts (rowid, name, type, venue, host_school, description)
+            VALUES (new.id, new.name, new.type, new.venue, new.host_school, new.description);
+        END
+        ''',
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS participants_fts USING fts5 (
+            name, class_dept, school, unique_id,
+            content='participants', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS participants_fts_insert AFTER INSERT ON participants BEGIN
+            INSERT INTO participants_fts (rowid, name, class_dept, school, unique_id)
+            VALUES (new.id, new.name, new.class_dept, new.school, new.unique_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS participants_fts_delete AFTER DELETE ON participants BEGIN
+            INSERT INTO participants_fts (participants_fts, rowid, name, class_dept, school, unique_id)
+            VALUES ('delete', old.id, old.name, old.class_dept, old.school, old.unique_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS participants_fts_update AFTER UPDATE ON participants BEGIN
+            INSERT INTO participants_fts (participants_fts, rowid, name, class_dept, school, unique_id)
+            VALUES ('delete', old.id, old.name, old.class_dept, old.school, old.unique_id);
+            INSERT INTO participants_fts (rowid, name, class_dept, school, unique_id)
+            VALUES (new.id, new.name, new.class_dept, new.school, new.unique_id);
+        END
+        ''',
+        "INSERT INTO events_fts (events_fts) VALUES ('rebuild')",
+        "INSERT INTO participants_fts (participants_fts) VALUES ('rebuild')",
+    ]),
+    # stat_counts is kept by triggers per stats.COUNTERS entry and then filled
+    # by the same statements as stats.rebuild_statements(). Plain totals
+    # cannot change on UPDATE, so the update triggers skip them.
+    (4, 'dashboard and report counters', [
+        '''
+        CREATE TABLE IF NOT EXISTS stat_counts (
+            metric TEXT NOT NULL,
+            bucket TEXT NOT NULL DEFAULT '',
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (metric, bucket)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS events_stats_insert AFTER INSERT ON events BEGIN
+            INSERT INTO stat_counts (metric, bucket, count)
+            SELECT 'events', COALESCE('', ''), 1 WHERE 1
+            ON CONFLICT (metric, bucket) DO UPDATE SET count = count + 1;
+            INSERT INTO stat_counts (metric, bucket, count)
+            SELECT 'event_type', COALESCE(new.type, ''), 1 WHERE 1
+            ON CONFLICT (metric, bucket) DO UPDATE SET count = count + 1;
+            INSERT INTO stat_counts (metric, bucket, count)
+            SELECT 'event_month', COALESCE(strftime('%Y-%m', new.event_date), ''), 1 WHERE 1
+            ON CONFLICT (metric, bucket) DO UPDATE SET count = count + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS events_stats_delete AFTER DELETE ON events BEGIN
+            UPDATE stat_counts SET count = count - 1
+            WHERE metric = 'events' AND bucket = COALESCE('', '');
+            UPDATE stat_counts SET count = count - 1
+            WHERE metric = 'event_type' AND bucket = COALESCE(old.type, '');
+            UPDATE stat_counts SET count = count - 1
+            WHERE metric = 'event_month' AND bucket = COALESCE(strftime('%Y-%m', old.event_date), '');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS events_stats_update AFTER UPDATE ON events BEGIN
+            UPDATE stat_counts SET count = count - 1
+            WHERE metric = 'event_type' AND bucket = COALESCE(old.type, '');
+            UPDATE stat_counts SET count = count - 1
+            WHERE metric = 'event_month' AND bucket = COALESCE(strftime('%Y-%m', old.event_date), '');
+            INSERT INTO stat_counts (metric, bucket, count)
+            SELECT 'event_type', COALESCE(new.type, ''), 1 WHERE 1
+            ON CONFLICT (metric, bucket) DO UPDATE SET count = count + 1;
+            INSERT INTO stat_counts (metric, bucket, count)
+            SELECT 'event_month', COALESCE(strftime('%Y-%m', new.event_date), ''), 1 WHERE 1
+            ON CONFLICT (metric, bucket) DO UPDATE SET count = count + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS participants_stats_insert AFTER INSERT ON participants BEGIN
+            INSERT INTO stat_counts (metric, bucket, count)
+            SELECT 'participants', COALESCE('', ''), 1 WHERE 1
+            ON CONFLICT (metric, bucket) DO UPDATE SET count = count + 1;
+            INSERT INTO stat_counts (metric, bucket, count)
+            SELECT 'students', COALESCE('', ''), 1 WHERE new.type = 'student'
+            ON CONFLICT (metric, bucket) DO UPDATE SET count = count + 1;
+            INSERT INTO stat_counts (metric, bucket, count)
+            SELECT 'participant_school', COALESCE(new.school, ''), 1 WHERE 1
+            ON CONFLICT (metric, bucket) DO UPDATE SET count = count + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS participants_stats_delete AFTER DELETE ON participants BEGIN
+            UPDATE stat_counts SET count = count - 1
+            WHERE metric = 'participants' AND bucket = COALESCE('', '');
+            UPDATE stat_counts SET count = count - 1
+            WHERE metric = 'students' AND bucket = COALESCE('', '') AND old.type = 'student';
+            UPDATE stat_counts SET count = count - 1
+            WHERE metric = 'participant_school' AND bucket = COALESCE(old.school, '');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS participants_stats_update AFTER UPDATE ON participants BEGIN
+            UPDATE stat_counts SET count = count - 1
+            WHERE metric = 'students' AND bucket = COALESCE('', '') AND old.type = 'student';
+            UPDATE stat_counts SET count = count - 1
+            WHERE metric = 'participant_school' AND bucket = COALESCE(old.school, '');
+            INSERT INTO stat_counts (metric, bucket, count)
+            SELECT 'students', COALESCE('', ''), 1 WHERE new.type = 'student'
+            ON CONFLICT (metric, bucket) DO UPDATE SET count = count + 1;
+            INSERT INTO stat_counts (metric, bucket, count)
+            SELECT 'participant_school', COALESCE(new.school, ''), 1 WHERE 1
+            ON CONFLICT (metric, bucket) DO UPDATE SET count = count + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS duty_personnel_stats_insert AFTER INSERT ON duty_personnel BEGIN
+            INSERT INTO stat_counts (metric, bucket, count)
+            SELECT 'duty_personnel', COALESCE('', ''), 1 WHERE 1
+            ON CONFLICT (metric, bucket) DO UPDATE SET count = count + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS duty_personnel_stats_delete AFTER DELETE ON duty_personnel BEGIN
+            UPDATE stat_counts SET count = count - 1
+            WHERE metric = 'duty_personnel' AND bucket = COALESCE('', '');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS duties_stats_insert AFTER INSERT ON duties BEGIN
+            INSERT INTO stat_counts (metric, bucket, count)
+            SELECT 'duties', COALESCE('', ''), 1 WHERE 1
+            ON CONFLICT (metric, bucket) DO UPDATE SET count = count + 1;
+            INSERT INTO stat_counts (metric, bucket, count)
+            SELECT 'duty_type', COALESCE(new.duty_type, ''), 1 WHERE 1
+            ON CONFLICT (metric, bucket) DO UPDATE SET count = count + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS duties_stats_delete AFTER DELETE ON duties BEGIN
+            UPDATE stat_counts SET count = count - 1
+            WHERE metric = 'duties' AND bucket = COALESCE('', '');
+            UPDATE stat_counts SET count = count - 1
+            WHERE metric = 'duty_type' AND bucket = COALESCE(old.duty_type, '');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS duties_stats_update AFTER UPDATE ON duties BEGIN
+            UPDATE stat_counts SET count = count - 1
+            WHERE metric = 'duty_type' AND bucket = COALESCE(old.duty_type, '');
+            INSERT INTO stat_counts (metric, bucket, count)
+            SELECT 'duty_type', COALESCE(new.duty_type, ''), 1 WHERE 1
+            ON CONFLICT (metric, bucket) DO UPDATE SET count = count + 1;
+        END
+        ''',
+        'DELETE FROM stat_counts',
+        '''
+        INSERT INTO stat_counts (metric, bucket, count)
+        SELECT 'events', COALESCE('', ''), COUNT(*) FROM events
+        GROUP BY COALESCE('', '')
+        ''',
+        '''
+        INSERT INTO stat_counts (metric, bucket, count)
+        SELECT 'event_type', COALESCE(events.type, ''), COUNT(*) FROM events
+        GROUP BY COALESCE(events.type, '')
+        ''',
+        '''
+        INSERT INTO stat_counts (metric, bucket, count)
+        SELECT 'event_month', COALESCE(strftime('%Y-%m', events.event_date), ''), COUNT(*) FROM events
+        GROUP BY COALESCE(strftime('%Y-%m', events.event_date), '')
+        ''',
+        '''
+        INSERT INTO stat_counts (metric, bucket, count)
+        SELECT 'participants', COALESCE('', ''), COUNT(*) FROM participants
+        GROUP BY COALESCE('', '')
+        ''',
+        '''
+        INSERT INTO stat_counts (metric, bucket, count)
+        SELECT 'students', COALESCE('', ''), COUNT(*) FROM participants WHERE participants.type = 'student'
+        GROUP BY COALESCE('', '')
+        ''',
+        '''
+        INSERT INTO stat_counts (metric, bucket, count)
+        SELECT 'participant_school', COALESCE(participants.school, ''), COUNT(*) FROM participants
+        GROUP BY COALESCE(participants.school, '')
+        ''',
+        '''
+        INSERT INTO stat_counts (metric, bucket, count)
+        SELECT 'duty_personnel', COALESCE('', ''), COUNT(*) FROM duty_personnel
+        GROUP BY COALESCE('', '')
+        ''',
+        '''
+        INSERT INTO stat_counts (metric, bucket, count)
+        SELECT 'duties', COALESCE('', ''), COUNT(*) FROM duties
+        GROUP BY COALESCE('', '')
+        ''',
+        '''
+        INSERT INTO stat_counts (metric, bucket, count)
+        SELECT 'duty_type', COALESCE(duties.duty_type, ''), COUNT(*) FROM duties
+        GROUP BY COALESCE(duties.duty_type, '')
+        ''',
+    ]),
+    # Triggers bump the data_versions scopes each write affects (listed in
+    # cache.py); cached pages name the scopes they depend on.
+    (5, 'cache data versions', [
+        '''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS events_version_insert AFTER INSERT ON events BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('events', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('events:' || strftime('%Y-%m', new.event_date), 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS events_version_delete AFTER DELETE ON events BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('events', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('events:' || strftime('%Y-%m', old.event_date), 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS events_version_update AFTER UPDATE ON events BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('events', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('events:' || strftime('%Y-%m', old.event_date), 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('events', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('events:' || strftime('%Y-%m', new.event_date), 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS participants_version_insert AFTER INSERT ON participants BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('participants', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS participants_version_delete AFTER DELETE ON participants BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('participants', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS participants_version_update AFTER UPDATE ON participants BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('participants', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('participants', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS duty_personnel_version_insert AFTER INSERT ON duty_personnel BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('duty_personnel', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS duty_personnel_version_delete AFTER DELETE ON duty_personnel BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('duty_personnel', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS duty_personnel_version_update AFTER UPDATE ON duty_personnel BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('duty_personnel', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('duty_personnel', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS duties_version_insert AFTER INSERT ON duties BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('duties', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS duties_version_delete AFTER DELETE ON duties BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('duties', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS duties_version_update AFTER UPDATE ON duties BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('duties', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('duties', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+    ]),
+    (6, 'scan jobs', [
+        '''
+        CREATE TABLE IF NOT EXISTS scan_jobs (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'done', 'failed')),
+            filename TEXT,
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_scan_jobs_created ON scan_jobs(created_at)',
+    ]),
+    (7, 'scan preprocessing stats', [
+        'ALTER TABLE scan_jobs ADD COLUMN input_bytes INTEGER',
+        'ALTER TABLE scan_jobs ADD COLUMN upload_bytes INTEGER',
+        'ALTER TABLE scan_jobs ADD COLUMN preprocess_ms REAL',
+    ]),
+    # Both series tables bump one 'event_series' scope: any change can move
+    # occurrences in any month.
+    (8, 'recurring event series', [
+        '''
+        CREATE TABLE IF NOT EXISTS event_series (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            start_date DATE NOT NULL,
+            until_date DATE,
+            frequency TEXT NOT NULL CHECK (frequency IN ('daily', 'weekly', 'monthly')),
+            interval INTEGER NOT NULL DEFAULT 1 CHECK (interval >= 1),
+            weekdays TEXT NOT NULL DEFAULT '',
+            start_time TIME NOT NULL,
+            end_time TIME NOT NULL,
+            venue TEXT NOT NULL,
+            description TEXT,
+            host_school TEXT NOT NULL,
+            participating_schools TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_event_series_dates ON event_series (start_date, until_date)',
+        '''
+        CREATE TABLE IF NOT EXISTS event_series_exceptions (
+            series_id INTEGER NOT NULL REFERENCES event_series (id),
+            occurrence_date DATE NOT NULL,
+            cancelled INTEGER NOT NULL DEFAULT 0,
+            name TEXT,
+            event_date DATE,
+            start_time TIME,
+            end_time TIME,
+            venue TEXT,
+            description TEXT,
+            PRIMARY KEY (series_id, occurrence_date)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_series_exceptions_occurrence ON event_series_exceptions (occurrence_date)',
+        'CREATE INDEX IF NOT EXISTS idx_series_exceptions_moved ON event_series_exceptions (event_date)',
+        '''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS event_series_version_insert AFTER INSERT ON event_series BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('event_series', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS event_series_version_delete AFTER DELETE ON event_series BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('event_series', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS event_series_version_update AFTER UPDATE ON event_series BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('event_series', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('event_series', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS event_series_exceptions_version_insert AFTER INSERT ON event_series_exceptions BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('event_series', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS event_series_exceptions_version_delete AFTER DELETE ON event_series_exceptions BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('event_series', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS event_series_exceptions_version_update AFTER UPDATE ON event_series_exceptions BEGIN
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('event_series', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+            INSERT INTO data_versions (scope, version, updated_at) VALUES ('event_series', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
+        END
+        ''',
+    ]),
+    # One feed_log row per feed entity with its latest change; an exception
+    # is a change to its series. seq is a global change counter; sequence
+    # counts the changes to one row and becomes the iCalendar SEQUENCE of
+    # its VEVENT.
+    (9, 'calendar feed change log', [
+        '''
+        CREATE TABLE IF NOT EXISTS feed_log (
+            source TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            sequence INTEGER NOT NULL DEFAULT 0,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (source, row_id)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_feed_log_seq ON feed_log (seq)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS events_feed_insert AFTER INSERT ON events BEGIN
+            INSERT INTO feed_log (source, row_id, seq, sequence, changed_at)
+            VALUES ('events', new.id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM feed_log), 0, CURRENT_TIMESTAMP)
+            ON CONFLICT (source, row_id) DO UPDATE SET seq = excluded.seq, sequence = sequence + 1,
+                                                       changed_at = excluded.changed_at;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS events_feed_delete AFTER DELETE ON events BEGIN
+            INSERT INTO feed_log (source, row_id, seq, sequence, changed_at)
+            VALUES ('events', old.id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM feed_log), 0, CURRENT_TIMESTAMP)
+            ON CONFLICT (source, row_id) DO UPDATE SET seq = excluded.seq, sequence = sequence + 1,
+                                                       changed_at = excluded.changed_at;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS events_feed_update AFTER UPDATE ON events BEGIN
+            INSERT INTO feed_log (source, row_id, seq, sequence, changed_at)
+            VALUES ('events', new.id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM feed_log), 0, CURRENT_TIMESTAMP)
+            ON CONFLICT (source, row_id) DO UPDATE SET seq = excluded.seq, sequence = sequence + 1,
+                                                       changed_at = excluded.changed_at;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS duties_feed_insert AFTER INSERT ON duties BEGIN
+            INSERT INTO feed_log (source, row_id, seq, sequence, changed_at)
+            VALUES ('duties', new.id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM feed_log), 0, CURRENT_TIMESTAMP)
+            ON CONFLICT (source, row_id) DO UPDATE SET seq = excluded.seq, sequence = sequence + 1,
+                                                       changed_at = excluded.changed_at;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS duties_feed_delete AFTER DELETE ON duties BEGIN
+            INSERT INTO feed_log (source, row_id, seq, sequence, changed_at)
+            VALUES ('duties', old.id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM feed_log), 0, CURRENT_TIMESTAMP)
+            ON CONFLICT (source, row_id) DO UPDATE SET seq = excluded.seq, sequence = sequence + 1,
+                                                       changed_at = excluded.changed_at;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS duties_feed_update AFTER UPDATE ON duties BEGIN
+            INSERT INTO feed_log (source, row_id, seq, sequence, changed_at)
+            VALUES ('duties', new.id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM feed_log), 0, CURRENT_TIMESTAMP)
+            ON CONFLICT (source, row_id) DO UPDATE SET seq = excluded.seq, sequence = sequence + 1,
+                                                       changed_at = excluded.changed_at;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS event_series_feed_insert AFTER INSERT ON event_series BEGIN
+            INSERT INTO feed_log (source, row_id, seq, sequence, changed_at)
+            VALUES ('event_series', new.id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM feed_log), 0, CURRENT_TIMESTAMP)
+            ON CONFLICT (source, row_id) DO UPDATE SET seq = excluded.seq, sequence = sequence + 1,
+                                                       changed_at = excluded.changed_at;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS event_series_feed_delete AFTER DELETE ON event_series BEGIN
+            INSERT INTO feed_log (source, row_id, seq, sequence, changed_at)
+            VALUES ('event_series', old.id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM feed_log), 0, CURRENT_TIMESTAMP)
+            ON CONFLICT (source, row_id) DO UPDATE SET seq = excluded.seq, sequence = sequence + 1,
+                                                       changed_at = excluded.changed_at;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS event_series_feed_update AFTER UPDATE ON event_series BEGIN
+            INSERT INTO feed_log (source, row_id, seq, sequence, changed_at)
+            VALUES ('event_series', new.id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM feed_log), 0, CURRENT_TIMESTAMP)
+            ON CONFLICT (source, row_id) DO UPDATE SET seq = excluded.seq, sequence = sequence + 1,
+                                                       changed_at = excluded.changed_at;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS event_series_exceptions_feed_insert AFTER INSERT ON event_series_exceptions BEGIN
+            INSERT INTO feed_log (source, row_id, seq, sequence, changed_at)
+            VALUES ('event_series', new.series_id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM feed_log), 0, CURRENT_TIMESTAMP)
+            ON CONFLICT (source, row_id) DO UPDATE SET seq = excluded.seq, sequence = sequence + 1,
+                                                       changed_at = excluded.changed_at;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS event_series_exceptions_feed_delete AFTER DELETE ON event_series_exceptions BEGIN
+            INSERT INTO feed_log (source, row_id, seq, sequence, changed_at)
+            VALUES ('event_series', old.series_id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM feed_log), 0, CURRENT_TIMESTAMP)
+            ON CONFLICT (source, row_id) DO UPDATE SET seq = excluded.seq, sequence = sequence + 1,
+                                                       changed_at = excluded.changed_at;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS event_series_exceptions_feed_update AFTER UPDATE ON event_series_exceptions BEGIN
+            INSERT INTO feed_log (source, row_id, seq, sequence, changed_at)
+            VALUES ('event_series', new.series_id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM feed_log), 0, CURRENT_TIMESTAMP)
+            ON CONFLICT (source, row_id) DO UPDATE SET seq = excluded.seq, sequence = sequence + 1,
+                                                       changed_at = excluded.changed_at;
+        END
+        ''',
+    ]),
+]
+
+# Queries on the request hot path and the index each one must use. These
+# mirror the SQL in app.py; update both together.
+HOT_QUERIES = {
+    'calendar month': (
+        'SELECT * FROM events WHERE event_date >= ? AND event_date <= ? ORDER BY event_date, start_time',
+        ('2025-01-01', '2025-01-31'),
+        'idx_events_date_start',
+    ),
+    'calendar range': (
+        'SELECT event_date, COUNT(*) FROM events WHERE event_date >= ? AND event_date <= ? GROUP BY event_date',
+        ('2025-01-01', '2025-12-31'),
+        'idx_events_date_start',
+    ),
+    'series in window': (
+        'SELECT * FROM event_series WHERE start_date <= ? AND (until_date IS NULL OR until_date >= ?)',
+        ('2025-01-31', '2025-01-01'),
+        'idx_event_series_dates',
+    ),
+    'day events': (
+        'SELECT * FROM events WHERE event_date = ? ORDER BY start_time',
+        ('2025-01-01',),
+        'idx_events_date_start',
+    ),
+    'upcoming events': (
+        "SELECT * FROM events WHERE event_date >= DATE('now') ORDER BY event_date ASC LIMIT 5",
+        (),
+        'idx_events_date_start',
+    ),
+    'events api page': (
+        'SELECT * FROM events e WHERE (e.event_date, e.start_time, e.id) > (?, ?, ?) '
+        'ORDER BY e.event_date, e.start_time, e.id LIMIT ?',
+        ('2025-01-01', '09:00', 1, 101),
+        'idx_events_date_start',
+    ),
+    'feed changes': (
+        'SELECT source, row_id FROM feed_log WHERE seq > ? ORDER BY seq LIMIT ?',
+        (0, 501),
+        'idx_feed_log_seq',
+    ),
+    'person feed duties': (
+        'SELECT * FROM duties WHERE duty_person_id = ? AND duty_date >= ?',
+        (1, '2025-01-01'),
+        'idx_duties_person_date',
+    ),
+    'duty person by name': (
+        'SELECT id FROM duty_personnel WHERE name = ?',
+        ('Someone',),
+        'idx_duty_personnel_name',
+    ),
+    'duties for event': (
+        'SELECT * FROM duties WHERE event_id = ?',
+        (1,),
+        'idx_duties_event',
+    ),
+    'duties for person on date': (
+        'SELECT * FROM duties WHERE duty_person_id = ? AND duty_date = ?',
+        (1, '2025-01-01'),
+        'idx_duties_person_date',
+    ),
+}
+
+
+def connect(database):
+    conn = sqlite3.connect(database, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _ensure_migrations_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def current_version(conn):
+    _ensure_migrations_table(conn)
+    row = conn.execute('SELECT MAX(version) AS version FROM schema_migrations').fetchone()
+    return row['version'] or 0
+
+
+def migrate(database, target=None, migrations=MIGRATIONS):
+    """
+    Apply every pending migration up to `target` (default: latest).
+
+    Each migration runs in its own BEGIN IMMEDIATE transaction and re-reads
+    the current version once it holds the write lock, so several gunicorn
+    workers starting at once apply each migration exactly once.
+
+    Returns:
+        list: Versions applied by this call
+    """
+    conn = connect(database)
+    applied = []
+    try:
+        for version, name, statements in migrations:
+            if target is not None and version > target:
+                break
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if version <= current_version(conn):
+                    conn.execute('ROLLBACK')
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)', (version, name))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            applied.append(version)
+    finally:
+        conn.close()
+    return applied
+
+
+def explain(conn, sql, params=()):
+    return [row['detail'] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+
+def check_query_plans(conn, queries=None):
+    """
+    Run EXPLAIN QUERY PLAN for each hot query.
+
+    Returns:
+        list: (query name, expected index, plan lines) for every query whose
+        plan does not use its expected index
+    """
+    failures = []
+    for name, (sql, params, index) in (queries or HOT_QUERIES).items():
+        plan = explain(conn, sql, params)
+        if not any(f'INDEX {index}' in line for line in plan):
+            failures.append((name, index, plan))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the EvenZa database schema')
+    parser.add_argument('command', choices=['upgrade', 'status', 'check'], nargs='?', default='upgrade')
+    parser.add_argument('--database', '-d', default='events.db', help='Path to the SQLite database')
+    parser.add_argument('--target', type=int, help='Stop after this migration version (upgrade only)')
+    args = parser.parse_args()
+
+    if args.command == 'upgrade':
+        applied = migrate(args.database, target=args.target)
+        if applied:
+            print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+        else:
+            print('Database is up to date')
+        return 0
+
+    conn = connect(args.database)
+    try:
+        if args.command == 'status':
+            version = current_version(conn)
+            for migration_version, name, _ in MIGRATIONS:
+                state = 'applied' if migration_version <= version else 'pending'
+                print(f'{migration_version:>4}  {state:<8} {name}')
+            return 0
+
+        failures = check_query_plans(conn)
+        for name, index, plan in failures:
+            print(f'✗ {name}: expected {index}')
+            for line in plan:
+                print(f'    {line}')
+        if failures:
+            return 1
+        print(f'✓ All {len(HOT_QUERIES)} hot queries use their indexes')
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import base64
+import json
+
+from flask import Response, jsonify, request, url_for
+
+import db
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+# Rows pulled from the cursor per fetchmany() while streaming.
+FETCH_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor('Invalid cursor')
+    return values
+
+
+class KeysetQuery:
+    """
+    A listing ordered by a unique key so it can be paged with WHERE key > cursor.
+
+    Args:
+        select (str): SELECT ... FROM ... [JOIN ...] without WHERE or ORDER BY
+        key_columns (list): SQL expressions of the sort key, most significant first
+        key_fields (list): Names of those columns in the result rows
+    """
+
+    def __init__(self, select, key_columns, key_fields):
+        self.select = select
+        self.key_columns = key_columns
+        self.key_fields = key_fields
+
+    def sql(self, after=None, limit=None):
+        query = self.select
+        params = []
+        if after is not None:
+            columns = ', '.join(self.key_columns)
+            placeholders = ', '.join('?' for _ in self.key_columns)
+            query += f' WHERE ({columns}) > ({placeholders})'
+            params.extend(after)
+        query += ' ORDER BY ' + ', '.join(self.key_columns)
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        return query, params
+
+    def cursor_for(self, row):
+        return encode_cursor([row[field] for field in self.key_fields])
+
+    def decode(self, token):
+        return decode_cursor(token, len(self.key_columns))
+
+
+def fetch_page(conn, query, after=None, limit=DEFAULT_LIMIT):
+    """
+    Fetch one page of a keyset listing.
+
+    Returns:
+        tuple: (list of row dicts, cursor for the next page or None)
+    """
+    sql, params = query.sql(after, limit + 1)
+    rows = conn.execute(sql, params).fetchmany(limit + 1)
+    next_cursor = query.cursor_for(rows[limit - 1]) if len(rows) > limit else None
+    return [dict(row) for row in rows[:limit]], next_cursor
+
+
+def iter_rows(pool, query, after=None):
+    """Yield every row of a listing as a dict, holding at most FETCH_SIZE rows."""
+    sql, params = query.sql(after)
+    for row in db.iter_query(pool, sql, params, FETCH_SIZE):
+        yield dict(row)
+
+
+def _dumps(row):
+    return json.dumps(row, ensure_ascii=False, default=str)
+
+
+def _ndjson(rows):
+    for row in rows:
+        yield _dumps(row) + '\n'
+
+
+def _json_array(rows):
+    yield '['
+    first = True
+    for row in rows:
+        yield _dumps(row) if first else ',' + _dumps(row)
+        first = False
+    yield ']'
+
+
+def list_response(query):
+    """
+    Serve a listing according to the request's query string.
+
+    - ?format=ndjson streams every row (after ?after=, if given) one JSON
+      object per line.
+    - ?limit= and/or ?after= return one page as {"data": [...], "next": cursor}
+      with a Link: rel="next" header.
+    - With none of these the whole listing is streamed as a JSON array, which
+      is the original response shape.
+    """
+    token = request.args.get('after')
+    limit = request.args.get('limit', type=int)
+    try:
+        after = query.decode(token) if token else None
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+
+    pool = db.get_pool()
+    if request.args.get('format') == 'ndjson':
+        return Response(_ndjson(iter_rows(pool, query, after)), mimetype='application/x-ndjson')
+
+    if token is None and limit is None:
+        return Response(_json_array(iter_rows(pool, query)), mimetype='application/json')
+
+    limit = max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+    rows, next_cursor = fetch_page(db.get_db(), query, after, limit)
+    response = jsonify({'data': rows, 'next': next_cursor})
+    if next_cursor:
+        next_url = url_for(request.endpoint, **dict(request.view_args or {}), limit=limit, after=next_cursor)
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
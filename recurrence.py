@@ -0,0 +1,267 @@
+import calendar
+import itertools
+from datetime import date, timedelta
+
+from bulk_import import RowError, optional, parse_date, parse_time, validate_event
+
+FREQUENCIES = ('daily', 'weekly', 'monthly')
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+MAX_INTERVAL = 52
+MAX_COUNT = 1000
+# Fields an exception may change for its one occurrence.
+OVERRIDE_FIELDS = ('name', 'event_date', 'start_time', 'end_time', 'venue', 'description')
+
+# event_series and event_series_exceptions are created by migration 8.
+SERIES_IN_WINDOW_SQL = '''
+    SELECT * FROM event_series
+    WHERE start_date <= ? AND (until_date IS NULL OR until_date >= ?)
+'''
+
+EXCEPTIONS_IN_WINDOW_SQL = '''
+    SELECT * FROM event_series_exceptions
+    WHERE occurrence_date BETWEEN ? AND ? OR event_date BETWEEN ? AND ?
+'''
+
+
+def occurrence_dates(series, start, end):
+    """
+    Dates on which `series` occurs between start and end (inclusive).
+
+    The first occurrence in the window is computed directly from the
+    series start, so the cost depends on the window, not on how many
+    times the series has already repeated. Monthly series skip months
+    without their day (a series on the 31st skips April).
+    """
+    first = date.fromisoformat(series['start_date'])
+    last = end
+    if series['until_date']:
+        last = min(last, date.fromisoformat(series['until_date']))
+    start = max(start, first)
+    interval = series['interval']
+    if start > last:
+        return
+
+    if series['frequency'] == 'daily':
+        skip = (start - first).days
+        day = first + timedelta(days=skip + -skip % interval)
+        while day <= last:
+            yield day
+            day += timedelta(days=interval)
+
+    elif series['frequency'] == 'weekly':
+        weekdays = [int(day) for day in series['weekdays'].split(',')] if series['weekdays'] else [first.weekday()]
+        first_monday = first - timedelta(days=first.weekday())
+        week = (start - first_monday).days // 7
+        week += -week % interval
+        monday = first_monday + timedelta(weeks=week)
+        while monday <= last:
+            for weekday in weekdays:
+                day = monday + timedelta(days=weekday)
+                if start <= day <= last:
+                    yield day
+            monday += timedelta(weeks=interval)
+
+    else:
+        months = (start.year - first.year) * 12 + start.month - first.month
+        months += -months % interval
+        while True:
+            year, month = divmod(first.month - 1 + months, 12)
+            year, month = first.year + year, month + 1
+            if date(year, month, 1) > last:
+                break
+            if first.day <= calendar.monthrange(year, month)[1]:
+                day = date(year, month, first.day)
+                if start <= day <= last:
+                    yield day
+            months += interval
+
+
+def describe(series):
+    """'Every 2 weeks on Mon, Thu until 2026-12-18' for a series row."""
+    unit = {'daily': 'day', 'weekly': 'week', 'monthly': 'month'}[series['frequency']]
+    text = f'Every {unit}' if series['interval'] == 1 else f"Every {series['interval']} {unit}s"
+    if series['weekdays']:
+        text += ' on ' + ', '.join(WEEKDAYS[int(day)].title() for day in series['weekdays'].split(','))
+    elif series['frequency'] == 'monthly':
+        text += f" on day {date.fromisoformat(series['start_date']).day}"
+    return text + (f" until {series['until_date']}" if series['until_date'] else '')
+
+
+def is_occurrence(series, day):
+    return next(occurrence_dates(series, day, day), None) == day
+
+
+def validate_series(record):
+    """
+    A series from form or JSON fields: the event fields (event_date is the
+    first occurrence) plus frequency, interval, weekdays ('mon,wed') and
+    either until (last date) or count (number of occurrences); with
+    neither the series never ends.
+    """
+    record = {key: '' if value is None else str(value) for key, value in record.items()}
+    row = validate_event(record)
+    row['start_date'] = row.pop('event_date')
+    row['frequency'] = optional(record, 'frequency') or 'weekly'
+    if row['frequency'] not in FREQUENCIES:
+        raise RowError(f"frequency must be one of {', '.join(FREQUENCIES)}")
+    try:
+        row['interval'] = int(optional(record, 'interval') or 1)
+    except ValueError:
+        raise RowError('interval must be an integer')
+    if not 1 <= row['interval'] <= MAX_INTERVAL:
+        raise RowError(f'interval must be between 1 and {MAX_INTERVAL}')
+
+    names = [name.strip().lower()[:3] for name in optional(record, 'weekdays').split(',') if name.strip()]
+    if names and row['frequency'] != 'weekly':
+        raise RowError('weekdays only apply to weekly series')
+    unknown = [name for name in names if name not in WEEKDAYS]
+    if unknown:
+        raise RowError(f"weekdays must be among {', '.join(WEEKDAYS)}, got {', '.join(unknown)}")
+    row['weekdays'] = ','.join(str(index) for index in sorted({WEEKDAYS.index(name) for name in names}))
+
+    row['until_date'] = None
+    if optional(record, 'until') and optional(record, 'count'):
+        raise RowError('give either until or count, not both')
+    if optional(record, 'until'):
+        row['until_date'] = parse_date(record, 'until')
+        if row['until_date'] < row['start_date']:
+            raise RowError('until must not be before event_date')
+    elif optional(record, 'count'):
+        try:
+            count = int(record['count'])
+        except ValueError:
+            raise RowError('count must be an integer')
+        if not 1 <= count <= MAX_COUNT:
+            raise RowError(f'count must be between 1 and {MAX_COUNT}')
+        # Stored as the date of the last occurrence, so windows never need to count.
+        dates = list(itertools.islice(occurrence_dates(row, date.fromisoformat(row['start_date']), date.max), count))
+        row['until_date'] = dates[-1].isoformat()
+    if not is_occurrence(row, date.fromisoformat(row['start_date'])):
+        raise RowError('event_date must fall on one of the weekdays')
+    return row
+
+
+def insert_series(conn, row):
+    return conn.execute('''
+        INSERT INTO event_series (name, type, start_date, until_date, frequency, interval, weekdays,
+                                  start_time, end_time, venue, description, host_school, participating_schools)
+        VALUES (:name, :type, :start_date, :until_date, :frequency, :interval, :weekdays,
+                :start_time, :end_time, :venue, :description, :host_school, :participating_schools)
+    ''', row).lastrowid
+
+
+def delete_series(conn, series_id):
+    conn.execute('DELETE FROM event_series_exceptions WHERE series_id = ?', (series_id,))
+    return conn.execute('DELETE FROM event_series WHERE id = ?', (series_id,)).rowcount
+
+
+def set_exception(conn, series_id, record):
+    """
+    Cancel or change one occurrence: {"occurrence_date", "cancelled": true}
+    or {"occurrence_date", <any of OVERRIDE_FIELDS>}. Replaces an earlier
+    exception for the same occurrence.
+
+    Returns:
+        dict: The exception as stored
+
+    Raises:
+        RowError: The series does not exist, the date is not one of its
+            occurrences, or an override is invalid
+    """
+    series = conn.execute('SELECT * FROM event_series WHERE id = ?', (series_id,)).fetchone()
+    if series is None:
+        raise RowError(f'series {series_id} does not exist')
+    record = {key: '' if value is None else str(value) for key, value in record.items()}
+    occurrence = parse_date(record, 'occurrence_date')
+    if not is_occurrence(series, date.fromisoformat(occurrence)):
+        raise RowError(f'{occurrence} is not an occurrence of series {series_id}')
+    cancelled = record.get('cancelled', '').lower() in ('1', 'true', 'yes', 'on')
+    overrides = {field: optional(record, field) or None for field in OVERRIDE_FIELDS}
+    if overrides['event_date']:
+        overrides['event_date'] = parse_date(record, 'event_date')
+    for field in ('start_time', 'end_time'):
+        if overrides[field]:
+            overrides[field] = parse_time(record, field)
+    if not cancelled and not any(overrides.values()):
+        raise RowError('an exception must cancel the occurrence or change one of ' + ', '.join(OVERRIDE_FIELDS))
+    exception = dict(overrides, series_id=series_id, occurrence_date=occurrence, cancelled=int(cancelled))
+    conn.execute('''
+        INSERT OR REPLACE INTO event_series_exceptions
+            (series_id, occurrence_date, cancelled, name, event_date, start_time, end_time, venue, description)
+        VALUES (:series_id, :occurrence_date, :cancelled, :name, :event_date, :start_time, :end_time,
+                :venue, :description)
+    ''', exception)
+    return exception
+
+
+def _occurrence(series, day, exception=None):
+    event = {
+        'id': None,
+        'series_id': series['id'],
+        'occurrence_date': day.isoformat(),
+        'recurrence': series['frequency'],
+        'name': series['name'],
+        'type': series['type'],
+        'event_date': day.isoformat(),
+        'start_time': series['start_time'],
+        'end_time': series['end_time'],
+        'venue': series['venue'],
+        'description': series['description'],
+        'host_school': series['host_school'],
+        'participating_schools': series['participating_schools'],
+        'status': 'upcoming',
+        'created_at': series['created_at'],
+    }
+    if exception is not None:
+        event.update({field: exception[field] for field in OVERRIDE_FIELDS if exception[field]})
+    return event
+
+
+def expand(conn, start, end, series_id=None):
+    """
+    Occurrences of every series (or just `series_id`) dated start-end,
+    with exceptions applied: cancelled ones are left out and moved ones
+    appear on their new date. Only the window is generated.
+
+    Args:
+        start, end (date): Inclusive window
+
+    Returns:
+        list: Event-shaped dicts (id None; series_id, occurrence_date and
+        recurrence set) in date and start time order
+    """
+    window = (start.isoformat(), end.isoformat())
+    sql, params = SERIES_IN_WINDOW_SQL, [window[1], window[0]]
+    if series_id is not None:
+        sql, params = sql + ' AND id = ?', params + [series_id]
+    series = {row['id']: row for row in conn.execute(sql, params)}
+
+    exceptions = {}
+    for row in conn.execute(EXCEPTIONS_IN_WINDOW_SQL, window + window):
+        if series_id is None or row['series_id'] == series_id:
+            exceptions[(row['series_id'], row['occurrence_date'])] = row
+    # An occurrence moved into the window may belong to a series outside it.
+    missing = sorted({key[0] for key in exceptions} - set(series))
+    if missing:
+        placeholders = ', '.join('?' for _ in missing)
+        series.update({row['id']: row for row in conn.execute(
+            f'SELECT * FROM event_series WHERE id IN ({placeholders})', missing)})
+
+    events = []
+    for row in series.values():
+        for day in occurrence_dates(row, start, end):
+            exception = exceptions.pop((row['id'], day.isoformat()), None)
+            if exception is None:
+                events.append(_occurrence(row, day))
+            elif not exception['cancelled'] and window[0] <= (exception['event_date'] or day.isoformat()) <= window[1]:
+                events.append(_occurrence(row, day, exception))
+    # Occurrences from outside the window moved into it.
+    for (key_series, occurrence), exception in exceptions.items():
+        row = series.get(key_series)
+        if row is None or exception['cancelled'] or not exception['event_date']:
+            continue
+        day = date.fromisoformat(occurrence)
+        if window[0] <= exception['event_date'] <= window[1] and is_occurrence(row, day):
+            events.append(_occurrence(row, day, exception))
+    events.sort(key=lambda event: (event['event_date'], event['start_time'], event['series_id']))
+    return events
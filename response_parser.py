@@ -0,0 +1,226 @@
+import json
+import re
+
+
+class ResponseParseError(ValueError):
+    pass
+
+
+# Field specs: name -> allowed Python types after json.loads. Missing fields
+# and empty or placeholder strings become None.
+EVENT_FIELDS = {
+    'event_name': (str,),
+    'location': (str,),
+    'date': (str,),
+    'time': (str,),
+    'confidence': (str,),
+    'additional_info': (str,),
+}
+
+MULTI_EVENT_FIELDS = {
+    'event_name': (str,),
+    'event_type': (str,),
+    'location': (str,),
+    'date': (str,),
+    'start_time': (str,),
+    'end_time': (str,),
+    'description': (str,),
+}
+
+EVENT_SCHEMA = {'fields': EVENT_FIELDS}
+EVENTS_SCHEMA = {'fields': {'confidence': (str,)}, 'list': ('events', MULTI_EVENT_FIELDS)}
+
+CONFIDENCE_LEVELS = ('high', 'medium', 'low')
+_PLACEHOLDERS = {'', 'null', 'none', 'n/a', 'na', 'not found', 'unknown', '-'}
+
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+_COMMENT = re.compile(r'//[^\n]*')
+_PYTHON_LITERALS = {'None': 'null', 'True': 'true', 'False': 'false'}
+_SMART_QUOTES = str.maketrans({'“': '"', '”': '"', '‘': "'", '’': "'"})
+
+
+def find_json_object(text):
+    """
+    Return the first balanced {...} in `text`, skipping prose and code fences.
+
+    Braces inside strings are ignored. If the text ends before the object is
+    closed (a truncated reply), the open part is returned for repair().
+    """
+    start = text.find('{')
+    if start == -1:
+        return None
+    depth = 0
+    in_string = None
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == in_string:
+                in_string = None
+        elif char in '"\'':
+            in_string = char
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+    return text[start:]
+
+
+def _replace_outside_strings(text, replace):
+    """Apply replace(part) to the stretches of text between double-quoted strings."""
+    out = []
+    for index, part in enumerate(re.split(r'("(?:[^"\\]|\\.)*")', text)):
+        out.append(part if index % 2 else replace(part))
+    return ''.join(out)
+
+
+def _close_open(text):
+    """Append the quotes and brackets a truncated object is missing."""
+    stack = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]' and stack:
+            stack.pop()
+    suffix = '"' if in_string else ''
+    text = (text + suffix).rstrip()
+    # A dangling "key": or trailing comma cannot be closed meaningfully.
+    text = re.sub(r',?\s*"[^"]*"\s*:\s*$', '', text)
+    text = text.rstrip().rstrip(',')
+    return text + ''.join(reversed(stack))
+
+
+def repair(text):
+    """
+    Fix the defects models commonly produce: smart or single quotes, // comments,
+    Python None/True/False, trailing commas and a reply cut off mid-object.
+    """
+    text = text.translate(_SMART_QUOTES)
+    if '"' not in text and "'" in text:
+        text = text.replace("'", '"')
+    text = _replace_outside_strings(text, lambda part: _COMMENT.sub('', re.sub(
+        r'\b(None|True|False)\b', lambda match: _PYTHON_LITERALS[match.group(1)], part)))
+    text = _close_open(text)
+    return _TRAILING_COMMA.sub(r'\1', text)
+
+
+def _clean_value(value, types):
+    if value is None:
+        return None
+    if isinstance(value, str) and value.strip().lower() in _PLACEHOLDERS:
+        return None
+    if isinstance(value, types):
+        return value.strip() if isinstance(value, str) else value
+    if str in types and isinstance(value, (int, float)):
+        return str(value)
+    if str in types and isinstance(value, list):
+        return ', '.join(str(item) for item in value if item is not None) or None
+    raise ResponseParseError(f'expected {types[0].__name__}, got {type(value).__name__}')
+
+
+def _clean_fields(data, fields, problems, where=''):
+    cleaned = dict(data)
+    for name, types in fields.items():
+        try:
+            cleaned[name] = _clean_value(data.get(name), types)
+        except ResponseParseError as e:
+            problems.append(f'{where}{name}: {e}')
+            cleaned[name] = None
+    return cleaned
+
+
+def validate(data, schema):
+    """
+    Check a parsed reply against `schema`, coercing what can be coerced.
+
+    Returns:
+        tuple: (cleaned dict, list of problems that were fixed up)
+
+    Raises:
+        ResponseParseError: The reply does not have the required shape
+    """
+    if not isinstance(data, dict):
+        raise ResponseParseError('reply is not a JSON object')
+    problems = []
+    cleaned = _clean_fields(data, schema['fields'], problems)
+    if 'confidence' in cleaned and cleaned['confidence'] is not None:
+        confidence = cleaned['confidence'].lower()
+        if confidence not in CONFIDENCE_LEVELS:
+            problems.append(f'confidence: unexpected value {cleaned["confidence"]!r}')
+            confidence = 'low'
+        cleaned['confidence'] = confidence
+
+    if 'list' in schema:
+        key, fields = schema['list']
+        items = data.get(key)
+        if isinstance(items, dict):
+            items = [items]
+        elif items is None and any(field in data for field in fields):
+            # The model answered with a single item instead of a list of them
+            problems.append(f'"{key}" missing, reply read as a single item')
+            items = [data]
+        if not isinstance(items, list):
+            raise ResponseParseError(f'"{key}" is missing or not a list')
+        cleaned[key] = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                problems.append(f'{key}[{index}]: not an object, skipped')
+                continue
+            cleaned[key].append(_clean_fields(item, fields, problems, f'{key}[{index}].'))
+    return cleaned, problems
+
+
+def parse_response(text, schema):
+    """
+    Extract, repair if needed and validate the JSON object in a model reply.
+
+    Returns:
+        tuple: (cleaned dict, list of repairs and fix-ups applied)
+
+    Raises:
+        ResponseParseError: No usable object could be recovered
+    """
+    candidate = find_json_object(text or '')
+    if candidate is None:
+        raise ResponseParseError('no JSON object in reply')
+    try:
+        data = json.loads(candidate)
+        repairs = []
+    except json.JSONDecodeError:
+        try:
+            data = json.loads(repair(candidate))
+        except json.JSONDecodeError as e:
+            raise ResponseParseError(f'invalid JSON: {e.msg} at position {e.pos}')
+        repairs = ['repaired malformed JSON']
+    cleaned, problems = validate(data, schema)
+    return cleaned, repairs + problems
+
+
+def reask_prompt(reply, error, schema):
+    """A short text-only follow-up asking the model to restate its reply as valid JSON."""
+    keys = list(schema['fields'])
+    if 'list' in schema:
+        keys.append(f'{schema["list"][0]} (a list of objects with keys {", ".join(schema["list"][1])})')
+    return (
+        'Your previous reply could not be parsed as JSON '
+        f'({error}). Reply again with only a single valid JSON object, no prose and no code fences, '
+        f'with the keys: {", ".join(keys)}. Use null for anything unknown.\n\n'
+        f'Previous reply:\n{reply[:4000]}'
+    )
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+import argparse
+import bisect
+import json
+import sqlite3
+import sys
+import time
+
+from event_normalize import normalize_time
+from bulk_import import (RowError, connection_writer, lookup, optional, parse_date, parse_time, required,
+                         resolve_duty_personnel)
+from intervals import IntervalIndex, time_interval
+
+# People asked for by one slot, and slots per roster run.
+MAX_SLOT_COUNT = 100
+MAX_POSITIONS = 5000
+
+
+class RosterError(ValueError):
+    """The plan is invalid; `errors` lists the problems per slot index where known."""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def validate_slot(record, event):
+    """
+    A duty slot, with the date, times and location defaulting to the event's.
+
+    Returns:
+        dict: duty_type, duty_date, start_time, end_time, location,
+        description, notes and count (people needed)
+    """
+    record = {key: '' if value is None else str(value) for key, value in record.items()}
+    # Accept the form's "HH:MM - HH:MM" time_slot as well as separate times.
+    if optional(record, 'time_slot') and not optional(record, 'start_time'):
+        parts = [part.strip() for part in record['time_slot'].split(' - ')]
+        record.update(start_time=parts[0], end_time=parts[1] if len(parts) > 1 else parts[0])
+    # Event times may be free text ('9:00 AM'), so defaults are normalized first.
+    defaults = {
+        'duty_date': event['event_date'],
+        'start_time': normalize_time(event['start_time']) or event['start_time'],
+        'end_time': normalize_time(event['end_time']) or event['end_time'],
+        'location': event['venue'],
+    }
+    for field, default in defaults.items():
+        record[field] = record.get(field) or default or ''
+    try:
+        count = int(record.get('count') or 1)
+    except ValueError:
+        raise RowError('count must be an integer')
+    if not 1 <= count <= MAX_SLOT_COUNT:
+        raise RowError(f'count must be between 1 and {MAX_SLOT_COUNT}')
+    slot = {
+        'duty_type': required(record, 'duty_type'),
+        'duty_date': parse_date(record, 'duty_date'),
+        'start_time': parse_time(record, 'start_time'),
+        'end_time': parse_time(record, 'end_time'),
+        'location': required(record, 'location'),
+        'description': optional(record, 'description'),
+        'notes': optional(record, 'notes'),
+        'count': count,
+    }
+    if slot['end_time'] <= slot['start_time']:
+        raise RowError('end_time must be after start_time')
+    return slot
+
+
+def _availability(value):
+    """{name: [{"date", "start_time", "end_time"}, ...]} as {name: IntervalIndex keyed by date}."""
+    if not isinstance(value, dict):
+        raise RosterError('availability must map each person to a list of {date, start_time, end_time}')
+    availability = {}
+    for name, windows in value.items():
+        if not isinstance(windows, list):
+            raise RosterError(f'availability for {name!r} must be a list')
+        index = availability[name] = IntervalIndex()
+        for window in windows:
+            try:
+                record = {key: '' if item is None else str(item) for key, item in window.items()}
+                start, end = parse_time(record, 'start_time'), parse_time(record, 'end_time')
+                if end <= start:
+                    raise RowError(f'end_time must be after start_time, got {start}-{end}')
+                interval = time_interval(start, end)
+                index.add(parse_date(record, 'date'), interval[0], interval[1], None)
+            except (AttributeError, RowError) as e:
+                raise RosterError(f'availability for {name!r}: {e}')
+    return availability
+
+
+def _covers(index, key, start, end):
+    """Whether one window of `key` in `index` spans all of [start, end)."""
+    return any(window_start <= start and window_end >= end
+               for window_start, window_end, _ in index.intervals(key))
+
+
+def solve(positions, people, busy, availability=None, max_duties=None, max_minutes=None, load=None):
+    """
+    Assign one person to each position with no one double-booked.
+
+    Greedy, most constrained position first: each position goes to the
+    eligible person with the lightest load so far, which spreads the work
+    evenly. A position nobody can take is then retried once by moving
+    a clashing assignment of one of its candidates to someone else.
+
+    Args:
+        positions (list): Slot dicts (one per person needed) with duty_date,
+            start_time and end_time
+        people (list): Sortable keys of the people to choose from, e.g. names
+        busy (IntervalIndex): Existing duties keyed by (person, date)
+        availability (dict): person -> IntervalIndex of windows keyed by date;
+            people left out are taken to be available all the time
+        max_duties (int): Most positions (plus existing load) per person
+        max_minutes (int): Most minutes on duty (plus existing load) per person
+        load (dict): person -> [duties, minutes] already carried, e.g.
+            earlier duties at the same event
+
+    Returns:
+        tuple: (list of (position index, person), list of unfilled position
+        indexes, number of swaps made)
+    """
+    load = {name: list((load or {}).get(name, (0, 0))) for name in people}
+    availability = availability or {}
+    intervals = [time_interval(position['start_time'], position['end_time']) for position in positions]
+
+    def allowed(name, index):
+        """Clear of the person's existing duties and inside their availability."""
+        start, end = intervals[index]
+        duty_date = positions[index]['duty_date']
+        if busy.overlapping((name, duty_date), start, end):
+            return False
+        return name not in availability or _covers(availability[name], duty_date, start, end)
+
+    def free(name, index):
+        start, end = intervals[index]
+        duties, minutes = load[name]
+        if max_duties is not None and duties >= max_duties:
+            return False
+        if max_minutes is not None and minutes + end - start > max_minutes:
+            return False
+        return not taken.overlapping((name, positions[index]['duty_date']), start, end) and allowed(name, index)
+
+    # Only people with duties that day or limited availability can be ruled
+    # out up front, so only they are counted when ranking how constrained
+    # each position is.
+    restricted = {duty_date: [name for name in people if name in availability or busy.intervals((name, duty_date))]
+                  for duty_date in {position['duty_date'] for position in positions}}
+    excluded = [sum(1 for name in restricted[position['duty_date']] if not allowed(name, index))
+                for index, position in enumerate(positions)]
+    order = sorted(range(len(positions)), key=lambda index: (
+        -excluded[index], positions[index]['duty_date'], intervals[index][0]))
+
+    taken = IntervalIndex()
+    assigned = {}
+    # Everyone by (minutes, duties) so far; the first free person takes a position.
+    queue = sorted((minutes, duties, name) for name, (duties, minutes) in load.items())
+
+    def give(index, name):
+        start, end = intervals[index]
+        queue.remove((load[name][1], load[name][0], name))
+        taken.add((name, positions[index]['duty_date']), start, end, index)
+        assigned[index] = name
+        load[name][0] += 1
+        load[name][1] += end - start
+        bisect.insort(queue, (load[name][1], load[name][0], name))
+
+    def take_back(index):
+        name = assigned.pop(index)
+        start, end = intervals[index]
+        queue.remove((load[name][1], load[name][0], name))
+        taken.remove((name, positions[index]['duty_date']), index)
+        load[name][0] -= 1
+        load[name][1] -= end - start
+        bisect.insort(queue, (load[name][1], load[name][0], name))
+
+    def lightest(index, exclude=None):
+        return next((name for _, _, name in queue if name != exclude and free(name, index)), None)
+
+    unfilled = []
+    for index in order:
+        name = lightest(index)
+        if name is None:
+            unfilled.append(index)
+        else:
+            give(index, name)
+
+    swaps = 0
+    for index in list(unfilled):
+        start, end = intervals[index]
+        for name in people:
+            blocking = taken.overlapping((name, positions[index]['duty_date']), start, end)
+            if len(blocking) != 1 or not allowed(name, index):
+                continue
+            other = blocking[0]
+            take_back(other)
+            replacement = lightest(other, exclude=name) if free(name, index) else None
+            if replacement is None:
+                give(other, name)
+                continue
+            give(other, replacement)
+            give(index, name)
+            unfilled.remove(index)
+            swaps += 1
+            break
+    return sorted(assigned.items()), sorted(unfilled), swaps
+
+
+def generate(conn, event_id, plan, dry_run=False):
+    """
+    Build a duty roster for an event and, unless `dry_run`, insert it.
+
+    Call it inside one write transaction (db.write) so the duties it
+    checks against cannot change before its rows are inserted.
+
+    Args:
+        plan (dict): {"slots": [...], "people": [names], "availability": {...},
+            "max_duties": int, "max_minutes": int, "require_complete": bool};
+            without "people" everyone in duty_personnel is considered
+
+    Returns:
+        dict: assignments, unfilled slots and timing stats
+
+    Raises:
+        RosterError: The event does not exist or the plan is invalid, or
+            require_complete is set and some slot could not be filled
+    """
+    started = time.perf_counter()
+    event = conn.execute('SELECT * FROM events WHERE id = ?', (event_id,)).fetchone()
+    if event is None:
+        raise RosterError(f'event {event_id} does not exist')
+
+    records = plan.get('slots')
+    if not isinstance(records, list) or not records:
+        raise RosterError('Expected a non-empty "slots" list')
+    slots, errors = [], []
+    for index, record in enumerate(records):
+        try:
+            if not isinstance(record, dict):
+                raise RowError('expected an object')
+            slots.append(dict(validate_slot(record, event), slot=index))
+        except RowError as e:
+            errors.append({'index': index, 'error': str(e)})
+    if errors:
+        raise RosterError('Some slots are invalid', errors)
+    positions = [slot for slot in slots for _ in range(slot['count'])]
+    if len(positions) > MAX_POSITIONS:
+        raise RosterError(f'At most {MAX_POSITIONS} people per roster')
+
+    limits = {}
+    for field in ('max_duties', 'max_minutes'):
+        value = plan.get(field)
+        if value is not None and (not isinstance(value, int) or value < 1):
+            raise RosterError(f'{field} must be a positive integer')
+        limits[field] = value
+
+    # People are (name, duty_personnel id) pairs, since names are not unique.
+    # A name given in the plan is the first person of that name, or a new
+    # person (id None) created if they are assigned anything.
+    if plan.get('people') is not None:
+        names = plan['people']
+        if not isinstance(names, list) or not all(isinstance(name, str) and name.strip() for name in names):
+            raise RosterError('people must be a list of names')
+        names = list(dict.fromkeys(name.strip() for name in names))
+        ids = {row['name']: row['id'] for row in lookup(
+            conn, 'SELECT name, MIN(id) AS id FROM duty_personnel WHERE name IN ({placeholders}) GROUP BY name', names)}
+        people = [(name, ids.get(name)) for name in names]
+    else:
+        people = [(row['name'], row['id'])
+                  for row in conn.execute('SELECT id, name FROM duty_personnel ORDER BY name, id')]
+    if not people:
+        raise RosterError('No people to assign')
+    windows = _availability(plan.get('availability') or {})
+    availability = {person: windows[person[0]] for person in people if person[0] in windows}
+
+    # Everyone's existing duties on the roster's days, and their load at this event.
+    busy = IntervalIndex()
+    load = {}
+    for row in lookup(conn, '''
+        SELECT dp.id, dp.name, d.event_id, d.duty_date, d.start_time, d.end_time
+        FROM duties d JOIN duty_personnel dp ON d.duty_person_id = dp.id
+        WHERE d.duty_date IN ({placeholders})
+    ''', sorted({position['duty_date'] for position in positions})):
+        interval = time_interval(row['start_time'], row['end_time'])
+        if interval is None:
+            continue
+        person = (row['name'], row['id'])
+        busy.add((person, row['duty_date']), interval[0], interval[1], None)
+        if row['event_id'] == event_id:
+            carried = load.setdefault(person, [0, 0])
+            carried[0] += 1
+            carried[1] += interval[1] - interval[0]
+    loaded = time.perf_counter()
+
+    assignments, unfilled, swaps = solve(positions, people, busy, availability, load=load, **limits)
+    solved = time.perf_counter()
+    if unfilled and plan.get('require_complete'):
+        raise RosterError(f'{len(unfilled)} of {len(positions)} positions could not be filled',
+                          [{'index': positions[index]['slot'], 'error': 'no one available'} for index in unfilled])
+
+    rows = [dict(positions[index], person_name=name, duty_person_id=person_id, event_id=event_id)
+            for index, (name, person_id) in assignments]
+    if not dry_run and rows:
+        created = resolve_duty_personnel(conn, sorted({row['person_name'] for row in rows
+                                                       if row['duty_person_id'] is None}))
+        for row in rows:
+            row['duty_person_id'] = row['duty_person_id'] or created[row['person_name']]
+        conn.executemany('''
+            INSERT INTO duties (event_id, duty_person_id, duty_type,
+                              duty_date, start_time, end_time, location, description, notes)
+            VALUES (:event_id, :duty_person_id, :duty_type,
+                    :duty_date, :start_time, :end_time, :location, :description, :notes)
+        ''', rows)
+    finished = time.perf_counter()
+
+    per_person = {}
+    for _, person in assignments:
+        per_person[person] = per_person.get(person, 0) + 1
+    counts = [per_person.get(person, 0) for person in people]
+    return {
+        'event_id': event_id,
+        'dry_run': dry_run,
+        'assignments': [{key: row[key] for key in ('slot', 'person_name', 'duty_person_id', 'duty_type', 'duty_date',
+                                                    'start_time', 'end_time', 'location')} for row in rows],
+        'unfilled': [{'slot': positions[index]['slot'], 'duty_type': positions[index]['duty_type'],
+                      'duty_date': positions[index]['duty_date'], 'start_time': positions[index]['start_time'],
+                      'end_time': positions[index]['end_time']} for index in unfilled],
+        'stats': {
+            'positions': len(positions),
+            'filled': len(assignments),
+            'unfilled': len(unfilled),
+            'people': len(people),
+            'people_used': len(per_person),
+            'min_load': min(counts),
+            'max_load': max(counts),
+            'swaps': swaps,
+            'load_ms': round((loaded - started) * 1000, 2),
+            'solve_ms': round((solved - loaded) * 1000, 2),
+            'write_ms': round((finished - solved) * 1000, 2),
+            'total_ms': round((finished - started) * 1000, 2),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a conflict-free duty roster for an event')
+    parser.add_argument('event_id', type=int)
+    parser.add_argument('plan', help='JSON file with slots, people, availability and load caps')
+    parser.add_argument('--database', '-d', default='events.db', help='Path to the SQLite database')
+    parser.add_argument('--dry-run', action='store_true', help='Show the roster without saving it')
+    args = parser.parse_args()
+
+    with open(args.plan, encoding='utf-8') as f:
+        plan = json.load(f)
+    conn = sqlite3.connect(args.database, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA foreign_keys = ON')
+    try:
+        if args.dry_run:
+            result = generate(conn, args.event_id, plan, dry_run=True)
+        else:
+            result = connection_writer(conn)(lambda conn: generate(conn, args.event_id, plan))
+    except RosterError as e:
+        print(f'Error: {e}')
+        for error in e.errors:
+            print(f"  slot {error['index']}: {error['error']}")
+        return 1
+    finally:
+        conn.close()
+
+    for row in result['assignments']:
+        print(f"{row['duty_date']} {row['start_time']}-{row['end_time']}  {row['duty_type']:<14} {row['person_name']}")
+    for row in result['unfilled']:
+        print(f"{row['duty_date']} {row['start_time']}-{row['end_time']}  {row['duty_type']:<14} (unfilled)")
+    stats = result['stats']
+    action = 'Planned' if args.dry_run else 'Assigned'
+    mark = '✓' if not result['unfilled'] else '✗'
+    print(f"{mark} {action} {stats['filled']} of {stats['positions']} positions across {stats['people_used']} people "
+          f"(load {stats['min_load']}-{stats['max_load']}, solve {stats['solve_ms']} ms, total {stats['total_ms']} ms)")
+    return 1 if result['unfilled'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,291 @@
+import importlib.util
+import io
+import json
+import os
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+import extraction_cache
+import image_prep
+from db import execute_write
+from event_normalize import normalize_event
+
+
+class QueueFull(Exception):
+    pass
+
+
+def scan_result(result):
+    """Shape an EventExtractor result as the event fields the add-event form expects."""
+    # Date and time inputs only accept YYYY-MM-DD and HH:MM; keep the raw
+    # text when it cannot be converted so the preview still shows it.
+    normalized = normalize_event(result)
+    return {'event': {
+        'name': result.get('event_name', 'Untitled Event'),
+        'venue': result.get('location', ''),
+        'event_date': normalized['event_date'] or result.get('date', ''),
+        'start_time': normalized['start_time'] or result.get('time', ''),
+        'end_time': normalized['end_time'],
+        'description': result.get('additional_info', ''),
+        'confidence': result.get('confidence', 'medium'),
+        'cached': bool(result.get('cache_hit')),
+    }}
+
+
+def scan_events_result(result):
+    """Shape an extract_events() result: every event, ready for POST /api/events/batch."""
+    return {
+        'events': result['events'],
+        'confidence': result.get('confidence', 'medium'),
+        'cached': bool(result.get('cache_hit')),
+    }
+
+
+class ScanJobs:
+    """
+    Runs image scans on a bounded pool of background threads.
+
+    One EventExtractor is built lazily and shared by every job of the
+    process, so the model client is configured once rather than per upload.
+    Job state lives in the scan_jobs table, so any gunicorn worker can answer
+    a status poll for a job started by another.
+
+    Args:
+        app: Flask app whose database the jobs are recorded in
+        extractor_factory: Callable returning an EventExtractor
+        workers (int): Scans running at once in this process
+        max_pending (int): Queued plus running jobs before submit() refuses more
+        retention (int): Seconds finished jobs are kept before being purged
+    """
+
+    def __init__(self, app, extractor_factory, workers=2, max_pending=32, retention=3600):
+        self.app = app
+        self.extractor_factory = extractor_factory
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention = retention
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._extractor = None
+        self._pending = 0
+        self._completed = 0
+        self._failed = 0
+        self._bytes_saved = 0
+        self._preprocess_ms = 0.0
+
+    @property
+    def extractor(self):
+        with self._lock:
+            if self._extractor is None:
+                self._extractor = self.extractor_factory()
+            return self._extractor
+
+    def _get_executor(self):
+        # Threads do not survive a fork, so each worker process starts its own.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='scan')
+            self._pending = 0
+        return self._executor
+
+    def submit(self, data, filename, user_id, multi=False):
+        """
+        Queue a scan of the image bytes `data` and return its job id.
+
+        With `multi` the job extracts every event on the image instead of one.
+
+        Raises:
+            QueueFull: max_pending jobs are already queued or running here
+        """
+        with self._lock:
+            executor = self._get_executor()
+            if self._pending >= self.max_pending:
+                raise QueueFull(f'{self._pending} scans already pending')
+            self._pending += 1
+
+        job_id = uuid.uuid4().hex
+        try:
+            execute_write('''
+                INSERT INTO scan_jobs (id, user_id, filename) VALUES (?, ?, ?)
+            ''', (job_id, user_id, filename))
+            execute_write("DELETE FROM scan_jobs WHERE created_at < datetime('now', ?)",
+                          (f'-{int(self.retention)} seconds',))
+            executor.submit(self._run, job_id, data, filename, multi)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return job_id
+
+    def _run(self, job_id, data, filename, multi):
+        with self.app.app_context():
+            try:
+                execute_write("UPDATE scan_jobs SET status = 'running' WHERE id = ?", (job_id,))
+                if multi:
+                    result = self.extractor.extract_events(io.BytesIO(data), source_name=filename)
+                else:
+                    result = self.extractor.extract_event_info(io.BytesIO(data), source_name=filename, display=False)
+                if result.get('error'):
+                    raise RuntimeError(result['error'])
+                payload = scan_events_result(result) if multi else scan_result(result)
+            except Exception as e:
+                self._finish(job_id, 'failed', error=str(e))
+            else:
+                self._finish(job_id, 'done', result=json.dumps(payload), preprocessing=result.get('preprocessing'))
+
+    def _finish(self, job_id, status, result=None, error=None, preprocessing=None):
+        prep = preprocessing or {}
+        try:
+            execute_write('''
+                UPDATE scan_jobs SET status = ?, result = ?, error = ?, finished_at = CURRENT_TIMESTAMP,
+                                     input_bytes = ?, upload_bytes = ?, preprocess_ms = ?
+                WHERE id = ?
+            ''', (status, result, error, prep.get('input_bytes'), prep.get('upload_bytes'),
+                  prep.get('preprocess_ms'), job_id))
+        finally:
+            with self._lock:
+                self._pending -= 1
+                if status == 'done':
+                    self._completed += 1
+                else:
+                    self._failed += 1
+                if prep:
+                    self._bytes_saved += prep['bytes_saved']
+                    self._preprocess_ms += prep['preprocess_ms']
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'pending': self._pending,
+            'max_pending': self.max_pending,
+            'completed': self._completed,
+            'failed': self._failed,
+            'bytes_saved': self._bytes_saved,
+            'preprocess_ms': round(self._preprocess_ms, 1),
+            'extractor_loaded': self._extractor is not None,
+            'local_answers': getattr(self._extractor, 'local_answers', 0),
+            'escalations': getattr(self._extractor, 'escalations', 0),
+            'loaded_modules': [module for module in dict(AI_PACKAGES, **OCR_PACKAGES) if module in sys.modules],
+        }
+
+    def shutdown(self, wait=True):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+            self._pid = None
+
+
+def get_job(conn, job_id, user_id):
+    """Return the job as a JSON-ready dict, or None if it is not this user's."""
+    row = conn.execute('SELECT * FROM scan_jobs WHERE id = ? AND user_id = ?', (job_id, user_id)).fetchone()
+    if row is None:
+        return None
+    job = {'job_id': row['id'], 'status': row['status'], 'filename': row['filename']}
+    if row['status'] == 'done':
+        job.update(json.loads(row['result']))
+    elif row['status'] == 'failed':
+        job['error'] = row['error']
+    if row['input_bytes'] is not None:
+        job['preprocessing'] = {
+            'input_bytes': row['input_bytes'],
+            'upload_bytes': row['upload_bytes'],
+            'preprocess_ms': row['preprocess_ms'],
+        }
+    return job
+
+
+# Modules of the optional AI stack, by the package that provides them.
+AI_PACKAGES = {'PIL': 'pillow', 'google.generativeai': 'google-generativeai'}
+# The local backend needs either Tesseract binding.
+OCR_PACKAGES = {'tesserocr': 'tesserocr', 'pytesseract': 'pytesseract'}
+SCAN_BACKENDS = ('remote', 'local', 'auto')
+
+
+def _installed(module):
+    try:
+        return importlib.util.find_spec(module) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def missing_packages(model, backend='remote'):
+    """Optional packages that scanning with `model` and `backend` needs but are not installed."""
+    missing = []
+    for module, package in AI_PACKAGES.items():
+        if module == 'google.generativeai' and (model == 'fake' or backend == 'local'):
+            continue
+        if not _installed(module):
+            missing.append(package)
+    if backend != 'remote' and not any(_installed(module) for module in OCR_PACKAGES):
+        missing.append('pytesseract')
+    return missing
+
+
+def unavailable_reason(app):
+    """Why image scanning cannot run in this app, or None if it can."""
+    if not app.config['SCAN_ENABLED']:
+        return 'Image scanning is disabled on this server.'
+    if app.config['SCAN_BACKEND'] not in SCAN_BACKENDS:
+        return f"Unknown SCAN_BACKEND {app.config['SCAN_BACKEND']!r} (expected one of {', '.join(SCAN_BACKENDS)})."
+    missing = missing_packages(app.config['SCAN_MODEL'], app.config['SCAN_BACKEND'])
+    if missing:
+        return f"Image scanning needs {', '.join(missing)} (pip install -r requirements-ai.txt)."
+    return None
+
+
+def default_extractor_factory(app):
+    def factory():
+        from ai_event import EventExtractor, FakeModel
+        options = {
+            'cache': app.extensions.get('extraction_cache'),
+            'max_pixels': app.config['SCAN_MAX_PIXELS'] or None,
+            'crop_margins': app.config['SCAN_CROP_MARGINS'],
+        }
+        if app.config['SCAN_BACKEND'] != 'remote':
+            from local_backend import OCRModel
+            if app.config['SCAN_BACKEND'] == 'local':
+                return EventExtractor(model_name='local', model=OCRModel(), **options)
+            options.update(local=OCRModel(), min_confidence=app.config['SCAN_LOCAL_MIN_CONFIDENCE'])
+        if app.config['SCAN_MODEL'] == 'fake':
+            return EventExtractor(model_name='fake', model=FakeModel(), **options)
+        return EventExtractor(model_name=app.config['SCAN_MODEL'], **options)
+    return factory
+
+
+def init_app(app):
+    app.config.setdefault('SCAN_ENABLED', os.environ.get('SCAN_ENABLED', '1') != '0')
+    app.config.setdefault('SCAN_MODEL', os.environ.get('SCAN_MODEL', 'gemini-1.5-flash'))
+    app.config.setdefault('SCAN_BACKEND', os.environ.get('SCAN_BACKEND', 'remote'))
+    app.config.setdefault('SCAN_LOCAL_MIN_CONFIDENCE', os.environ.get('SCAN_LOCAL_MIN_CONFIDENCE', 'high'))
+    app.config.setdefault('SCAN_WORKERS', int(os.environ.get('SCAN_WORKERS', 2)))
+    app.config.setdefault('SCAN_MAX_PENDING', int(os.environ.get('SCAN_MAX_PENDING', 32)))
+    app.config.setdefault('SCAN_JOB_RETENTION', int(os.environ.get('SCAN_JOB_RETENTION', 3600)))
+    app.config.setdefault('SCAN_MAX_PIXELS', int(os.environ.get('SCAN_MAX_PIXELS', image_prep.DEFAULT_MAX_PIXELS)))
+    app.config.setdefault('SCAN_CROP_MARGINS', os.environ.get('SCAN_CROP_MARGINS', '0') == '1')
+    app.config.setdefault('EXTRACTION_CACHE', os.environ.get('EXTRACTION_CACHE', extraction_cache.DEFAULT_PATH))
+    app.config.setdefault('EXTRACTION_CACHE_MAX_BYTES',
+                          int(os.environ.get('EXTRACTION_CACHE_MAX_BYTES', extraction_cache.DEFAULT_MAX_BYTES)))
+    app.config.setdefault('SCAN_EXTRACTOR_FACTORY', default_extractor_factory(app))
+
+    # An empty EXTRACTION_CACHE disables the cache.
+    if app.config['EXTRACTION_CACHE']:
+        app.extensions['extraction_cache'] = extraction_cache.ExtractionCache(
+            app.config['EXTRACTION_CACHE'], app.config['EXTRACTION_CACHE_MAX_BYTES'])
+
+    app.extensions['scan_jobs'] = ScanJobs(
+        app,
+        app.config['SCAN_EXTRACTOR_FACTORY'],
+        workers=app.config['SCAN_WORKERS'],
+        max_pending=app.config['SCAN_MAX_PENDING'],
+        retention=app.config['SCAN_JOB_RETENTION'],
+    )
+
+
+def get_scan_jobs():
+    return current_app.extensions['scan_jobs']
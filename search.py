@@ -0,0 +1,113 @@
+import html
+import re
+
+# bm25() column weights, in the column order of events_fts / participants_fts
+# (see migration 3). A hit in the name outranks one in the description.
+EVENT_WEIGHTS = (10.0, 4.0, 4.0, 2.0, 1.0)
+PARTICIPANT_WEIGHTS = (10.0, 3.0, 2.0, 5.0)
+
+SNIPPET_TOKENS = 12
+
+# snippet() wraps matches in these control characters; they can't appear in
+# form input, so the text can be HTML-escaped before they become <mark> tags.
+_MARK_OPEN = '\x02'
+_MARK_CLOSE = '\x03'
+
+_WORD = re.compile(r'\w+')
+
+
+def build_match_query(text):
+    """
+    Turn free text from the search box into an FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term, so "sci fa" matches
+    "Science Fair" and FTS5 operators typed by users are treated as text.
+    Returns an empty string when the text contains no searchable words.
+    """
+    return ' '.join(f'"{word}"*' for word in _WORD.findall(text))
+
+
+def _weights(weights):
+    return ', '.join(str(w) for w in weights)
+
+
+def search_events(conn, text, filter_type='all', order_by='rank', limit=50):
+    """
+    Full-text search over event name, type, venue, host school and description.
+
+    Args:
+        conn: Database connection
+        text (str): Raw search text
+        filter_type (str): 'all', 'upcoming' or 'completed', as on the events page
+        order_by (str): 'rank' for best match first, 'date' for event_date order
+        limit (int): Maximum rows, or None for all matches
+
+    Returns:
+        list: Event rows with extra `rank` and `snippet` columns
+    """
+    match = build_match_query(text)
+    if not match:
+        return []
+
+    query = f'''
+        SELECT e.*, bm25(events_fts, {_weights(EVENT_WEIGHTS)}) AS rank,
+               snippet(events_fts, -1, ?, ?, '…', {SNIPPET_TOKENS}) AS snippet
+        FROM events_fts
+        JOIN events e ON e.id = events_fts.rowid
+        WHERE events_fts MATCH ?
+    '''
+    params = [_MARK_OPEN, _MARK_CLOSE, match]
+
+    if filter_type == 'upcoming':
+        query += ' AND e.event_date >= DATE("now")'
+    elif filter_type == 'completed':
+        query += ' AND e.event_date < DATE("now")'
+
+    query += ' ORDER BY e.event_date ASC' if order_by == 'date' else ' ORDER BY rank'
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+
+    return conn.execute(query, params).fetchall()
+
+
+def search_participants(conn, text, order_by='rank', limit=50):
+    """
+    Full-text search over student name, class/department, school and unique ID.
+
+    Returns:
+        list: Participant rows with extra `rank` and `snippet` columns
+    """
+    match = build_match_query(text)
+    if not match:
+        return []
+
+    query = f'''
+        SELECT p.*, bm25(participants_fts, {_weights(PARTICIPANT_WEIGHTS)}) AS rank,
+               snippet(participants_fts, -1, ?, ?, '…', {SNIPPET_TOKENS}) AS snippet
+        FROM participants_fts
+        JOIN participants p ON p.id = participants_fts.rowid
+        WHERE participants_fts MATCH ? AND p.type = "student"
+    '''
+    params = [_MARK_OPEN, _MARK_CLOSE, match]
+
+    query += ' ORDER BY p.name' if order_by == 'name' else ' ORDER BY rank'
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+
+    return conn.execute(query, params).fetchall()
+
+
+def render_snippet(snippet):
+    """HTML-escape a raw snippet and turn its match markers into <mark> tags."""
+    if snippet is None:
+        return None
+    escaped = html.escape(snippet)
+    return escaped.replace(_MARK_OPEN, '<mark>').replace(_MARK_CLOSE, '</mark>')
+
+
+def search_result(row):
+    result = dict(row)
+    result['snippet'] = render_snippet(result.get('snippet'))
+    return result
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+import argparse
+import sqlite3
+import sys
+
+# Counters kept in stat_counts by triggers, per source table:
+# (metric, bucket expression, condition). Expressions use {row}, which the
+# triggers replace with new/old and rebuild_statements() with the table; an
+# empty bucket ('') is a plain total. The triggers are created by migration
+# 4: a new counter also needs a migration that adds it to them.
+COUNTERS = {
+    'events': [
+        ('events', "''", None),
+        ('event_type', '{row}.type', None),
+        ('event_month', "strftime('%Y-%m', {row}.event_date)", None),
+    ],
+    'participants': [
+        ('participants', "''", None),
+        ('students', "''", "{row}.type = 'student'"),
+        ('participant_school', '{row}.school', None),
+    ],
+    'duty_personnel': [
+        ('duty_personnel', "''", None),
+    ],
+    'duties': [
+        ('duties', "''", None),
+        ('duty_type', '{row}.duty_type', None),
+    ],
+}
+
+
+def rebuild_statements():
+    """Statements that recompute every counter from the source tables."""
+    statements = ['DELETE FROM stat_counts']
+    for table, counters in COUNTERS.items():
+        for metric, bucket, condition in counters:
+            bucket = bucket.format(row=table)
+            where = f' WHERE {condition.format(row=table)}' if condition else ''
+            statements.append(f'''
+        INSERT INTO stat_counts (metric, bucket, count)
+        SELECT '{metric}', COALESCE({bucket}, ''), COUNT(*) FROM {table}{where}
+        GROUP BY COALESCE({bucket}, '')''')
+    return statements
+
+
+def rebuild(conn):
+    """Recompute stat_counts in one transaction (conn must be in autocommit mode)."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for statement in rebuild_statements():
+            conn.execute(statement)
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def get_count(conn, metric, bucket=''):
+    row = conn.execute('SELECT count FROM stat_counts WHERE metric = ? AND bucket = ?',
+                       (metric, bucket)).fetchone()
+    return row['count'] if row else 0
+
+
+def get_breakdown(conn, metric, label, order_by='count', limit=None, since=None):
+    """
+    Rows of (`label`, count) for one bucketed metric, skipping empty buckets.
+
+    Args:
+        order_by (str): 'count' for largest first, 'bucket' for bucket order
+        since (str): Only buckets >= this value (e.g. a 'YYYY-MM' month)
+    """
+    query = f'SELECT bucket AS {label}, count FROM stat_counts WHERE metric = ? AND count > 0'
+    params = [metric]
+    if since is not None:
+        query += ' AND bucket >= ?'
+        params.append(since)
+    query += ' ORDER BY count DESC' if order_by == 'count' else ' ORDER BY bucket'
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+    return conn.execute(query, params).fetchall()
+
+
+def dashboard_counts(conn):
+    return {
+        'total_events': get_count(conn, 'events'),
+        'total_participants': get_count(conn, 'students'),
+        'total_duty_personnel': get_count(conn, 'duty_personnel'),
+        'total_duties': get_count(conn, 'duties'),
+    }
+
+
+def report_stats(conn):
+    first_month = conn.execute("SELECT strftime('%Y-%m', date('now', '-12 months'))").fetchone()[0]
+    return {
+        'total_events': get_count(conn, 'events'),
+        'total_participants': get_count(conn, 'participants'),
+        'total_duties': get_count(conn, 'duties'),
+        'event_types': get_breakdown(conn, 'event_type', 'type'),
+        'monthly_events': get_breakdown(conn, 'event_month', 'month', order_by='bucket', since=first_month),
+        'top_schools': get_breakdown(conn, 'participant_school', 'school', limit=10),
+        'duty_stats': get_breakdown(conn, 'duty_type', 'duty_type'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the precomputed dashboard and report counters')
+    parser.add_argument('command', choices=['rebuild', 'show'])
+    parser.add_argument('--database', '-d', default='events.db', help='Path to the SQLite database')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.database, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        if args.command == 'rebuild':
+            rebuild(conn)
+            print('✓ Counters rebuilt')
+        for row in conn.execute('SELECT metric, bucket, count FROM stat_counts ORDER BY metric, bucket'):
+            bucket = f" [{row['bucket']}]" if row['bucket'] else ''
+            print(f"{row['metric']}{bucket}: {row['count']}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
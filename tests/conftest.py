@@ -0,0 +1,92 @@
+import io
+
+import pytest
+
+import migrations
+
+# Tables the `client` and `app_context` fixtures empty after each test, children first.
+DATA_TABLES = ('duties', 'duty_personnel', 'participants', 'event_series_exceptions', 'event_series', 'events',
+               'scan_jobs')
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Path of a fully migrated database in a temporary directory."""
+    path = str(tmp_path / 'events.db')
+    migrations.migrate(path)
+    return path
+
+
+@pytest.fixture
+def conn(database):
+    """A connection to `database` in autocommit mode, with sqlite3.Row rows."""
+    conn = migrations.connect(database)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def add_event(conn):
+    """Insert an event (Sports Day, Main Hall, 2026-10-20 09:00-11:00 unless overridden); returns its id."""
+    def add(**fields):
+        row = dict(name='Sports Day', type='sports', event_date='2026-10-20', start_time='09:00', end_time='11:00',
+                   venue='Main Hall', description='', host_school='ABC', participating_schools='')
+        row.update(fields)
+        return conn.execute('''
+            INSERT INTO events (name, type, event_date, start_time, end_time, venue,
+                              description, host_school, participating_schools)
+            VALUES (:name, :type, :event_date, :start_time, :end_time, :venue,
+                    :description, :host_school, :participating_schools)
+        ''', row).lastrowid
+    return add
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """The Flask app, imported once against a database of its own."""
+    directory = tmp_path_factory.mktemp('app')
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('DATABASE', str(directory / 'events.db'))
+        patch.setenv('EXTRACTION_CACHE', str(directory / 'extraction_cache.db'))
+        patch.setenv('ICS_SECRET', 'test-secret')
+        import app as module
+    module.app.config['TESTING'] = True
+    yield module.app
+    module.app.extensions['db_writer'].stop()
+
+
+def _delete_data(app):
+    import db
+
+    with app.app_context():
+        db.write(lambda conn: [conn.execute(f'DELETE FROM {table}') for table in DATA_TABLES])
+
+
+@pytest.fixture
+def client(app):
+    """A test client logged in as user 1; the app's data is deleted afterwards."""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update(user_id=1, username='admin', role='admin')
+    yield client
+    _delete_data(app)
+
+
+@pytest.fixture
+def app_context(app):
+    """Run the test inside an app context; the app's data is deleted afterwards."""
+    with app.app_context():
+        yield app
+    _delete_data(app)
+
+
+@pytest.fixture
+def make_image():
+    """Encode a plain image: make_image(width, height, color='white', format='PNG') -> bytes."""
+    from PIL import Image
+
+    def make(width=200, height=100, color='white', format='PNG', **save_options):
+        out = io.BytesIO()
+        Image.new('RGB', (width, height), color).save(out, format, **save_options)
+        return out.getvalue()
+    return make
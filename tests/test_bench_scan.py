@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from bench_scan import compare, percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def level(concurrency, p95_ms, throughput, failed=0):
+    return {'concurrency': concurrency, 'p95_ms': p95_ms, 'throughput_per_s': throughput, 'failed': failed}
+
+
+def test_percentile_is_nearest_rank():
+    values = [5, 1, 4, 2, 3]
+    assert percentile(values, 0.5) == 3
+    assert percentile(values, 0.95) == 5
+    assert percentile([7], 0.95) == 7
+
+
+def test_compare_reports_only_regressions_beyond_tolerance():
+    baseline = {'levels': [level(1, 100, 10.0), level(4, 100, 40.0)]}
+    assert compare([level(1, 115, 9.0), level(4, 100, 40.0)], baseline, 0.2) == []
+    regressions = compare([level(1, 130, 10.0), level(4, 100, 30.0, failed=1), level(8, 500, 1.0)], baseline, 0.2)
+    assert regressions == [
+        'concurrency 1: p95 100 -> 130 ms',
+        'concurrency 4: throughput 40.0 -> 30.0 scans/s',
+        'concurrency 4: 1 failed scans (was 0)',
+    ]
+
+
+@pytest.mark.parametrize('path', ['extractor', 'app'])
+def test_benchmark_runs_every_level(path):
+    command = [sys.executable, 'bench_scan.py', '--path', path, '--concurrency', '1,2', '--repeat', '2',
+               '--latency', '0.01', '--poll', '0.005', '--json']
+    process = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, timeout=120)
+    assert process.returncode == 0, process.stderr
+    results = json.loads(process.stdout)
+
+    assert (results['path'], results['model']) == (path, 'fake')
+    assert [entry['concurrency'] for entry in results['levels']] == [1, 2]
+    for entry in results['levels']:
+        assert entry['failed'] == 0, entry['errors']
+        assert entry['scans'] == 2
+        assert entry['p50_ms'] <= entry['p95_ms']
@@ -0,0 +1,62 @@
+import io
+
+import pytest
+
+from bulk_import import RowError, connection_writer, detect_format, run_import, validate_event
+
+
+def run(conn, entity, text, fmt='csv', **kwargs):
+    return run_import(io.BytesIO(text.encode()), entity, fmt, connection_writer(conn), **kwargs)
+
+
+def test_csv_participants_report_errors_by_line(conn):
+    report = run(conn, 'participants', (
+        'unique_id,name,school,grade\n'
+        'P1,Asha,ABC,7\n'
+        'P2,,ABC,7\n'
+        'P1,Asha again,ABC,7\n'
+        'P3,Ravi,XYZ,\n'
+    ))
+    assert (report['rows_read'], report['inserted'], report['failed']) == (4, 2, 2)
+    assert report['errors'] == [{'line': 3, 'error': 'name is required'},
+                                {'line': 4, 'error': "unique_id 'P1' already exists"}]
+    classes = [row[0] for row in conn.execute('SELECT class_dept FROM participants ORDER BY unique_id')]
+    assert classes == ['Grade 7', 'XYZ']
+
+
+def test_jsonl_events_commit_per_batch(conn):
+    report = run(conn, 'events', (
+        '{"name": "Fair", "type": "academic", "event_date": "2026-10-20", "start_time": "9:00", '
+        '"end_time": "10:00", "venue": "Hall", "host_school": "ABC"}\n'
+        '\n'
+        'not json\n'
+        '["a list"]\n'
+        '{"name": "Quiz", "type": "academic", "event_date": "20-10-2026", "start_time": "9:00", '
+        '"end_time": "10:00", "venue": "Hall", "host_school": "ABC"}\n'
+    ), fmt='jsonl', batch_rows=1)
+    assert (report['inserted'], report['batches']) == (1, 1)
+    assert [error['line'] for error in report['errors']] == [3, 4, 5]
+    assert report['errors'][1]['error'] == 'expected a JSON object'
+    assert conn.execute('SELECT start_time FROM events').fetchone()[0] == '09:00'
+
+
+def test_failed_batch_rolls_back_only_itself(conn):
+    def failing_write(fn):
+        calls.append(fn)
+        if len(calls) == 2:
+            raise RuntimeError('disk full')
+        return connection_writer(conn)(fn)
+
+    calls = []
+    text = 'unique_id,name,school\nP1,Asha,ABC\nP2,Ravi,ABC\n'
+    with pytest.raises(RuntimeError):
+        run_import(io.BytesIO(text.encode()), 'participants', 'csv', failing_write, batch_rows=1)
+    assert [row[0] for row in conn.execute('SELECT unique_id FROM participants')] == ['P1']
+
+
+def test_validation_and_format_detection():
+    with pytest.raises(RowError, match='end_time must be an HH:MM time'):
+        validate_event({'name': 'x', 'type': 'x', 'event_date': '2026-10-20', 'start_time': '09:00',
+                        'end_time': '9am', 'venue': 'x', 'host_school': 'x'})
+    assert detect_format('people.NDJSON') == 'jsonl'
+    assert detect_format('people.txt', default='csv') == 'csv'
@@ -0,0 +1,47 @@
+import time
+
+from cache import MISSING, LRUCache, get_versions
+
+EVENT_FORM = {
+    'name': 'Sports Day', 'type': 'sports', 'event_date': '2026-10-20', 'start_time': '09:00', 'end_time': '10:00',
+    'venue': 'Gym', 'host_school': 'ABC', 'description': '', 'participating_schools': '',
+}
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is MISSING
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_ttl():
+    cache = LRUCache(ttl=0.01)
+    cache.set('a', 1)
+    time.sleep(0.02)
+    assert cache.get('a') is MISSING
+
+
+def test_writes_bump_only_their_month_scope(conn, add_event):
+    event_id = add_event(event_date='2026-10-20')
+    before = get_versions(conn, ['events', 'events:2026-10', 'events:2026-11', 'duties'])[0]
+    conn.execute("UPDATE events SET event_date = '2026-11-03' WHERE id = ?", (event_id,))
+    after = get_versions(conn, ['events', 'events:2026-10', 'events:2026-11', 'duties'])[0]
+    assert [b > a for a, b in zip(before, after)] == [True, True, True, False]
+
+
+def test_calendar_page_is_invalidated_by_writes_to_its_month(client):
+    url = '/calendar?year=2026&month=10'
+    first = client.get(url)
+    assert first.status_code == 200 and first.headers['ETag']
+    assert client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    client.post('/events/add', data=dict(EVENT_FORM, name='Elsewhere', event_date='2026-12-01'))
+    assert client.get(url).headers['ETag'] == first.headers['ETag']
+
+    client.post('/events/add', data=EVENT_FORM)
+    page = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert page.status_code == 200 and b'Sports Day' in page.data
@@ -0,0 +1,75 @@
+from datetime import date
+
+import pytest
+
+from calendar_range import month_scopes, parse_range, period_bounds, range_summary, term_starts
+
+TERMS = term_starts('01-01,05-01,09-01')
+
+
+@pytest.fixture
+def events(conn, add_event):
+    for start in ('14:00', '09:00', '11:00'):
+        add_event(name=f'Match {start}', start_time=start, end_time=start[:2] + ':45')
+    add_event(name='Quiz', event_date='2026-10-22')
+    add_event(name='Next month', event_date='2026-11-02')
+    conn.execute('''
+        INSERT INTO event_series (name, type, start_date, until_date, frequency, start_time, end_time, venue,
+                                  host_school)
+        VALUES ('Choir', 'cultural', '2026-10-06', '2026-10-27', 'weekly', '08:00', '08:45', 'Music Room', 'ABC')
+    ''')
+
+
+def test_period_bounds():
+    day = date(2026, 10, 22)
+    assert period_bounds('week', day, TERMS) == (date(2026, 10, 19), date(2026, 10, 25))
+    assert period_bounds('month', day, TERMS) == (date(2026, 10, 1), date(2026, 10, 31))
+    assert period_bounds('term', day, TERMS) == (date(2026, 9, 1), date(2026, 12, 31))
+    assert period_bounds('term', date(2026, 2, 1), TERMS) == (date(2026, 1, 1), date(2026, 4, 30))
+
+
+def test_parse_range_validates_the_window():
+    assert parse_range({'granularity': 'week', 'date': '2026-10-22'}, TERMS) == \
+        (date(2026, 10, 19), date(2026, 10, 25), 'week')
+    assert parse_range({'start': '2026-10-01', 'end': '2026-10-31'}, TERMS)[:2] == (date(2026, 10, 1),
+                                                                                  date(2026, 10, 31))
+    for args in ({'granularity': 'year'}, {'start': '2026-10-01'}, {'start': '2026-10-31', 'end': '2026-10-01'},
+                 {'start': '2026-01-01', 'end': '2027-01-02'}):
+        with pytest.raises(ValueError):
+            parse_range(args, TERMS)
+    with pytest.raises(ValueError):
+        term_starts('13-01')
+
+
+def test_month_scopes_span_the_year_end():
+    assert month_scopes(date(2026, 11, 20), date(2027, 1, 5)) == ['events:2026-11', 'events:2026-12',
+                                                                  'events:2027-01']
+
+
+def test_range_summary_counts_days_and_keeps_first_events(conn, events):
+    summary = range_summary(conn, date(2026, 10, 19), date(2026, 10, 25), 'week', TERMS, per_day=2)
+
+    busy = summary['days']['2026-10-20']
+    assert busy['count'] == 4
+    assert [event['name'] for event in busy['events']] == ['Choir', 'Match 09:00']
+    assert busy['events'][0]['series_id'] is not None
+    assert summary['days']['2026-10-22']['count'] == 1
+    assert summary['total'] == 5
+    assert summary['periods'] == [{'label': 'Week of 2026-10-19', 'start': '2026-10-19', 'end': '2026-10-25',
+                                   'count': 5}]
+    assert summary['prev'] == {'start': '2026-10-12', 'end': '2026-10-18'}
+
+
+def test_per_day_zero_still_counts_every_day(conn, events):
+    summary = range_summary(conn, date(2026, 10, 1), date(2026, 11, 30), 'month', TERMS, per_day=0)
+    assert {day: entry['count'] for day, entry in summary['days'].items()} == {
+        '2026-10-06': 1, '2026-10-13': 1, '2026-10-20': 4, '2026-10-22': 1, '2026-10-27': 1, '2026-11-02': 1,
+    }
+    assert all(entry['events'] == [] for entry in summary['days'].values())
+    assert [period['count'] for period in summary['periods']] == [8, 1]
+
+
+def test_calendar_api_rejects_a_bad_range(client):
+    response = client.get('/api/calendar?start=2026-10-31&end=2026-10-01')
+    assert response.status_code == 400
+    assert client.get('/api/calendar?granularity=term&date=2026-10-20').get_json()['start'] == '2026-09-01'
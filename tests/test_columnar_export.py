@@ -0,0 +1,35 @@
+import gzip
+import hashlib
+import json
+
+from columnar_export import export_directory, iter_lines
+
+
+def test_batches_are_typed_columns(conn, add_event):
+    add_event(event_date='1970-01-02', start_time='09:30', end_time='10:00:30')
+    add_event(start_time='25:00')
+    summary = {}
+    lines = [json.loads(line) for line in iter_lines(conn.execute('SELECT * FROM events ORDER BY id'), 'events',
+                                                     batch_rows=1, summary=summary)]
+    assert lines[0]['schema']['fields'][3] == {'name': 'event_date', 'type': 'date32[day]'}
+    first, second = lines[1], lines[2]
+    assert (first['batch'], first['rows']) == (0, 1)
+    assert first['columns']['event_date'] == [1]
+    assert first['columns']['start_time'] == [9 * 3600 + 30 * 60]
+    assert first['columns']['end_time'] == [10 * 3600 + 30]
+    assert second['columns']['start_time'] == [None]
+    assert lines[-1]['manifest'] == dict(summary)
+    assert summary['rows'] == 2 and summary['batches'] == 2
+    assert summary['invalid'] == {'start_time': 1}
+
+
+def test_export_directory_writes_a_checked_manifest(database, add_event, tmp_path):
+    add_event()
+    out_dir = tmp_path / 'out'
+    manifest = export_directory(database, str(out_dir), ['events'])
+    assert json.loads((out_dir / 'manifest.json').read_text()) == manifest
+    info = manifest['files']['events']
+    data = (out_dir / info['path']).read_bytes()
+    assert hashlib.sha256(data).hexdigest() == info['sha256']
+    lines = gzip.decompress(data).decode().splitlines()
+    assert info['rows'] == 1 and len(lines) == 3
@@ -0,0 +1,106 @@
+import threading
+import time
+
+from ai_event import EventExtractor, FakeModel, FakeResponse
+
+
+class CountingModel(FakeModel):
+    """FakeModel that records the most calls it had in flight at once."""
+
+    def __init__(self, latency):
+        super().__init__(latency=latency)
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, parts):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            return super().generate_content(parts)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class ServiceUnavailable(Exception):
+    """Named like google.api_core's 503 error, which is retried by class name."""
+
+
+class FlakyModel:
+    """Fails the first `failures` calls with a transient error, then answers."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def generate_content(self, parts):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ServiceUnavailable('503 Service Unavailable')
+        return FakeResponse('{"event_name": "Fair", "confidence": "high"}')
+
+
+def write_images(tmp_path, make_image, count):
+    paths = []
+    for index in range(count):
+        path = tmp_path / f'poster-{index}.png'
+        path.write_bytes(make_image(100 + index, 100))
+        paths.append(str(path))
+    return paths
+
+
+def test_iter_extract_overlaps_model_calls(tmp_path, make_image):
+    paths = write_images(tmp_path, make_image, 6)
+    model = CountingModel(latency=0.1)
+    extractor = EventExtractor(model_name='fake', model=model)
+
+    started = time.monotonic()
+    results = dict(extractor.iter_extract(paths, concurrency=3))
+    elapsed = time.monotonic() - started
+
+    assert sorted(results) == sorted(paths)
+    assert all(result['event_name'] == 'Sample Event' for result in results.values())
+    assert model.peak == 3
+    assert elapsed < 0.5
+
+
+def test_process_multiple_images_keeps_failures(tmp_path, make_image):
+    paths = write_images(tmp_path, make_image, 2) + [str(tmp_path / 'missing.png')]
+    extractor = EventExtractor(model_name='fake', model=FakeModel())
+
+    results = extractor.process_multiple_images(paths, concurrency=2)
+
+    assert len(results) == 3
+    failed = [result for result in results if result.get('error')]
+    assert [result['source_image'] for result in failed] == ['missing.png']
+
+
+def test_transient_errors_are_retried(tmp_path, make_image):
+    model = FlakyModel(failures=2)
+    extractor = EventExtractor(model_name='fake', model=model, backoff=0.01)
+    result = extractor.extract_event_info(write_images(tmp_path, make_image, 1)[0], display=False)
+    assert result['event_name'] == 'Fair'
+    assert model.calls == 3
+
+
+def test_retries_stop_at_max_retries(tmp_path, make_image):
+    model = FlakyModel(failures=5)
+    extractor = EventExtractor(model_name='fake', model=model, max_retries=1, backoff=0.01)
+    result = extractor.extract_event_info(write_images(tmp_path, make_image, 1)[0], display=False)
+    assert '503' in result['error']
+    assert model.calls == 2
+
+
+def test_other_errors_are_not_retried(tmp_path, make_image):
+    class BrokenModel(FakeModel):
+        def generate_content(self, parts):
+            self.calls += 1
+            raise ValueError('bad request')
+
+    model = BrokenModel()
+    extractor = EventExtractor(model_name='fake', model=model, backoff=0.01)
+    result = extractor.extract_event_info(write_images(tmp_path, make_image, 1)[0], display=False)
+    assert result['error'] == 'Error processing image: bad request'
+    assert model.calls == 1
@@ -0,0 +1,114 @@
+import pytest
+from flask import Flask
+
+import db
+from db import ConnectionPool, PoolTimeout, WriteQueue
+
+
+@pytest.fixture
+def pool(database):
+    pool = ConnectionPool(database, max_size=2, timeout=0.1)
+    yield pool
+    pool.close_all()
+
+
+def test_released_connections_are_reused(pool):
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert pool.stats()['created'] == 1 and pool.stats()['reused'] == 1
+
+
+def test_acquire_times_out_when_the_pool_is_exhausted(pool):
+    pool.acquire()
+    pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+
+
+def test_release_rolls_back_an_open_transaction(pool):
+    conn = pool.acquire()
+    conn.execute("INSERT INTO duty_personnel (name) VALUES ('Ms Rao')")
+    assert conn.in_transaction
+    pool.release(conn)
+    assert pool.acquire().execute('SELECT COUNT(*) FROM duty_personnel').fetchone()[0] == 0
+
+
+def test_broken_idle_connection_is_replaced(database):
+    pool = ConnectionPool(database, health_check_after=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.close()
+    assert pool.acquire() is not conn
+    assert pool.stats()['discarded'] == 1
+    assert pool.health_check()
+
+
+def test_pool_inherited_through_fork_starts_over(pool):
+    conn = pool.acquire()
+    pool.release(conn)
+    pool._pid = -1  # as if this process were a forked child
+    assert pool.acquire() is not conn
+    stats = pool.stats()
+    assert (stats['created'], stats['reused'], stats['in_use']) == (1, 0, 1)
+
+
+@pytest.fixture
+def queue(database):
+    queue = WriteQueue(database)
+    yield queue
+    queue.stop()
+
+
+def insert(conn):
+    return conn.execute("INSERT INTO duty_personnel (name) VALUES ('Ms Rao')").lastrowid
+
+
+def count(conn):
+    return conn.execute('SELECT COUNT(*) FROM duty_personnel').fetchone()[0]
+
+
+def test_failed_job_is_rolled_back(queue):
+    def fail(conn):
+        insert(conn)
+        raise ValueError('no')
+
+    with pytest.raises(ValueError):
+        queue.run(fail)
+    assert queue.run(count) == 0
+    assert queue.stats()['failed'] == 1
+
+
+def test_queue_restarts_after_stop(queue):
+    assert queue.run(insert) == 1
+    queue.stop()
+    assert queue.run(insert) == 2
+    assert queue.stats()['completed'] == 2
+
+
+def test_nested_job_runs_inside_the_outer_transaction(queue):
+    def outer(conn):
+        insert(conn)
+        queue.run(insert)
+        raise ValueError('no')
+
+    with pytest.raises(ValueError):
+        queue.run(outer)
+    assert queue.run(count) == 0
+
+
+def test_write_from_the_writer_thread_does_not_deadlock(database):
+    app = Flask(__name__)
+    app.config['DATABASE'] = database
+    db.init_app(app)
+
+    def job(conn):
+        insert(conn)
+        return db.write(insert), insert(db.get_db())
+
+    try:
+        with app.app_context():
+            assert db.write(job) == (2, 3)
+            assert db.write(count) == 3
+    finally:
+        app.extensions['db_writer'].stop()
@@ -0,0 +1,72 @@
+import io
+
+import pytest
+
+from bulk_import import insert_duties, validate_duty
+from duty_conflicts import DutyConflict, audit, check_assignment
+
+
+def duty_row(event_id, **fields):
+    record = {
+        'event_id': str(event_id), 'person_name': 'Ms Rao', 'duty_type': 'Gate', 'duty_date': '2026-10-20',
+        'start_time': '09:00', 'end_time': '10:00', 'location': 'Main Gate',
+    }
+    record.update(fields)
+    return validate_duty(record)
+
+
+@pytest.fixture
+def event_id(add_event):
+    return add_event()
+
+
+def test_insert_duties_checks_existing_and_earlier_rows(conn, event_id):
+    assert insert_duties(conn, [(2, duty_row(event_id))]) == (1, [])
+    batch = [
+        (2, duty_row(event_id, start_time='09:30', end_time='10:30')),
+        (3, duty_row(event_id, start_time='10:00', end_time='11:00')),
+        (4, duty_row(event_id, start_time='10:30', end_time='11:30')),
+        (5, duty_row(event_id, person_name='Mr Das', start_time='09:30')),
+        (6, duty_row(event_id + 1)),
+    ]
+    inserted, errors = insert_duties(conn, batch)
+    assert inserted == 2
+    assert [line for line, _ in errors] == [6, 2, 4]
+    assert errors[1][1] == 'Ms Rao is already on duty on 2026-10-20 at 09:00-10:00 (Sports Day)'
+
+
+def test_insert_duties_force_allows_double_booking(conn, event_id):
+    batch = [(2, duty_row(event_id)), (3, duty_row(event_id, start_time='09:30'))]
+    assert insert_duties(conn, batch, force=True) == (2, [])
+    with pytest.raises(DutyConflict):
+        person_id = conn.execute('SELECT id FROM duty_personnel').fetchone()[0]
+        check_assignment(conn, person_id, 'Ms Rao', '2026-10-20', '09:15', '09:45')
+
+
+def test_audit_reports_overlaps_for_a_missing_person(conn, event_id):
+    insert_duties(conn, [(2, duty_row(event_id)), (3, duty_row(event_id, start_time='09:30')),
+                         (4, duty_row(event_id, start_time='10:00', end_time='11:00'))], force=True)
+    conn.execute('DELETE FROM duty_personnel')
+    conflicts = audit(conn)
+    # The 10:00 duty only touches the 09:30-10:00 one.
+    assert len(conflicts) == 1
+    assert conflicts[0]['person_name'] == f"Person {conflicts[0]['person_id']}"
+    assert [duty['start_time'] for duty in conflicts[0]['duties']] == ['09:00', '09:30']
+
+
+def test_duty_import_reports_double_booking_under_warn(client, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'VENUE_CLASHES', 'warn')
+    event = {'name': 'Sports Day', 'type': 'sports', 'event_date': '2026-10-20', 'start_time': '09:00',
+             'end_time': '11:00', 'venue': 'Main Hall', 'host_school': 'ABC'}
+    assert client.post('/api/events/batch', json={'events': [event]}).status_code == 201
+    event_id = client.get('/api/events').get_json()[0]['id']
+    rows = (f'event_id,person_name,duty_type,duty_date,start_time,end_time,location\n'
+            f'{event_id},Ms Rao,Gate,2026-10-20,09:00,10:00,Main Gate\n'
+            f'{event_id},Ms Rao,Hall,2026-10-20,09:30,10:30,Main Hall\n')
+
+    response = client.post('/import/duties', data={'file': (io.BytesIO(rows.encode()), 'duties.csv')})
+    assert response.status_code == 207
+    assert response.get_json()['inserted'] == 1
+
+    response = client.post('/import/duties', data={'file': (io.BytesIO(rows.encode()), 'duties.csv'), 'force': '1'})
+    assert response.get_json()['inserted'] == 2
@@ -0,0 +1,51 @@
+import csv
+import gzip
+import io
+from datetime import date
+
+import exports
+from db import ConnectionPool
+from exports import EXPORTS, REPORT_SECTIONS, event_window_export, gzip_stream, iter_csv
+from recurrence import insert_series, validate_series
+
+
+def read_csv(chunks):
+    return list(csv.reader(io.StringIO(''.join(chunks))))
+
+
+def test_rows_stream_in_chunks(database, add_event, monkeypatch):
+    monkeypatch.setattr(exports, 'CHUNK_ROWS', 2)
+    for day in range(1, 6):
+        add_event(event_date=f'2026-10-{day:02d}')
+    chunks = list(iter_csv(ConnectionPool(database), [(None, EXPORTS['events'])]))
+    assert len(chunks) == 3
+    rows = read_csv(chunks)
+    assert rows[0][:4] == ['ID', 'Name', 'Type', 'Date']
+    assert [row[3] for row in rows[1:]] == [f'2026-10-{day:02d}' for day in range(1, 6)]
+
+
+def test_report_sections_are_titled_and_separated(database, add_event):
+    add_event(description='line one\nline "two"')
+    rows = read_csv(iter_csv(ConnectionPool(database), REPORT_SECTIONS))
+    titles = [row[0] for row in rows if len(row) == 1]
+    assert titles == ['Events Report', 'Participants Report', 'Duties Report']
+    assert rows[rows.index(['Participants Report']) - 1] == []
+
+
+def test_gzip_stream_round_trips():
+    chunks = ['a,b\r\n', '1,2\r\n']
+    assert gzip.decompress(b''.join(gzip_stream(chunks))).decode() == ''.join(chunks)
+
+
+def test_window_export_merges_series_occurrences(database, conn, add_event):
+    add_event(name='Sports Day', event_date='2026-10-20', start_time='09:00')
+    add_event(name='Outside', event_date='2026-12-01')
+    insert_series(conn, validate_series({
+        'name': 'Choir', 'type': 'cultural', 'event_date': '2026-10-13', 'start_time': '08:00', 'end_time': '09:00',
+        'venue': 'Music Room', 'host_school': 'ABC', 'frequency': 'weekly', 'count': '3',
+    }))
+    rows = read_csv(iter_csv(ConnectionPool(database),
+                             [(None, event_window_export(date(2026, 10, 1), date(2026, 10, 31)))]))
+    assert [(row[1], row[3]) for row in rows[1:]] == [
+        ('Choir', '2026-10-13'), ('Choir', '2026-10-20'), ('Sports Day', '2026-10-20'), ('Choir', '2026-10-27')]
+    assert rows[1][-1] == '1' and rows[3][-1] == ''
@@ -0,0 +1,80 @@
+import io
+
+import pytest
+
+from ai_event import EventExtractor, FakeModel
+from extraction_cache import ExtractionCache, cache_key, variant_for
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ExtractionCache(str(tmp_path / 'cache.db'))
+    yield cache
+    cache.close()
+
+
+def test_key_depends_on_image_and_variant():
+    variant = variant_for('gemini', 'prompt', 1000)
+    assert cache_key(b'image', variant) == cache_key(b'image', variant)
+    assert cache_key(b'image', variant) != cache_key(b'other', variant)
+    assert cache_key(b'image', variant) != cache_key(b'image', variant_for('gemini', 'prompt', 2000))
+    assert variant != variant_for('fake', 'prompt', 1000)
+
+
+def test_second_extraction_of_an_image_is_a_hit(cache, make_image):
+    model = FakeModel()
+    extractor = EventExtractor(model_name='fake', model=model, cache=cache)
+    image = make_image()
+
+    first = extractor.extract_event_info(io.BytesIO(image), source_name='a.png', display=False)
+    second = extractor.extract_event_info(io.BytesIO(image), source_name='b.png', display=False)
+
+    assert model.calls == 1
+    assert 'cache_hit' not in first
+    assert second['cache_hit'] is True
+    assert second['source_image'] == 'b.png'
+    assert second['event_name'] == first['event_name']
+    assert cache.stats()['hits'] == 1
+
+
+def test_preprocessing_options_change_the_key(cache, make_image):
+    model = FakeModel()
+    image = make_image()
+    for max_pixels in (10000, 20000):
+        extractor = EventExtractor(model_name='fake', model=model, cache=cache, max_pixels=max_pixels)
+        extractor.extract_event_info(io.BytesIO(image), display=False)
+    assert model.calls == 2
+
+
+def test_failed_parse_is_not_cached(cache, make_image):
+    model = FakeModel('no json here')
+    extractor = EventExtractor(model_name='fake', model=model, cache=cache)
+    result = extractor.extract_event_info(io.BytesIO(make_image()), display=False)
+    assert result['error'].startswith('Failed to parse JSON response')
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    cache.max_bytes = 250
+    cache.set('a', 'fake', {'text': 'a' * 80})
+    cache.set('b', 'fake', {'text': 'b' * 80})
+    cache.get('a')
+    cache.set('c', 'fake', {'text': 'c' * 80})
+    assert cache.get('b') is None
+    assert cache.get('a') == {'text': 'a' * 80}
+    assert cache.stats()['evictions'] == 1
+
+
+def test_counters_survive_a_new_process(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    first = ExtractionCache(path)
+    first.set('k', 'fake', {'event_name': 'Fair'})
+    first.get('k')
+    first.get('missing')
+    first.close()
+
+    second = ExtractionCache(path)
+    stats = second.stats()
+    second.close()
+    assert stats['hits'] == 0
+    assert (stats['lifetime_hits'], stats['lifetime_misses']) == (1, 1)
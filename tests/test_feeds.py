@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+from datetime import date, timedelta
+
+from feeds import FeedStore, _line
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOMAIN = 'events.example.org'
+SOON = (date.today() + timedelta(days=3)).isoformat()
+
+
+def test_long_lines_fold_at_75_octets():
+    folded = _line('DESCRIPTION', 'é' * 60)
+    lines = folded.split('\r\n')
+    assert all(len(line.encode()) <= 75 for line in lines)
+    assert all(line.startswith(' ') for line in lines[1:-1])
+
+
+def test_unrelated_changes_patch_without_changing_the_body(conn, add_event):
+    add_event(event_date=SOON)
+    store = FeedStore()
+    feed = store.get(conn, 'venue', 'main  hall', 90, DOMAIN)
+    assert b'SUMMARY:Sports Day' in feed.body
+    etag = feed.etag
+
+    add_event(name='Swim Meet', venue='Pool', event_date=SOON)
+    assert store.get(conn, 'venue', 'Main Hall', 90, DOMAIN).etag == etag
+    assert (store.builds, store.patches) == (1, 1)
+
+    add_event(name='Prize Giving', event_date=SOON)
+    feed = store.get(conn, 'venue', 'Main Hall', 90, DOMAIN)
+    assert feed.etag != etag and b'SUMMARY:Prize Giving' in feed.body
+    assert (store.builds, store.patches) == (1, 2)
+
+
+def test_deleted_event_leaves_the_feed(conn, add_event):
+    event_id = add_event(event_date=SOON)
+    store = FeedStore()
+    store.get(conn, 'venue', 'Main Hall', 90, DOMAIN)
+    conn.execute('DELETE FROM events WHERE id = ?', (event_id,))
+    assert b'Sports Day' not in store.get(conn, 'venue', 'Main Hall', 90, DOMAIN).body
+
+
+def test_feed_too_far_behind_is_rebuilt(conn, add_event):
+    store = FeedStore(max_changes=2)
+    store.get(conn, 'school', 'ABC', 90, DOMAIN)
+    for name in ('One', 'Two', 'Three'):
+        add_event(name=name, event_date=SOON)
+    feed = store.get(conn, 'school', 'abc', 90, DOMAIN)
+    assert (store.builds, store.patches) == (2, 0)
+    assert feed.body.count(b'BEGIN:VEVENT') == 3
+
+
+def test_subscription_url_serves_the_feed(client):
+    event = {'name': 'Sports Day', 'type': 'sports', 'event_date': SOON, 'start_time': '09:00',
+             'end_time': '11:00', 'venue': 'Main Hall', 'host_school': 'ABC'}
+    client.post('/api/events/batch', json={'events': [event]})
+    url = client.get('/api/feeds?kind=venue&key=Main Hall').get_json()['url']
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/calendar'
+    assert b'SUMMARY:Sports Day' in response.data
+    assert client.get(url, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    assert client.get('/feeds/venue/main hall.ics?token=0123').status_code == 403
+
+
+def test_feeds_are_not_served_without_a_secret(tmp_path):
+    env = dict(os.environ, DATABASE=str(tmp_path / 'events.db'), EXTRACTION_CACHE='', ICS_SECRET='')
+    script = 'import app; print(sorted(str(rule) for rule in app.app.url_map.iter_rules() if "feeds" in str(rule)))'
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env, capture_output=True, text=True,
+                            check=True).stdout
+    assert output.splitlines()[-1] == '[]'
@@ -0,0 +1,74 @@
+import io
+
+import pytest
+from PIL import Image, ImageDraw, UnidentifiedImageError
+
+from image_prep import prepare_image
+
+
+def decode(data):
+    return Image.open(io.BytesIO(data))
+
+
+def test_large_image_is_downscaled_to_the_budget(make_image):
+    data = make_image(4000, 3000, format='JPEG')
+    upload, mime_type, stats = prepare_image(data, max_pixels=1_000_000)
+
+    width, height = decode(upload).size
+    assert mime_type == 'image/jpeg'
+    assert width * height <= 1_000_000
+    assert abs(width / height - 4 / 3) < 0.01
+    assert stats['original_size'] == [4000, 3000]
+    assert stats['upload_size'] == [width, height]
+    assert stats['bytes_saved'] == len(data) - len(upload)
+
+
+def test_small_image_is_sent_unchanged(make_image):
+    data = make_image(200, 100, format='PNG')
+    upload, mime_type, stats = prepare_image(data)
+    assert upload == data
+    assert mime_type == 'image/png'
+    assert stats['bytes_saved'] == 0
+
+
+def test_no_budget_sends_the_original_bytes(make_image):
+    data = make_image(4000, 3000, format='JPEG')
+    upload, mime_type, stats = prepare_image(data, max_pixels=None)
+    assert upload == data
+    assert mime_type == 'image/jpeg'
+
+
+def test_exif_orientation_is_applied(make_image):
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90 degrees clockwise
+    data = make_image(300, 100, format='JPEG', exif=exif)
+    upload, _, _ = prepare_image(data)
+    assert decode(upload).size == (100, 300)
+
+
+def test_margins_are_cropped_on_request():
+    image = Image.new('RGB', (400, 400), 'white')
+    ImageDraw.Draw(image).rectangle((150, 150, 249, 249), fill='black')
+    out = io.BytesIO()
+    image.save(out, 'PNG')
+
+    kept, _, _ = prepare_image(out.getvalue())
+    cropped, _, stats = prepare_image(out.getvalue(), crop_margins=True)
+
+    assert decode(kept).size == (400, 400)
+    assert decode(cropped).size == (116, 116)
+    assert stats['upload_size'] == [116, 116]
+
+
+def test_transparency_is_flattened_on_white():
+    image = Image.new('RGBA', (200, 200), (0, 0, 0, 0))
+    out = io.BytesIO()
+    image.save(out, 'PNG')
+    upload, mime_type, _ = prepare_image(out.getvalue(), max_pixels=10_000)
+    assert mime_type == 'image/jpeg'
+    assert decode(upload).getpixel((50, 50)) == (255, 255, 255)
+
+
+def test_non_image_is_rejected():
+    with pytest.raises(UnidentifiedImageError):
+        prepare_image(b'not an image')
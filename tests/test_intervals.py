@@ -0,0 +1,41 @@
+from intervals import IntervalIndex, time_interval, to_minutes
+
+
+def test_to_minutes_reads_stored_formats():
+    assert to_minutes('09:30') == 570
+    assert to_minutes('2:15 PM') == 855
+    assert to_minutes('not a time') is None
+
+
+def test_time_interval_handles_missing_or_backwards_end():
+    assert time_interval('09:00', '10:00') == (540, 600)
+    assert time_interval('09:00', '') == (540, 541)
+    assert time_interval('10:00', '09:00') == (600, 601)
+    assert time_interval('', '10:00') is None
+
+
+def test_touching_intervals_do_not_overlap():
+    index = IntervalIndex()
+    index.add('hall', 540, 600, 'morning')
+    assert index.overlapping('hall', 600, 660) == []
+    assert index.overlapping('hall', 480, 540) == []
+    assert index.overlapping('hall', 599, 660) == ['morning']
+
+
+def test_long_interval_is_found_from_a_later_start():
+    index = IntervalIndex()
+    index.add('hall', 0, 1440, 'all day')
+    index.add('hall', 600, 660, 'short')
+    assert sorted(index.overlapping('hall', 1000, 1010)) == ['all day']
+    assert index.overlapping('other', 0, 1440) == []
+
+
+def test_remove_and_len():
+    index = IntervalIndex()
+    index.add('hall', 540, 600, 'a')
+    index.add('hall', 570, 630, 'b')
+    assert len(index) == 2
+    assert index.remove('hall', 'a')
+    assert not index.remove('hall', 'a')
+    assert index.overlapping('hall', 540, 560) == []
+    assert [item for _, _, item in index.intervals('hall')] == ['b']
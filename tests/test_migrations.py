@@ -0,0 +1,20 @@
+import migrations
+
+
+def test_migrate_applies_each_version_once(tmp_path):
+    database = str(tmp_path / 'events.db')
+    assert migrations.migrate(database, target=3) == [1, 2, 3]
+    latest = [version for version, _, _ in migrations.MIGRATIONS]
+    assert migrations.migrate(database) == latest[3:]
+    assert migrations.migrate(database) == []
+
+
+def test_hot_queries_use_their_indexes(conn):
+    assert migrations.check_query_plans(conn) == []
+
+
+def test_missing_index_is_reported(conn):
+    conn.execute('DROP INDEX idx_duties_person_date')
+    failures = migrations.check_query_plans(conn)
+    assert {name for name, _, _ in failures} == {'person feed duties', 'duties for person on date'}
+    assert all(index == 'idx_duties_person_date' for _, index, _ in failures)
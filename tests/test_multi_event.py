@@ -0,0 +1,75 @@
+import io
+from datetime import date
+
+from ai_event import EventExtractor, FakeModel
+from event_normalize import normalize_date, normalize_event, normalize_time_range
+
+TODAY = date(2026, 10, 17)
+SCHEDULE = {'events': [
+    {'event_name': 'Chess Final', 'date': 'Monday, 2nd November', 'time': '10 - 11:30 am', 'location': 'Library',
+     'event_type': 'Academic'},
+    {'event_name': 'Debate', 'date': '03/11/2026', 'time': '2:00 PM', 'location': 'Hall B'},
+], 'confidence': 'high'}
+
+
+def test_dates_and_times_are_normalized():
+    assert normalize_date('Sept. 14th, 2026') == '2026-09-14'
+    assert normalize_date('14.09.2026') == '2026-09-14'
+    assert normalize_date('2 Jan', TODAY) == '2027-01-02'
+    assert normalize_date('1 Sep', TODAY) == '2026-09-01'
+    assert normalize_date('someday') is None
+    assert normalize_time_range('10 - 11:30 am') == ('10:00', '11:30')
+    assert normalize_time_range('noon to 2 pm') == ('12:00', '14:00')
+
+
+def test_missing_fields_are_reported():
+    event = normalize_event({'event_name': 'Fair', 'time': '9 am'}, TODAY)
+    assert event['start_time'] == '09:00'
+    assert event['end_time'] == '10:00'
+    assert event['type'] == 'other'
+    assert 'date not recognised' in event['warnings']
+    assert 'venue not found' in event['warnings']
+
+
+def test_extract_events_returns_every_event(make_image):
+    extractor = EventExtractor(model_name='fake', model=FakeModel(SCHEDULE))
+    result = extractor.extract_events(io.BytesIO(make_image()), today=TODAY)
+
+    chess, debate = result['events']
+    assert (chess['name'], chess['type'], chess['event_date']) == ('Chess Final', 'academic', '2026-11-02')
+    assert (chess['start_time'], chess['end_time']) == ('10:00', '11:30')
+    assert (debate['venue'], debate['event_date'], debate['start_time']) == ('Hall B', '2026-11-03', '14:00')
+
+
+def test_single_event_reply_becomes_a_list(make_image):
+    extractor = EventExtractor(model_name='fake', model=FakeModel({'event_name': 'Fair', 'date': '2026-11-05'}))
+    result = extractor.extract_events(io.BytesIO(make_image()), today=TODAY)
+    assert [event['name'] for event in result['events']] == ['Fair']
+
+
+def test_batch_inserts_all_events(client):
+    events = [
+        {'name': 'Chess Final', 'type': 'academic', 'event_date': '2026-11-02', 'start_time': '10:00',
+         'end_time': '11:30', 'venue': 'Library'},
+        {'name': 'Debate', 'type': 'other', 'event_date': '2026-11-03', 'start_time': '14:00',
+         'end_time': '15:00', 'venue': 'Hall B'},
+    ]
+    response = client.post('/api/events/batch', json={'events': events, 'host_school': 'ABC'})
+    assert response.status_code == 201
+    assert response.get_json()['inserted'] == 2
+
+    names = client.get('/api/events').get_json()
+    assert {event['name'] for event in names} >= {'Chess Final', 'Debate'}
+
+
+def test_batch_with_an_invalid_event_inserts_nothing(client):
+    events = [
+        {'name': 'Chess Final', 'type': 'academic', 'event_date': '2026-11-02', 'start_time': '10:00',
+         'end_time': '11:30', 'venue': 'Library', 'host_school': 'ABC'},
+        {'name': 'Debate', 'type': 'other', 'event_date': 'soon', 'start_time': '14:00',
+         'end_time': '15:00', 'venue': 'Hall B', 'host_school': 'ABC'},
+    ]
+    response = client.post('/api/events/batch', json={'events': events})
+    assert response.status_code == 400
+    assert [error['index'] for error in response.get_json()['errors']] == [1]
+    assert client.get('/api/events').get_json() == []
@@ -0,0 +1,49 @@
+import json
+import os
+import subprocess
+import sys
+
+import scan_jobs
+from scan_jobs import missing_packages
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_the_app_does_not_load_the_ai_stack(tmp_path):
+    env = dict(os.environ, DATABASE=str(tmp_path / 'events.db'), EXTRACTION_CACHE=str(tmp_path / 'cache.db'))
+    script = ('import json, sys, app; '
+              'print(json.dumps([name for name in ("PIL", "google.generativeai") if name in sys.modules]))')
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env, capture_output=True, text=True,
+                            check=True).stdout
+    assert json.loads(output.splitlines()[-1]) == []
+
+
+def test_missing_packages_depend_on_model_and_backend(monkeypatch):
+    monkeypatch.setattr(scan_jobs, '_installed', lambda module: module == 'PIL')
+    assert missing_packages('gemini-1.5-flash') == ['google-generativeai']
+    assert missing_packages('fake') == []
+    assert missing_packages('gemini-1.5-flash', 'local') == ['pytesseract']
+    assert missing_packages('gemini-1.5-flash', 'auto') == ['google-generativeai', 'pytesseract']
+
+    monkeypatch.setattr(scan_jobs, '_installed', lambda module: module in ('PIL', 'tesserocr'))
+    assert missing_packages('fake', 'auto') == []
+
+
+def test_scan_is_refused_when_unavailable(client, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'SCAN_ENABLED', False)
+    response = client.post('/api/scan-event', data={})
+    assert response.status_code == 503
+    assert response.get_json()['error'] == 'Image scanning is disabled on this server.'
+
+    monkeypatch.setitem(app.config, 'SCAN_ENABLED', True)
+    monkeypatch.setitem(app.config, 'SCAN_BACKEND', 'cloud')
+    response = client.post('/api/scan-event', data={})
+    assert response.status_code == 503
+    assert 'Unknown SCAN_BACKEND' in response.get_json()['error']
+
+
+def test_scan_reports_missing_packages(client, app, monkeypatch):
+    monkeypatch.setattr(scan_jobs, '_installed', lambda module: False)
+    response = client.post('/api/scan-event', data={})
+    assert response.status_code == 503
+    assert 'pillow' in response.get_json()['error']
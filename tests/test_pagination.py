@@ -0,0 +1,50 @@
+import pytest
+
+from db import ConnectionPool
+from pagination import InvalidCursor, KeysetQuery, decode_cursor, encode_cursor, fetch_page, iter_rows
+
+EVENTS = KeysetQuery('SELECT * FROM events e', ['e.event_date', 'e.start_time', 'e.id'],
+                     ['event_date', 'start_time', 'id'])
+
+
+def test_cursor_round_trip():
+    values = ['2026-10-20', '09:00', 42]
+    token = encode_cursor(values)
+    assert '=' not in token
+    assert decode_cursor(token, 3) == values
+
+
+@pytest.mark.parametrize('token', ['!!!', encode_cursor({'a': 1}), encode_cursor([1, 2])])
+def test_bad_cursors_are_rejected(token):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, 3)
+
+
+def test_pages_cover_every_row_once_across_ties(conn, add_event):
+    # Same date and time on most rows, so only the id keeps the order unique.
+    ids = [add_event(event_date='2026-10-20', start_time='09:00') for _ in range(5)]
+    ids.insert(0, add_event(event_date='2026-10-19'))
+    seen, after = [], None
+    while True:
+        rows, cursor = fetch_page(conn, EVENTS, after, limit=2)
+        seen += [row['id'] for row in rows]
+        if cursor is None:
+            break
+        after = EVENTS.decode(cursor)
+    assert seen == ids
+
+
+def test_last_full_page_has_no_next_cursor(conn, add_event):
+    add_event()
+    add_event()
+    rows, cursor = fetch_page(conn, EVENTS, limit=2)
+    assert len(rows) == 2 and cursor is None
+
+
+def test_iter_rows_streams_after_a_cursor(database, conn, add_event):
+    first = add_event(event_date='2026-10-19')
+    rest = [add_event(), add_event()]
+    pool = ConnectionPool(database)
+    after = EVENTS.decode(EVENTS.cursor_for(conn.execute('SELECT * FROM events WHERE id = ?', (first,)).fetchone()))
+    assert [row['id'] for row in iter_rows(pool, EVENTS, after)] == rest
+    assert pool.stats()['in_use'] == 0
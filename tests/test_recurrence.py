@@ -0,0 +1,88 @@
+from datetime import date
+
+import pytest
+
+from bulk_import import RowError
+from db import get_db
+from recurrence import expand, insert_series, occurrence_dates, set_exception, validate_series
+
+SERIES = {
+    'name': 'Choir', 'type': 'cultural', 'event_date': '2026-10-20', 'start_time': '15:00', 'end_time': '16:00',
+    'venue': 'Music Room', 'host_school': 'ABC',
+}
+
+
+def series_row(**fields):
+    return validate_series(dict(SERIES, **fields))
+
+
+def test_weekly_dates_with_interval_and_weekdays():
+    row = series_row(frequency='weekly', interval='2', weekdays='tue,thu')
+    days = list(occurrence_dates(row, date(2026, 10, 1), date(2026, 11, 7)))
+    assert [day.isoformat() for day in days] == ['2026-10-20', '2026-10-22', '2026-11-03', '2026-11-05']
+
+
+def test_window_far_after_start_is_computed_directly():
+    row = series_row(frequency='daily', interval='3')
+    days = list(occurrence_dates(row, date(2030, 1, 1), date(2030, 1, 7)))
+    assert all((day - date(2026, 10, 20)).days % 3 == 0 for day in days)
+    assert len(days) == 2
+
+
+def test_monthly_skips_months_without_the_day():
+    row = series_row(frequency='monthly', event_date='2027-01-31', count='3')
+    days = list(occurrence_dates(row, date(2027, 1, 1), date(2027, 12, 31)))
+    assert [day.isoformat() for day in days] == ['2027-01-31', '2027-03-31', '2027-05-31']
+
+
+def test_count_is_stored_as_until():
+    assert series_row(frequency='weekly', count='4')['until_date'] == '2026-11-10'
+
+
+@pytest.mark.parametrize('fields, message', [
+    ({'frequency': 'yearly'}, 'frequency must be one of'),
+    ({'until': '2026-12-01', 'count': '3'}, 'either until or count'),
+    ({'until': '2026-10-01'}, 'until must not be before'),
+    ({'frequency': 'daily', 'weekdays': 'mon'}, 'weekdays only apply'),
+    ({'weekdays': 'mon'}, 'must fall on one of the weekdays'),
+])
+def test_invalid_series(fields, message):
+    with pytest.raises(RowError, match=message):
+        series_row(**fields)
+
+
+def test_expand_applies_cancelled_and_moved_exceptions(conn):
+    series_id = insert_series(conn, series_row(frequency='weekly', count='3'))
+    set_exception(conn, series_id, {'occurrence_date': '2026-10-27', 'cancelled': True})
+    set_exception(conn, series_id, {'occurrence_date': '2026-11-03', 'event_date': '2026-11-05',
+                                    'start_time': '10:00'})
+    events = expand(conn, date(2026, 10, 1), date(2026, 11, 30))
+    assert [(event['event_date'], event['start_time']) for event in events] == [
+        ('2026-10-20', '15:00'), ('2026-11-05', '10:00')]
+    assert events[1]['occurrence_date'] == '2026-11-03'
+
+
+def test_expand_includes_occurrences_moved_into_the_window(conn):
+    series_id = insert_series(conn, series_row(frequency='weekly', until='2026-10-27'))
+    set_exception(conn, series_id, {'occurrence_date': '2026-10-27', 'event_date': '2026-12-01'})
+    events = expand(conn, date(2026, 11, 25), date(2026, 12, 5))
+    assert [event['occurrence_date'] for event in events] == ['2026-10-27']
+
+
+def test_set_exception_rejects_dates_off_the_series(conn):
+    series_id = insert_series(conn, series_row(frequency='weekly'))
+    with pytest.raises(RowError, match='is not an occurrence'):
+        set_exception(conn, series_id, {'occurrence_date': '2026-10-21', 'cancelled': True})
+
+
+def test_delete_all_data_removes_series(client, app):
+    series = dict(SERIES, frequency='weekly', count=3)
+    assert client.post('/api/series', json=series).status_code == 201
+    series_id = client.get('/api/series').get_json()[0]['id']
+    client.post(f'/series/{series_id}/cancel/2026-10-27')
+
+    assert client.post('/delete_all_data').get_json()['success']
+    with app.app_context():
+        conn = get_db()
+        assert conn.execute('SELECT COUNT(*) FROM event_series').fetchone()[0] == 0
+        assert conn.execute('SELECT COUNT(*) FROM event_series_exceptions').fetchone()[0] == 0
@@ -0,0 +1,108 @@
+import io
+
+import pytest
+
+import ai_event
+from ai_event import EventExtractor, FakeModel
+from response_parser import (EVENT_SCHEMA, EVENTS_SCHEMA, ResponseParseError, find_json_object, parse_response,
+                             repair)
+
+
+def test_find_json_object_skips_prose_and_fences():
+    text = 'Here you go:\n```json\n{"event_name": "Fair", "nested": {"a": 1}}\n```\nThanks!'
+    assert find_json_object(text) == '{"event_name": "Fair", "nested": {"a": 1}}'
+
+
+def test_find_json_object_ignores_braces_in_strings():
+    assert find_json_object('{"a": "}{", "b": 2} trailing') == '{"a": "}{", "b": 2}'
+
+
+def test_find_json_object_returns_truncated_tail():
+    assert find_json_object('x {"a": {"b": 1') == '{"a": {"b": 1'
+    assert find_json_object('no object here') is None
+
+
+@pytest.mark.parametrize('broken, expected', [
+    ("{'a': 'b'}", '{"a": "b"}'),
+    ('{“a”: “b”}', '{"a": "b"}'),
+    ('{"a": None, "b": True,}', '{"a": null, "b": true}'),
+    ('{"a": 1, // note\n "b": 2}', '{"a": 1, \n "b": 2}'),
+    ('{"a": "x", "b": [1, 2', '{"a": "x", "b": [1, 2]}'),
+    ('{"a": "cut off', '{"a": "cut off"}'),
+    ('{"a": 1, "b":', '{"a": 1}'),
+])
+def test_repair(broken, expected):
+    assert repair(broken) == expected
+
+
+def test_repair_leaves_literals_inside_strings():
+    assert repair('{"a": "None of it, True",}') == '{"a": "None of it, True"}'
+
+
+def test_parse_response_cleans_placeholders_and_confidence():
+    data, notes = parse_response('{"event_name": "Fair", "location": "N/A", "confidence": "HIGH"}', EVENT_SCHEMA)
+    assert data['event_name'] == 'Fair'
+    assert data['location'] is None
+    assert data['confidence'] == 'high'
+    assert notes == []
+
+
+def test_parse_response_reports_repairs():
+    data, notes = parse_response("{'event_name': 'Fair', 'date': '2026-10-20',", EVENT_SCHEMA)
+    assert data['date'] == '2026-10-20'
+    assert notes == ['repaired malformed JSON']
+
+
+def test_parse_response_wraps_a_single_event_in_a_list():
+    data, _ = parse_response('{"confidence": "low", "events": {"event_name": "Fair"}}', EVENTS_SCHEMA)
+    assert [event['event_name'] for event in data['events']] == ['Fair']
+
+
+def test_parse_response_rejects_unusable_replies():
+    with pytest.raises(ResponseParseError):
+        parse_response('sorry, I cannot read this poster', EVENT_SCHEMA)
+    with pytest.raises(ResponseParseError):
+        parse_response('{"confidence": "low"}', EVENTS_SCHEMA)
+
+
+def test_parse_response_reads_a_bare_event_as_a_list():
+    data, notes = parse_response('{"event_name": "Fair", "date": "2026-10-20"}', EVENTS_SCHEMA)
+    assert [event['event_name'] for event in data['events']] == ['Fair']
+    assert notes == ['"events" missing, reply read as a single item']
+
+
+class ImageOnlyModel(FakeModel):
+    """A local model that, like OCRModel, cannot answer a text-only prompt."""
+    name = 'image-only'
+    follows_prompts = False
+
+
+def extractor_without_api_key(monkeypatch, **options):
+    monkeypatch.setattr(ai_event, '_load_api_key', lambda: None)
+    return EventExtractor(model_name='gemini-1.5-flash', **options)
+
+
+def test_reask_goes_to_the_model_that_replied(make_image):
+    model = FakeModel('the poster says Fair')
+    result = EventExtractor(model_name='fake', model=model).extract_event_info(io.BytesIO(make_image()),
+                                                                               display=False)
+    assert result['error'].startswith('Failed to parse JSON response')
+    assert model.calls == 2
+
+
+def test_local_only_reply_is_not_reasked_of_an_image_only_model(monkeypatch, make_image):
+    local = ImageOnlyModel('{"event_name": ')
+    extractor = extractor_without_api_key(monkeypatch, local=local)
+    result = extractor.extract_events(io.BytesIO(make_image()))
+    assert result['error'].startswith('Failed to parse JSON response')
+    assert local.calls == 1
+
+
+def test_local_reply_is_reasked_locally_in_mixed_mode(make_image):
+    local = FakeModel('{"confidence": "high"}')
+    local.name = 'fake-local'
+    remote = FakeModel()
+    extractor = EventExtractor(model_name='fake', model=remote, local=local)
+    result = extractor.extract_events(io.BytesIO(make_image()))
+    assert result['error'].startswith('Failed to parse JSON response')
+    assert (local.calls, remote.calls) == (2, 0)
@@ -0,0 +1,103 @@
+import pytest
+
+from intervals import IntervalIndex
+from roster import RosterError, generate, solve
+
+
+def position(start, end, duty_date='2026-10-20'):
+    return {'duty_date': duty_date, 'start_time': start, 'end_time': end}
+
+
+def add_person(conn, name):
+    return conn.execute('INSERT INTO duty_personnel (name, designation, school) VALUES (?, "", "")',
+                        (name,)).lastrowid
+
+
+def add_duty(conn, event_id, person_id, start, end, duty_date='2026-10-20'):
+    conn.execute('''
+        INSERT INTO duties (event_id, duty_person_id, duty_type, duty_date, start_time, end_time, location)
+        VALUES (?, ?, 'Gate', ?, ?, ?, 'Main Gate')
+    ''', (event_id, person_id, duty_date, start, end))
+
+
+@pytest.fixture
+def event_id(add_event):
+    return add_event()
+
+
+def test_solve_spreads_load_and_avoids_double_booking():
+    positions = [position('09:00', '10:00'), position('09:00', '10:00'), position('10:00', '11:00')]
+    assignments, unfilled, _ = solve(positions, ['Ana', 'Ben'], IntervalIndex())
+    assert unfilled == []
+    assert sorted(name for index, name in assignments if index < 2) == ['Ana', 'Ben']
+
+
+def test_solve_fills_the_most_constrained_position_first():
+    busy = IntervalIndex()
+    busy.add(('Ben', '2026-10-20'), 540, 600, None)
+    positions = [position('10:00', '11:00'), position('09:30', '10:30')]
+    assignments, unfilled, _ = solve(positions, ['Ana', 'Ben'], busy, max_duties=1)
+    assert unfilled == []
+    assert dict(assignments) == {0: 'Ben', 1: 'Ana'}
+
+
+def test_people_with_the_same_name_are_kept_apart(conn, event_id):
+    busy_rao, free_rao = add_person(conn, 'Ms Rao'), add_person(conn, 'Ms Rao')
+    add_duty(conn, event_id, busy_rao, '09:00', '11:00')
+
+    result = generate(conn, event_id, {'slots': [{'duty_type': 'Hall'}]})
+
+    assert result['unfilled'] == []
+    assert [row['duty_person_id'] for row in result['assignments']] == [free_rao]
+    assert conn.execute('SELECT COUNT(*) FROM duties WHERE duty_person_id = ?', (free_rao,)).fetchone()[0] == 1
+
+
+def test_load_at_the_event_is_counted_per_person(conn, event_id):
+    loaded_rao, other_rao = add_person(conn, 'Ms Rao'), add_person(conn, 'Ms Rao')
+    add_duty(conn, event_id, loaded_rao, '07:00', '08:00')
+
+    result = generate(conn, event_id, {'slots': [{'duty_type': 'Hall', 'count': 2, 'start_time': '09:00',
+                                                  'end_time': '10:00'}], 'max_duties': 1}, dry_run=True)
+    assert [row['duty_person_id'] for row in result['assignments']] == [other_rao]
+    assert len(result['unfilled']) == 1
+
+
+def test_named_person_who_does_not_exist_is_created(conn, event_id):
+    result = generate(conn, event_id, {'slots': [{'duty_type': 'Hall'}], 'people': ['Mr Iyer']})
+    person_id = conn.execute("SELECT id FROM duty_personnel WHERE name = 'Mr Iyer'").fetchone()[0]
+    assert result['assignments'][0]['duty_person_id'] == person_id
+
+
+def test_availability_limits_assignments(conn, event_id):
+    plan = {'slots': [{'duty_type': 'Hall', 'start_time': '09:00', 'end_time': '10:00'}],
+            'people': ['Ana', 'Ben'],
+            'availability': {'Ana': [{'date': '2026-10-20', 'start_time': '12:00', 'end_time': '14:00'}]}}
+    result = generate(conn, event_id, plan, dry_run=True)
+    assert [row['person_name'] for row in result['assignments']] == ['Ben']
+
+
+@pytest.mark.parametrize('start, end', [('10:00', '10:00'), ('12:00', '09:00')])
+def test_availability_window_must_end_after_it_starts(conn, event_id, start, end):
+    plan = {'slots': [{'duty_type': 'Hall'}], 'people': ['Ana'],
+            'availability': {'Ana': [{'date': '2026-10-20', 'start_time': start, 'end_time': end}]}}
+    with pytest.raises(RosterError, match='end_time must be after start_time'):
+        generate(conn, event_id, plan, dry_run=True)
+
+
+def test_invalid_slots_are_reported_by_index(conn, event_id):
+    with pytest.raises(RosterError) as error:
+        generate(conn, event_id, {'slots': [{'duty_type': 'Hall'}, {'duty_type': ''}, {'duty_type': 'Gate',
+                                                                                       'count': 0}]})
+    assert [entry['index'] for entry in error.value.errors] == [1, 2]
+
+
+def test_roster_route_rejects_a_bad_window(client):
+    event = {'name': 'Sports Day', 'type': 'sports', 'event_date': '2026-10-20', 'start_time': '09:00',
+             'end_time': '11:00', 'venue': 'Main Hall', 'host_school': 'ABC'}
+    client.post('/api/events/batch', json={'events': [event]})
+    event_id = client.get('/api/events').get_json()[0]['id']
+    plan = {'slots': [{'duty_type': 'Hall'}], 'people': ['Ana'],
+            'availability': {'Ana': [{'date': '2026-10-20', 'start_time': '11:00', 'end_time': '10:00'}]}}
+    response = client.post(f'/api/events/{event_id}/roster', json=plan)
+    assert response.status_code == 400
+    assert 'end_time must be after start_time' in response.get_json()['error']
@@ -0,0 +1,72 @@
+import pytest
+
+from ai_event import EventExtractor, FakeModel
+from db import get_db
+from scan_jobs import QueueFull, ScanJobs, get_job
+
+
+def fake_jobs(app, model=None, **options):
+    return ScanJobs(app, lambda: EventExtractor(model_name='fake', model=model or FakeModel()), **options)
+
+
+def test_job_result_is_stored_for_its_user(app_context, make_image):
+    jobs = fake_jobs(app_context)
+    job_id = jobs.submit(make_image(), 'poster.png', user_id=1)
+    jobs.shutdown(wait=True)
+
+    job = get_job(get_db(), job_id, 1)
+    assert job['status'] == 'done'
+    assert job['filename'] == 'poster.png'
+    assert job['event']['name'] == 'Sample Event'
+    assert job['event']['start_time'] == '10:00'
+    assert job['preprocessing']['input_bytes'] > 0
+    assert get_job(get_db(), job_id, 2) is None
+    assert jobs.stats()['completed'] == 1
+
+
+def test_extractor_is_built_once_for_all_jobs(app_context, make_image):
+    model = FakeModel()
+    built = []
+
+    def factory():
+        built.append(EventExtractor(model_name='fake', model=model))
+        return built[-1]
+    jobs = ScanJobs(app_context, factory)
+    for color in ('white', 'black', 'red'):
+        jobs.submit(make_image(color=color), f'{color}.png', user_id=1)
+    jobs.shutdown(wait=True)
+
+    assert len(built) == 1
+    assert model.calls == 3
+    assert jobs.stats()['pending'] == 0
+
+
+def test_failed_extraction_marks_the_job_failed(app_context):
+    jobs = fake_jobs(app_context)
+    job_id = jobs.submit(b'not an image', 'broken.png', user_id=1)
+    jobs.shutdown(wait=True)
+
+    job = get_job(get_db(), job_id, 1)
+    assert job['status'] == 'failed'
+    assert job['error'].startswith('Error processing image')
+    assert jobs.stats()['failed'] == 1
+
+
+def test_multi_job_returns_every_event(app_context, make_image):
+    reply = {'events': [
+        {'event_name': 'Chess Final', 'date': '2026-11-02', 'time': '10:00 AM', 'location': 'Library'},
+        {'event_name': 'Debate', 'date': '2026-11-03', 'time': '2:00 PM', 'location': 'Hall B'},
+    ], 'confidence': 'high'}
+    jobs = fake_jobs(app_context, FakeModel(reply))
+    job_id = jobs.submit(make_image(), 'schedule.png', user_id=1, multi=True)
+    jobs.shutdown(wait=True)
+
+    job = get_job(get_db(), job_id, 1)
+    assert [event['name'] for event in job['events']] == ['Chess Final', 'Debate']
+
+
+def test_submit_refuses_when_queue_is_full(app_context, make_image):
+    jobs = fake_jobs(app_context, max_pending=0)
+    with pytest.raises(QueueFull):
+        jobs.submit(make_image(), 'poster.png', user_id=1)
+    assert get_db().execute('SELECT COUNT(*) FROM scan_jobs').fetchone()[0] == 0
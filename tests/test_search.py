@@ -0,0 +1,36 @@
+from search import build_match_query, search_events, search_result
+
+
+def test_words_become_quoted_prefix_terms():
+    assert build_match_query('sci fa') == '"sci"* "fa"*'
+
+
+def test_fts_operators_are_treated_as_text():
+    assert build_match_query('art OR "music" NEAR(x)') == '"art"* "OR"* "music"* "NEAR"* "x"*'
+
+
+def test_no_searchable_words():
+    assert build_match_query(' -- "" ') == ''
+
+
+def test_search_events_ranks_name_matches_first(conn, add_event):
+    add_event(name='Science Fair', description='')
+    add_event(name='Art Show', description='with a science corner')
+    add_event(name='Football', description='')
+    rows = search_events(conn, 'sci')
+    assert [row['name'] for row in rows] == ['Science Fair', 'Art Show']
+
+
+def test_search_index_follows_updates_and_deletes(conn, add_event):
+    event_id = add_event(name='Science Fair')
+    conn.execute("UPDATE events SET name = 'Maths Olympiad' WHERE id = ?", (event_id,))
+    assert search_events(conn, 'science') == []
+    assert [row['id'] for row in search_events(conn, 'olymp')] == [event_id]
+    conn.execute('DELETE FROM events WHERE id = ?', (event_id,))
+    assert search_events(conn, 'olymp') == []
+
+
+def test_snippet_is_escaped_and_marked(conn, add_event):
+    add_event(name='Science <Fair>')
+    snippet = search_result(search_events(conn, 'fair')[0])['snippet']
+    assert snippet == 'Science &lt;<mark>Fair</mark>&gt;'
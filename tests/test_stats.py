@@ -0,0 +1,29 @@
+from stats import dashboard_counts, get_breakdown, get_count, rebuild
+
+COUNTS_SQL = 'SELECT metric, bucket, count FROM stat_counts WHERE count > 0 ORDER BY metric, bucket'
+
+
+def test_triggers_keep_counts_current(conn, add_event):
+    first = add_event()
+    add_event(type='cultural', event_date='2026-11-02')
+    conn.execute("UPDATE events SET type = 'cultural' WHERE id = ?", (first,))
+    assert get_count(conn, 'events') == 2
+    assert get_count(conn, 'event_type', 'sports') == 0
+    assert get_count(conn, 'event_type', 'cultural') == 2
+    assert get_count(conn, 'event_month', '2026-11') == 1
+
+    conn.execute('DELETE FROM events WHERE id = ?', (first,))
+    assert get_count(conn, 'event_month', '2026-10') == 0
+    assert dashboard_counts(conn)['total_events'] == 1
+    assert [tuple(row) for row in get_breakdown(conn, 'event_month', 'month')] == [('2026-11', 1)]
+
+
+def test_rebuild_matches_the_triggers(conn, add_event):
+    add_event()
+    conn.execute("INSERT INTO participants (unique_id, name, type, class_dept, school) "
+                 "VALUES ('P1', 'Asha', 'student', '7B', 'ABC')")
+    counts = [tuple(row) for row in conn.execute(COUNTS_SQL)]
+    conn.execute('UPDATE stat_counts SET count = 99')
+    rebuild(conn)
+    assert [tuple(row) for row in conn.execute(COUNTS_SQL)] == counts
+    assert get_count(conn, 'students') == 1
@@ -0,0 +1,96 @@
+import pytest
+
+from bulk_import import connection_writer, insert_events, validate_event
+from recurrence import validate_series
+from db import get_db
+from venues import (VenueClash, VenueIndex, batch_clashes, find_clashes, get_venue_index, save_event, save_exception,
+                    save_series)
+
+EVENT = {
+    'name': 'Debate', 'type': 'academic', 'event_date': '2026-10-20', 'start_time': '10:00', 'end_time': '12:00',
+    'venue': 'Main Hall', 'host_school': 'ABC',
+}
+
+
+def event_row(**fields):
+    return validate_event(dict(EVENT, **fields))
+
+
+def series_row(**fields):
+    return validate_series(dict(EVENT, name='Choir', frequency='weekly', count='3', **fields))
+
+
+@pytest.fixture
+def index(conn, add_event):
+    add_event()  # Sports Day, Main Hall, 2026-10-20 09:00-11:00
+    index = VenueIndex()
+    index.rebuild(conn)
+    return index
+
+
+def test_clash_ignores_case_spacing_and_touching_times(conn, index):
+    assert [c['name'] for c in find_clashes(conn, index, event_row(venue='main  HALL'))] == ['Sports Day']
+    assert find_clashes(conn, index, event_row(start_time='11:00')) == []
+    assert find_clashes(conn, index, event_row(venue='Gym')) == []
+
+
+def test_save_event_rejects_or_warns(conn, index):
+    with pytest.raises(VenueClash, match=r'Main Hall is already booked on 2026-10-20 at 09:00-11:00 \(Sports Day\)'):
+        save_event(conn, index, event_row())
+    event_id, clashes, _ = save_event(conn, index, event_row(), policy='warn')
+    assert event_id and [c['name'] for c in clashes] == ['Sports Day']
+
+
+def test_one_off_event_clashes_with_series_occurrence(conn, index):
+    save_series(conn, index, series_row(event_date='2026-10-21'))
+    clashes = find_clashes(conn, index, event_row(event_date='2026-10-28'))
+    assert [(c['name'], c['series_id'] is not None) for c in clashes] == [('Choir', True)]
+
+
+def test_save_series_checks_every_occurrence(conn, index):
+    write = connection_writer(conn)
+    with pytest.raises(VenueClash) as error:
+        write(lambda conn: save_series(conn, index, series_row()))
+    assert [c['event_date'] for c in error.value.clashes] == ['2026-10-20']
+    assert conn.execute('SELECT COUNT(*) FROM event_series').fetchone()[0] == 0
+
+    series_id, clashes = write(lambda conn: save_series(conn, index, series_row(), policy='warn'))
+    assert series_id and len(clashes) == 1
+
+
+def test_save_exception_checks_the_moved_occurrence(conn, index):
+    series_id, _ = save_series(conn, index, series_row(event_date='2026-10-21'))
+    with pytest.raises(VenueClash, match='Main Hall is already booked on 2026-10-20'):
+        save_exception(conn, index, series_id, {'occurrence_date': '2026-10-28', 'event_date': '2026-10-20'})
+    # Moving onto another of its own dates clashes with that occurrence.
+    with pytest.raises(VenueClash, match='Choir'):
+        save_exception(conn, index, series_id, {'occurrence_date': '2026-10-28', 'event_date': '2026-11-04'})
+    assert save_exception(conn, index, series_id, {'occurrence_date': '2026-10-28', 'event_date': '2026-10-29'}) == []
+    assert save_exception(conn, index, series_id, {'occurrence_date': '2026-11-04', 'cancelled': True}) == []
+
+
+def test_batch_clashes_include_earlier_rows(conn, index):
+    rows = [event_row(venue='Gym'), event_row(venue='Gym', start_time='11:00', end_time='13:00'), event_row()]
+    assert [[c['name'] for c in found] for found in batch_clashes(conn, rows, index)] == [
+        [], ['Debate'], ['Sports Day']]
+    # Without the app's index the stored events are read from the table.
+    assert [len(found) for found in batch_clashes(conn, rows)] == [0, 1, 1]
+
+
+def test_insert_events_reports_clashes_unless_forced(conn, index):
+    batch = [(2, event_row()), (3, event_row(venue='Gym')), (4, event_row(venue='Gym', start_time='11:30'))]
+    inserted, errors = insert_events(conn, batch)
+    assert inserted == 1
+    assert [line for line, _ in errors] == [2, 4]
+    assert 'Main Hall is already booked' in errors[0][1]
+
+    inserted, errors = insert_events(conn, batch, force=True)
+    assert (inserted, errors) == (3, [])
+
+
+def test_editing_a_missing_event_is_not_found(client, app):
+    form = dict(EVENT, description='', participating_schools='')
+    assert client.get('/events/999/edit').status_code == 404
+    assert client.post('/events/999/edit', data=form).status_code == 404
+    with app.app_context():
+        assert find_clashes(get_db(), get_venue_index(), event_row()) == []
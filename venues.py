@@ -0,0 +1,396 @@
+import os
+import threading
+from datetime import date, timedelta
+
+from flask import current_app
+
+from bulk_import import lookup
+from cache import get_versions
+from db import get_db
+from intervals import DAY_MINUTES, IntervalIndex, time_interval, to_minutes
+from recurrence import expand, insert_series, set_exception
+
+# Open-ended series are checked for clashes this far past their start.
+SERIES_CHECK_DAYS = 366
+# Clashes named in a VenueClash message; the rest are only counted.
+MAX_LISTED_CLASHES = 5
+
+
+class VenueClash(ValueError):
+    """
+    An event would overlap events already booked into the same venue that
+    day. `event_date` is None for a series, whose clashes span several dates.
+    """
+
+    def __init__(self, venue, event_date, clashes):
+        self.clashes = clashes
+        times = ', '.join(f"{'' if event_date else c['event_date'] + ' '}{c['start_time']}-{c['end_time']} ({c['name']})"
+                          for c in clashes[:MAX_LISTED_CLASHES])
+        if len(clashes) > MAX_LISTED_CLASHES:
+            times += f' and {len(clashes) - MAX_LISTED_CLASHES} more'
+        on = f' on {event_date}' if event_date else ''
+        super().__init__(f'{venue} is already booked{on} at {times}')
+
+
+def venue_key(venue):
+    """Venues are matched ignoring case and spacing ('Main  hall' is 'Main Hall')."""
+    return ' '.join((venue or '').split()).casefold()
+
+
+def _format(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def _booking(event):
+    """What a clash reports about the event it clashes with; series_id is set for a series occurrence."""
+    return {
+        'id': event.get('id'), 'series_id': event.get('series_id'), 'name': event['name'],
+        'venue': event['venue'], 'event_date': event['event_date'],
+        'start_time': event['start_time'], 'end_time': event['end_time'],
+    }
+
+
+def _add(index, event):
+    """Add an event-shaped dict to an IntervalIndex keyed by (venue key, date); returns its interval."""
+    interval = time_interval(event['start_time'], event['end_time'])
+    key = venue_key(event['venue'])
+    if interval is None or not key or not event['event_date']:
+        return None
+    index.add((key, event['event_date']), interval[0], interval[1], _booking(event))
+    return interval
+
+
+def occurrence_index(conn, start, end, skip=None):
+    """
+    Occurrences of recurring series dated start-end, indexed by (venue
+    key, date). The venue index holds stored events only, so series are
+    expanded for the window being checked.
+
+    Args:
+        skip: Optional predicate; occurrences it returns True for are left out
+    """
+    index = IntervalIndex()
+    for occurrence in expand(conn, start, end):
+        if skip is None or not skip(occurrence):
+            _add(index, occurrence)
+    return index
+
+
+class VenueIndex:
+    """
+    Which events occupy each venue, held in memory per (venue, date) as
+    intervals sorted by start.
+
+    The index records the 'events' data version (see cache.py)
+    it reflects. Writes made through this process update it in place;
+    any other write (another worker, a bulk import, a delete of
+    everything) changes the version, and the next lookup rebuilds it from
+    the events table.
+    """
+
+    def __init__(self):
+        self._index = IntervalIndex()
+        self._events = {}
+        self._lock = threading.RLock()
+        self.version = None
+        self.rebuilds = 0
+
+    def rebuild(self, conn):
+        with self._lock:
+            # Read the version first: a write landing in between leaves the
+            # index newer than its version, and the next sync rebuilds again.
+            version = get_versions(conn, ['events'])[0][0]
+            self._index.clear()
+            self._events.clear()
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute('SELECT id, name, venue, event_date, start_time, end_time FROM events')
+            for row in cursor:
+                self._place(*row)
+            self.version = version
+            self.rebuilds += 1
+
+    def sync(self, conn):
+        """Rebuild if the events table changed since the index was built or updated."""
+        if get_versions(conn, ['events'])[0][0] != self.version:
+            self.rebuild(conn)
+
+    def _place(self, event_id, name, venue, event_date, start_time, end_time):
+        interval = time_interval(start_time, end_time)
+        key = (venue_key(venue), event_date)
+        if interval is None or not key[0] or not event_date:
+            return
+        self._index.add(key, interval[0], interval[1], event_id)
+        self._events[event_id] = (key, {
+            'id': event_id, 'series_id': None, 'name': name, 'venue': venue, 'event_date': event_date,
+            'start_time': start_time, 'end_time': end_time,
+        })
+
+    def _drop(self, event_id):
+        entry = self._events.pop(event_id, None)
+        if entry is not None:
+            self._index.remove(entry[0], event_id)
+
+    def clashes(self, conn, venue, event_date, start_time, end_time, exclude_id=None):
+        """
+        Events booked into `venue` on `event_date` that overlap start-end.
+
+        Returns:
+            list: Event dicts (id, name, venue, event_date, start_time,
+            end_time) in start order
+        """
+        interval = time_interval(start_time, end_time)
+        if interval is None or not venue_key(venue):
+            return []
+        with self._lock:
+            self.sync(conn)
+            return [self._events[event_id][1]
+                    for event_id in self._index.overlapping((venue_key(venue), event_date), *interval)
+                    if event_id != exclude_id]
+
+    def booked(self, conn, venue, event_date):
+        with self._lock:
+            self.sync(conn)
+            return [self._events[event_id][1]
+                    for _, _, event_id in self._index.intervals((venue_key(venue), event_date))]
+
+    def free_slots(self, conn, venue, event_date, day_start, day_end, min_minutes=1):
+        """
+        Gaps of at least `min_minutes` between day_start and day_end when
+        `venue` has nothing booked.
+
+        Returns:
+            list: {'start_time', 'end_time', 'minutes'} dicts in time order
+        """
+        opens = to_minutes(day_start)
+        closes = DAY_MINUTES if day_end == '24:00' else to_minutes(day_end)
+        if opens is None or closes is None:
+            raise ValueError('day start and end must be HH:MM times')
+        with self._lock:
+            self.sync(conn)
+            taken = self._index.intervals((venue_key(venue), event_date))
+        slots = []
+        cursor = opens
+        for start, end, _ in taken:
+            if start >= closes:
+                break
+            if start - cursor >= min_minutes:
+                slots.append((cursor, start))
+            cursor = max(cursor, end)
+        if closes - cursor >= min_minutes:
+            slots.append((cursor, closes))
+        return [{'start_time': _format(start), 'end_time': _format(end), 'minutes': end - start}
+                for start, end in slots]
+
+    def saved(self, event_id, row, versions):
+        """
+        Bring the index up to date after this process wrote an event.
+
+        Args:
+            row (dict): The event's name, venue, event_date, start_time and
+                end_time, or None once it is deleted
+            versions (tuple): The 'events' version before and after the write;
+                if the index was not at the first, it is left to rebuild
+        """
+        with self._lock:
+            if self.version != versions[0]:
+                self.version = None
+                return
+            self._drop(event_id)
+            if row is not None:
+                self._place(event_id, row['name'], row['venue'], row['event_date'],
+                            row['start_time'], row['end_time'])
+            self.version = versions[1]
+
+    def stats(self):
+        with self._lock:
+            return {'events': len(self._index), 'version': self.version, 'rebuilds': self.rebuilds}
+
+
+def init_app(app):
+    app.config.setdefault('VENUE_CLASHES', os.environ.get('VENUE_CLASHES', 'reject'))
+    app.config.setdefault('VENUE_DAY_START', os.environ.get('VENUE_DAY_START', '08:00'))
+    app.config.setdefault('VENUE_DAY_END', os.environ.get('VENUE_DAY_END', '18:00'))
+    index = app.extensions['venue_index'] = VenueIndex()
+    with app.app_context():
+        index.rebuild(get_db())
+
+
+def get_venue_index():
+    return current_app.extensions['venue_index']
+
+
+def find_clashes(conn, index, row, exclude_id=None):
+    """
+    Stored events and series occurrences booked into row's venue on its
+    date that overlap its start-end, in start order.
+    """
+    clashes = index.clashes(conn, row['venue'], row['event_date'], row['start_time'], row['end_time'],
+                            exclude_id=exclude_id)
+    interval = time_interval(row['start_time'], row['end_time'])
+    if interval is None or not venue_key(row['venue']):
+        return clashes
+    day = date.fromisoformat(row['event_date'])
+    occurrences = occurrence_index(conn, day, day).overlapping((venue_key(row['venue']), row['event_date']), *interval)
+    return sorted(clashes + occurrences, key=lambda clash: clash['start_time'])
+
+
+def batch_clashes(conn, rows, index=None, skip_clashing=False):
+    """
+    For each event row of a batch, in order, what it clashes with at its
+    venue: stored events, series occurrences and the batch's earlier rows.
+
+    Args:
+        index (VenueIndex): The app's venue index; without one (outside the
+            app) the stored events of the batch's dates are read directly
+        skip_clashing (bool): Leave clashing rows out of the checks of
+            later rows, for callers that will not insert them
+
+    Returns:
+        list: One list of clashing events per row (empty if it is free)
+    """
+    if not rows:
+        return []
+    dates = sorted({row['event_date'] for row in rows})
+    booked = occurrence_index(conn, date.fromisoformat(dates[0]), date.fromisoformat(dates[-1]))
+    if index is None:
+        for event in lookup(conn, 'SELECT id, name, venue, event_date, start_time, end_time FROM events '
+                                   'WHERE event_date IN ({placeholders})', dates):
+            _add(booked, dict(event))
+
+    results = []
+    for row in rows:
+        interval = time_interval(row['start_time'], row['end_time'])
+        clashes = []
+        if interval is not None and venue_key(row['venue']):
+            if index is not None:
+                clashes = index.clashes(conn, row['venue'], row['event_date'], row['start_time'], row['end_time'])
+            clashes = clashes + booked.overlapping((venue_key(row['venue']), row['event_date']), *interval)
+        results.append(sorted(clashes, key=lambda clash: clash['start_time']))
+        if not (clashes and skip_clashing):
+            _add(booked, row)
+    return results
+
+
+def occurrence_clashes(conn, index, series_id, start, end, occurrence_date=None):
+    """
+    What a series' occurrences dated start-end clash with: stored events
+    and other series' occurrences at the same venue. With `occurrence_date`
+    only that one occurrence (wherever it was moved to) is checked, and it
+    may also clash with its own series' other dates.
+
+    Returns:
+        list: Clashing events in date and start order
+    """
+    own = [occurrence for occurrence in expand(conn, start, end, series_id)
+           if occurrence_date is None or occurrence['occurrence_date'] == occurrence_date]
+    if occurrence_date is None:
+        # A series' own dates never overlap each other.
+        skip = lambda occurrence: occurrence['series_id'] == series_id
+    else:
+        skip = lambda occurrence: (occurrence['series_id'], occurrence['occurrence_date']) == (series_id, occurrence_date)
+    others = occurrence_index(conn, start, end, skip)
+    clashes = []
+    for occurrence in own:
+        interval = time_interval(occurrence['start_time'], occurrence['end_time'])
+        if interval is None or not venue_key(occurrence['venue']):
+            continue
+        clashes += index.clashes(conn, occurrence['venue'], occurrence['event_date'],
+                                 occurrence['start_time'], occurrence['end_time'])
+        clashes += others.overlapping((venue_key(occurrence['venue']), occurrence['event_date']), *interval)
+    return sorted(clashes, key=lambda clash: (clash['event_date'], clash['start_time']))
+
+
+def save_series(conn, index, row, policy='reject'):
+    """
+    Insert a series unless one of its occurrences clashes with another
+    booking of its venue. An open-ended series is checked for
+    SERIES_CHECK_DAYS. Call it inside db.write: a refused series is rolled
+    back with the transaction.
+
+    Returns:
+        tuple: (series id, clashing events)
+
+    Raises:
+        VenueClash: An occurrence clashes and clashes are rejected
+    """
+    series_id = insert_series(conn, row)
+    if policy == 'off':
+        return series_id, []
+    start = date.fromisoformat(row['start_date'])
+    end = date.fromisoformat(row['until_date']) if row['until_date'] else start + timedelta(days=SERIES_CHECK_DAYS)
+    clashes = occurrence_clashes(conn, index, series_id, start, end)
+    if clashes and policy == 'reject':
+        raise VenueClash(row['venue'], None, clashes)
+    return series_id, clashes
+
+
+def save_exception(conn, index, series_id, record, policy='reject'):
+    """
+    recurrence.set_exception, refusing a moved or retimed occurrence that
+    clashes at its venue. Call it inside db.write.
+
+    Returns:
+        list: Clashing events (empty for a cancellation)
+
+    Raises:
+        VenueClash: The changed occurrence clashes and clashes are rejected
+    """
+    exception = set_exception(conn, series_id, record)
+    if exception['cancelled'] or policy == 'off':
+        return []
+    day = date.fromisoformat(exception['event_date'] or exception['occurrence_date'])
+    clashes = occurrence_clashes(conn, index, series_id, day, day, exception['occurrence_date'])
+    if clashes and policy == 'reject':
+        venue = exception['venue'] or conn.execute('SELECT venue FROM event_series WHERE id = ?',
+                                                   (series_id,)).fetchone()['venue']
+        raise VenueClash(venue, day.isoformat(), clashes)
+    return clashes
+
+
+def save_event(conn, index, row, event_id=None, policy='reject'):
+    """
+    Insert an event, or update `event_id`, unless it clashes with another
+    booking of its venue. Call it inside db.write so the check and the
+    write see the same events.
+
+    Args:
+        index (VenueIndex): The app's venue index
+        row (dict): The event's columns as on the add/edit forms
+        policy (str): 'reject' refuses a clash, 'warn' saves it and returns
+            the clashing events, 'off' skips the check
+
+    Returns:
+        tuple: (event id, clashing events, (version before, version after))
+
+    Raises:
+        VenueClash: The venue is booked and clashes are rejected
+    """
+    clashes = []
+    if policy != 'off':
+        clashes = find_clashes(conn, index, row, exclude_id=event_id)
+        if clashes and policy == 'reject':
+            raise VenueClash(row['venue'], row['event_date'], clashes)
+    before = get_versions(conn, ['events'])[0][0]
+    if event_id is None:
+        event_id = conn.execute('''
+            INSERT INTO events (name, type, event_date, start_time, end_time, venue,
+                              description, host_school, participating_schools)
+            VALUES (:name, :type, :event_date, :start_time, :end_time, :venue,
+                    :description, :host_school, :participating_schools)
+        ''', row).lastrowid
+    else:
+        conn.execute('''
+            UPDATE events SET name = :name, type = :type, event_date = :event_date, start_time = :start_time,
+                           end_time = :end_time, venue = :venue, description = :description,
+                           host_school = :host_school, participating_schools = :participating_schools
+            WHERE id = :id
+        ''', dict(row, id=event_id))
+    return event_id, clashes, (before, get_versions(conn, ['events'])[0][0])
+
+
+def delete_event(conn, event_id):
+    """Delete an event inside db.write; returns the (before, after) 'events' versions for saved()."""
+    before = get_versions(conn, ['events'])[0][0]
+    conn.execute('DELETE FROM events WHERE id = ?', (event_id,))
+    return before, get_versions(conn, ['events'])[0][0]